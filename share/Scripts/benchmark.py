@@ -0,0 +1,74 @@
+"""Benchmarks of the simulation hot paths
+
+Usage::
+
+    python benchmark.py [options] [benchmark names]
+
+Runs the micro benchmarks (all of them or the given names) and/or the
+macro benchmarks (MAppleT.lpy headless for 1, 3 and 5 simulated years),
+prints the durations and saves them as JSON. With --compare, the
+benchmarks that are slower than in a previous JSON file are listed.
+See openalea.stocatree.benchmark.
+
+Examples::
+
+    python benchmark.py --output before.json
+    python benchmark.py --output after.json --compare before.json
+    python benchmark.py --macro --years 1,3,5 --output macro.json
+    python benchmark.py --list
+"""
+import sys
+from optparse import OptionParser
+
+from openalea.stocatree.benchmark import micro_benchmarks, run_micro, run_macro, \
+    save_results, load_results, compare_results
+
+
+def main(argv):
+    parser = OptionParser(usage='%prog [options] [benchmark names]')
+    parser.add_option('--micro', action='store_true', default=False,
+                      help='run the micro benchmarks (default if --macro is not given)')
+    parser.add_option('--macro', action='store_true', default=False,
+                      help='run MAppleT.lpy headless')
+    parser.add_option('--years', default='1,3,5',
+                      help='numbers of simulated years of the macro benchmarks [%default]')
+    parser.add_option('--seed', type='int', default=123456,
+                      help='seed of the macro benchmarks [%default]')
+    parser.add_option('--lsystem', default=None, help='the L-system [share/data/MAppleT.lpy]')
+    parser.add_option('--ini', default=None, help='the configuration [MAppleT.ini]')
+    parser.add_option('--repeat', type='int', default=5,
+                      help='timed runs of each micro benchmark [%default]')
+    parser.add_option('--output', default='benchmark.json', help='the JSON file [%default]')
+    parser.add_option('--compare', default=None, help='a previous JSON file')
+    parser.add_option('--tolerance', type='float', default=0.1,
+                      help='slow down reported by --compare [%default]')
+    parser.add_option('--list', action='store_true', default=False,
+                      help='list the micro benchmarks')
+    options, names = parser.parse_args(argv)
+
+    if options.list:
+        for name in sorted(micro_benchmarks):
+            print name
+        return 0
+
+    results = []
+    if options.micro or names or not options.macro:
+        results += run_micro(names or None, repeat=options.repeat, verbose=True)
+    if options.macro:
+        years = [int(n) for n in options.years.split(',')]
+        results += run_macro(years, options.lsystem, options.ini, seed=options.seed,
+                             verbose=True)
+    save_results(results, options.output)
+
+    if options.compare:
+        rows = compare_results(load_results(options.compare), load_results(options.output),
+                               options.tolerance)
+        for name, before, after, ratio in rows:
+            print '%-32s %12.3e -> %12.3e s/call  x%.2f' % (name, before, after, ratio)
+        if rows:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
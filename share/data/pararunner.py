@@ -0,0 +1,59 @@
+#-------------------------------------------------------------------------------
+# Name:         pararunner
+# Purpose:      Run all the experiments of a plan on the processors of this
+#               machine with openalea.stocatree.runner
+# Note:         Replaces parabatch.py / parasuper.py: no lock nor record file,
+#               the experiments are dispatched one by one to the idle workers.
+#               The state of the experiments is recorded in a ledger
+#               (openalea.stocatree.ledger); the finished experiments are
+#               skipped and the failed ones retried when the script is run
+#               again, so that an interrupted plan can resume.
+#               The hidden semi markov models of the ini file are read once
+#               before the workers are forked and shared by all of them.
+#
+#               python pararunner.py [plan] [ini file] [number of processes]
+#-------------------------------------------------------------------------------
+
+import sys
+import ConfigParser
+
+from openalea.stocatree.runner import ExperimentRunner, read_plan
+from openalea.stocatree.ledger import ExperimentLedger
+
+ledger_file = "experiments.db"
+
+
+def hsm_files(ini_file):
+    """the files of the hsm_* options of the markov section of the ini file"""
+    config = ConfigParser.RawConfigParser()
+    config.read(ini_file)
+    if not config.has_section('markov'):
+        return []
+    return [config.get('markov', name) for name in config.options('markov')
+            if name.startswith('hsm_')]
+
+
+if __name__ == "__main__":
+    plan_file = "pleqplan.csv"
+    ini_file = "MAppleT_FSPM.ini"
+    processes = None
+    if len(sys.argv) > 1:
+        plan_file = sys.argv[1]
+    if len(sys.argv) > 2:
+        ini_file = sys.argv[2]
+    if len(sys.argv) > 3:
+        processes = int(sys.argv[3])
+
+    plan = read_plan(plan_file)
+    ledger = ExperimentLedger(ledger_file)
+    experiments = [experiment for experiment, parameters in plan]
+    pending = ledger.pending(experiments)
+    ledger.close()
+    print "{0} experiments, {1} to run".format(len(plan), len(pending))
+
+    runner = ExperimentRunner("MAppleT.lpy", ini_file, processes=processes, ledger=ledger_file,
+                              hsm_files=hsm_files(ini_file))
+    for result in runner.run(plan, skip=set(experiments) - set(pending)):
+        print result
+        if not result.success:
+            print result.error
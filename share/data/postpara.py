@@ -13,7 +13,7 @@ import glob, os, time, cPickle, gc
 from openalea.stocatree.file_tools import File_Index, Mtg_Processing
 from openalea.stocatree.data_process import Group, Statistics
 from openalea.stocatree.interception import STAR, Envelope
-from openalea.stocatree.rw_tools import Ensure_dir
+from openalea.stocatree.rw_tools import ensureLocalDir
 from multiprocessing import Process, Pool
 from openalea.plantgl.all import Viewer, Scene
 
@@ -144,7 +144,7 @@ class Postpara_Interception(object):
     #One CPU one batch.
     def batch(self, exp_grp):
         batch_directory = self.general_directory+ str(exp_grp[0]) + "~" + str(exp_grp[-1]) + "\\"
-        Ensure_dir(batch_directory)
+        ensureLocalDir(batch_directory)
         for exp_id in exp_grp:
             try:
                 self.run(exp_id, batch_directory)
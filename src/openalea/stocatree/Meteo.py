@@ -7,100 +7,92 @@ from math import *
 
 
 
+#: columns of the meteo files, one row per day
+meteo_columns = ['day', 'month', 'year', 'Tmax', 'Tmin', 'Hrmax', 'Hrmin', 'windspeed', 'Rg', 'Rainfall']
+
+
 class meteo(object):
-    
-    def __init__(self, file_name):
-        
-        global Altitude
-        global lat
-        Altitude = 0
-        
-        lat = 45
-         ### To modify, needs to be included in the parameter file.
-         
-        self.complete_file = np.loadtxt(file_name)
-        #self.complete_file = np.genfromtxt(file_name,dtype='str')
-        #self.complete_file = np.fromfile(file_name)
-        self.file_dico  = {}
-        self.premier_jour = datetime.date(int(self.complete_file[0,2]),int(self.complete_file[0,1]),int(self.complete_file[0,0]))
-        
-        for i in range(0,(len(self.complete_file))):
-            dict_jour = {}
-            date = datetime.date(int(self.complete_file[i,2]),int(self.complete_file[i,1]),int(self.complete_file[i,0]))
-            dict_jour['jour_julien'] = self.compute_jour_julien(int(self.complete_file[i,2]),int(self.complete_file[i,1]),int(self.complete_file[i,0]))
-            dict_jour['Tmax'] = self.complete_file[i,3]
-            dict_jour['Tmin'] = self.complete_file[i,4]
-            dict_jour['Hrmax'] = self.complete_file[i,5]
-            dict_jour['Hrmin'] = self.complete_file[i,6]
-            dict_jour['windspeed'] = self.complete_file[i,7]
-            dict_jour['Rg'] = self.complete_file[i,8]
-            dict_jour['Rainfall'] = self.complete_file[i,9]
-            self.file_dico[date] = dict_jour
-        
-    def get_meteo_jour(self,jour) :
-        return(self.file_dico[jour])
-        
-        
-    def make_meteorological_calculation(self) :
-        
-        for key in sorted(self.file_dico):
-            dict_jour = self.file_dico[key]
-            
-            dict_jour['VPD'] = self.computeVPD(dict_jour['Tmax'],dict_jour['Tmin'],dict_jour['Hrmax'], dict_jour['Hrmin'], dict_jour['jour_julien'],dict_jour['Rg'])
-            dict_jour['ET0'] = self.computeET0(dict_jour['Tmax'],dict_jour['Tmin'], dict_jour['jour_julien'],dict_jour['Rg'],dict_jour['VPD'],dict_jour['windspeed'] )
-        write_meteo_data("meteo_data.txt", self.premier_jour, self.file_dico)
-        
+    """daily weather read from a meteo file (see :data:`meteo_columns`)
+
+    Each variable is stored in :attr:`series` as an array with one value per
+    day, in the order of the file; :attr:`index` gives the row of a date so
+    that :meth:`get_meteo_jour` is O(1). :meth:`make_meteorological_calculation`
+    adds the VPD and ET0 series, computed for all the days at once.
+    """
+    def __init__(self, file_name, latitude = 45, altitude = 0):
+        ### To modify, needs to be included in the parameter file.
+        self.latitude = latitude
+        self.altitude = altitude
+
+        self.complete_file = np.loadtxt(file_name, ndmin=2)
+        self.dates = [datetime.date(int(year), int(month), int(day))
+                      for day, month, year in self.complete_file[:, :3]]
+        self.premier_jour = self.dates[0]
+        self.index = dict((date, i) for i, date in enumerate(self.dates))
+        self.series = {}
+        self.series['jour_julien'] = np.array([date.timetuple().tm_yday for date in self.dates])
+        for i, name in enumerate(meteo_columns[3:]):
+            self.series[name] = self.complete_file[:, i + 3]
+
+    def row(self, jour):
+        """the row of a day (datetime.date or datetime.datetime)"""
+        if isinstance(jour, datetime.datetime):
+            jour = jour.date()
+        return self.index[jour]
+
+    def get_meteo_jour(self, jour) :
+        i = self.row(jour)
+        return dict((name, values[i]) for name, values in self.series.iteritems())
+
+    @property
+    def file_dico(self):
+        """dictionary date -> variables of the day, as returned by get_meteo_jour"""
+        return dict((date, self.get_meteo_jour(date)) for date in self.dates)
+
+    def make_meteorological_calculation(self, filename = "meteo_data.txt") :
+        """compute the VPD and ET0 series and write them in filename (if not None)"""
+        s = self.series
+        s['VPD'], esat, ea = compute_VPD(s['Tmax'], s['Tmin'], s['Hrmax'], s['Hrmin'])
+        s['ET0'] = compute_ET0(s['Tmax'], s['Tmin'], s['jour_julien'], s['Rg'], esat, ea,
+                               s['windspeed'], self.latitude, self.altitude)
+        if filename is not None:
+            write_meteo_data(filename, self.premier_jour, self.file_dico)
+
     def compute_jour_julien(self, year, month, day ) :
-        t= time.mktime((year, month, day, 1, 0, 0, 0, 0, 0))
-        return(time.gmtime(t)[7])
+        return datetime.date(year, month, day).timetuple().tm_yday
+
+
+def compute_VPD(Tmax, Tmin, RHmax, RHmin):
+    """vapour pressure deficit of days (arrays or numbers)
+
+    :returns: VPD, saturated vapour pressure esat and actual vapour pressure ea
+    """
+    Tmax = np.maximum(Tmax, Tmin)
+    RHmax = np.maximum(RHmax, RHmin)
+    esat = 0.3054 * (np.exp(17.24 * Tmax/ ( Tmax + 237.3)) + np.exp(17.27 * Tmin/(Tmin + 237.3)))
+    ea = 0.3054 * (np.exp(17.27 * Tmax/(Tmax + 237.3))* RHmin / 100 + np.exp(17.27 * Tmin / (Tmin + 237.3))* RHmax/100)
+    return esat - ea, esat, ea
+
+
+def compute_ET0(Tmax, Tmin, jour_julien, Rg, esat, ea, windspeed, latitude = 45, altitude = 0):
+    """reference evapotranspiration of days (arrays or numbers), see :func:`compute_VPD`"""
+    lat_rad = latitude*pi/180
+
+    Decli = 0.409*np.sin(0.0172 * jour_julien-1.39)
+    SunPos = np.arccos( - tan( lat_rad ) * np.tan(Decli))
+    Sundist = 1 + 0.033*np.cos( 2 * (pi/365) * jour_julien )
+    Ray_extra = 24 * 60 * 0.0820 / pi * Sundist * (SunPos * np.sin(Decli) * sin(lat_rad) + np.cos(Decli)* cos(lat_rad) * np.sin(SunPos) )
+    RGMax = ( 0.75 + 0.00002 * altitude ) *   Ray_extra
+    ratioRg = np.where(Rg > RGMax, 1, Rg / RGMax)
+
+    Rn = 0.77*Rg - (1.35* ratioRg -0.35)*(0.34-0.14*(ea)**(0.5))*((Tmax +273.16)**4+(Tmin +273.16)**4)*2.45015*10**(-9)
+    TMoy = (Tmin + Tmax)/2
+    pent_vap_sat = 4098 * (0.6108*np.exp(17.27 * TMoy /(TMoy +237.3)))/((TMoy +237.3)**2)
+    Kpsy = 0.00163 * 101.3 * (1-(0.0065*altitude/293))**5.26
+    erad = 0.408 * Rn*pent_vap_sat/(pent_vap_sat+Kpsy*(1+0.34*windspeed))
+    eaero = ((900/(TMoy +273.16))*(( esat - ea)* windspeed)*Kpsy)/(pent_vap_sat+Kpsy*(1+0.34*windspeed))
+    return erad + eaero
 
-    def computeVPD(self, Tmax, Tmin, RHmax, RHmin, jour_julien, Rg) :
-        
-        global ea
-        global esat
-        
-        TMoy = (Tmax + Tmin) / 2
-        HMoy = (RHmin + RHmax ) / 2
-        if Tmin > Tmax :
-            Tmax = Tmin
-        if RHmin > RHmax : 
-            RHmax = RHmin
-        
-        esat = 0.3054 * (exp(17.24 * Tmax/ ( Tmax + 237.3)) + exp(17.27 * Tmin/(Tmin + 237.3)))
-        ea = 0.3054 * (exp(17.27 * Tmax/(Tmax + 237.3))* RHmin / 100 + exp(17.27 * Tmin / (Tmin + 237.3))* RHmax/100)
-        VPD = esat - ea
-        return(VPD)
-       
-     
-    def computeET0(self, Tmax, Tmin, jour_julien, Rg, VPD, windspeed) :    
-        
-        
-        lat_rad = lat*pi/180
-        
-        Decli = 0.409*sin(0.0172 * jour_julien-1.39)
-        SunPos = acos( - tan( lat_rad ) * tan(Decli))  
-        Sundist = 1 + 0.033*cos( 2 * (pi/365) * jour_julien )
-        Ray_extra = 24 * 60 * 0.0820 / pi * Sundist * (SunPos * sin(Decli) * sin(lat_rad) + cos(Decli)* cos(lat_rad) * sin(SunPos) )
-        RGMax = ( 0.75 + 0.00002 * Altitude ) *   Ray_extra
-        day_lenght = 7.64 * SunPos
-        PAR = 0.48 * Rg
-        if Rg > RGMax :
-            ratioRg = 1
-        else :
-            ratioRg = Rg / RGMax
-        
-        Rn = 0.77*Rg - (1.35* ratioRg -0.35)*(0.34-0.14*(ea)**(0.5))*((Tmax +273.16)**4+(Tmin +273.16)**4)*2.45015*10**(-9)
-        TMoy = (Tmin + Tmax)/2
-        Tlat = 2.501-2.361*10**(-3)*TMoy 
-        pent_vap_sat = 4098 * (0.6108*exp(17.27 * TMoy /(TMoy +237.3)))/((TMoy +237.3)**2)
-        Kpsy = 0.00163 * 101.3 * (1-(0.0065*Altitude/293))**5.26
-        erad = 0.408 * Rn*pent_vap_sat/(pent_vap_sat+Kpsy*(1+0.34*windspeed))
-        eaero = ((900/(TMoy +273.16))*(( esat - ea)* windspeed)*Kpsy)/(pent_vap_sat+Kpsy*(1+0.34*windspeed))
-        ET0 = erad + eaero
-        return(ET0)
-    
-    
-    
 
 def write_meteo_data(chemin,first_day,dico) :
         f=open(chemin,"w")
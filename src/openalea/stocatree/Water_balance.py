@@ -4,63 +4,114 @@ from Meteo import *
 import datetime
 
 
+#: daily series of the water balance
+water_balance_series = ['kc', 'ks', 'ETR', 'ASW', 'FTSW']
+
+
 class simplified_water_balance(object):
-    
+    """one compartment water balance over the days of a meteo file
+
+    :param meteo_file: a meteo file, or a :class:`meteo` already read
+
+    The results are stored in :attr:`series`, one array per variable of
+    :data:`water_balance_series` with one value per day of the meteo file
+    (NaN for the days not computed yet). :meth:`independant_calculation`
+    computes all the days at once, :meth:`calcule_BH_jour` the next day.
+    """
     def __init__(self, meteo_file, field_capacity = 0.23, ini_water_content = 0.22): ## (mm.mm-1) to be assigned in a parameter file
-        self.meteo_file = meteo(meteo_file)
-        self.meteo_file.make_meteorological_calculation()
-        
+        if isinstance(meteo_file, meteo):
+            # shared by several water balances
+            self.meteo_file = meteo_file
+            if 'ET0' not in meteo_file.series:
+                meteo_file.make_meteorological_calculation(None)
+        else:
+            self.meteo_file = meteo(meteo_file)
+            self.meteo_file.make_meteorological_calculation()
+
         #self.crop_coefficient_choice = "single_crop_coefficient"  ### 'dual_crop_coefficient', 'single_crop_coefficient", "radiation_interception"  These parameters should be read in a parameter file
         #self.soil_representation_choice = "single_compartment"   ### 'two_compartment layers'
         self.kc = 0
         self.TTSW = compute_water_content_one_compartment(current_water_content = field_capacity)
         self.ASW = compute_water_content_one_compartment(current_water_content = ini_water_content)
         self.FTSW = compute_FTSW(self.ASW,self.TTSW)
-        self.result_dico = {}
         self.ks = 0
         self.ETR = 0
-        
-    
-        
+        days = len(self.meteo_file.dates)
+        self.series = dict((name, np.nan * np.ones(days)) for name in water_balance_series)
+        self.series['kc'] = compute_single_crop_coefficient(self.meteo_file.series['jour_julien'])
+
     def independant_calculation(self):
-        for key in sorted(self.meteo_file.file_dico) :
-            self.calcule_BH_jour(key)
-        
+        """water balance of all the days of the meteo file, starting from the current state"""
+        s = self.series
+        s['ks'], s['ETR'], s['ASW'], s['FTSW'] = compute_bucket(
+            s['kc'], self.meteo_file.series['ET0'], self.meteo_file.series['Rainfall'],
+            self.ASW, self.TTSW)
+        self.kc, self.ks, self.ETR = s['kc'][-1], s['ks'][-1], s['ETR'][-1]
+        self.ASW, self.FTSW = s['ASW'][-1], s['FTSW'][-1]
+
     def calcule_BH_jour(self, jour) :
-        self.kc = compute_single_crop_coefficient(self.meteo_file.file_dico[jour]['jour_julien'])
+        """water balance of a day (datetime.date or datetime.datetime), from the current state"""
+        i = self.meteo_file.row(jour)
+        self.kc = self.series['kc'][i]
         self.ks = compute_coeff_stress_simple(self.FTSW)
-        self.ETR = compute_ETR_global(self.kc,self.meteo_file.file_dico[jour]['ET0'], self.ks) 
-        resultat_avant_drainage = water_balance_equation(self.ASW,self.meteo_file.file_dico[jour]['Rainfall'], self.ETR) 
+        self.ETR = compute_ETR_global(self.kc,self.meteo_file.series['ET0'][i], self.ks)
+        resultat_avant_drainage = water_balance_equation(self.ASW,self.meteo_file.series['Rainfall'][i], self.ETR)
         if resultat_avant_drainage > self.TTSW :
             self.ASW = self.TTSW
         else :
             self.ASW = resultat_avant_drainage
         self.FTSW = compute_FTSW(self.ASW,self.TTSW)
-        dict_jour = {}
-        dict_jour['ETR'] = self.ETR
-        dict_jour['ASW'] = self.ASW
-        dict_jour['FTSW'] = self.FTSW
-        dict_jour['ET0'] = self.meteo_file.file_dico[jour]['ET0']
-        dict_jour['kc'] = self.kc
-        dict_jour['ks'] = self.ks
-        dict_jour['Rainfall'] = self.meteo_file.file_dico[jour]['Rainfall']
-        self.result_dico[jour] = dict_jour
-        #for key in self.meteo_file.file_dico:
-        #    print(self.k)
-        #    if self.meteo_file.file_dico[key]['jour_julien'] < 150 :
-        #        self.k = 2
-        #    elif self.meteo_file.file_dico[key]['jour_julien'] < 200 :
-        #        self.k = 3
-        #    else :
-        #        self.k = 0
-        #
+        self.series['ks'][i] = self.ks
+        self.series['ETR'][i] = self.ETR
+        self.series['ASW'][i] = self.ASW
+        self.series['FTSW'][i] = self.FTSW
+
+    def get_BH_jour(self, jour):
+        """the results of a day as a dictionary"""
+        i = self.meteo_file.row(jour)
+        result = dict((name, values[i]) for name, values in self.series.iteritems())
+        result['ET0'] = self.meteo_file.series['ET0'][i]
+        result['Rainfall'] = self.meteo_file.series['Rainfall'][i]
+        return result
+
+    @property
+    def result_dico(self):
+        """dictionary date -> results of the day, for the days computed"""
+        computed = ~np.isnan(self.series['ASW'])
+        return dict((date, self.get_BH_jour(date))
+                    for date, done in zip(self.meteo_file.dates, computed) if done)
+
     def whole_dataset_results(self):
-        write_meteo_data("BH_results.txt",self.meteo_file.premier_jour,self.result_dico) ### function of meteo.py    
-        
+        write_meteo_data("BH_results.txt",self.meteo_file.premier_jour,self.result_dico) ### function of meteo.py
 
 
+def compute_bucket(kc, ET0, Rainfall, ASW, TTSW, seuil_FTSW = 0.4):
+    """sequential water balance of a series of days
+
+    Same as calling :meth:`simplified_water_balance.calcule_BH_jour` for
+    each day; the coefficients kc, ET0 and the rainfall are arrays with one
+    value per day.
+
+    :returns: the arrays of ks, ETR, ASW and FTSW
+    """
+    FTSW = ASW / TTSW
+    results = []
+    for kc_i, ET0_i, rainfall_i in zip(kc.tolist(), ET0.tolist(), Rainfall.tolist()):
+        if FTSW < seuil_FTSW:
+            ks = FTSW / seuil_FTSW
+        else:
+            ks = 1
+        ETR = ET0_i * ks * kc_i
+        ASW = ASW + rainfall_i - ETR
+        if ASW > TTSW:
+            ASW = TTSW
+        FTSW = ASW / TTSW
+        results.append((ks, ETR, ASW, FTSW))
+    if not results:
+        return tuple(np.array([]) for i in range(4))
+    return tuple(np.array(values, dtype=float) for values in zip(*results))
+
 
-        
 def compute_ETR_global(kc,ET0,coeff_stress):
     ETR = ET0 * coeff_stress * kc
     return(ETR)
@@ -89,19 +140,20 @@ def compute_FTSW(ASW,TTSW) :
 
 
 def compute_single_crop_coefficient(date_jour_julien,ini=0.2,mid=0.8,end=0.6,date_beginning_dev =90,date_end_vege= 150, date_senescence_beginning = 190, dateend=250) :
-    if date_jour_julien < date_beginning_dev :
-        k= ini
-    elif date_jour_julien < date_end_vege :
-        k  = (mid - ini) /(date_end_vege - date_beginning_dev ) * (date_jour_julien-date_beginning_dev)  + ini
-    elif date_jour_julien < date_senescence_beginning :
-        k = mid
-    elif date_jour_julien < dateend :
-        k = -(end - mid )/(date_senescence_beginning -  dateend) * (date_jour_julien-date_senescence_beginning) + mid
-    else :
-        k = ini
-    return(k)
-    
-        
+    """crop coefficient of a day of the year, or of an array of days"""
+    day = np.asarray(date_jour_julien, dtype=float)
+    k = np.select([day < date_beginning_dev, day < date_end_vege,
+                   day < date_senescence_beginning, day < dateend],
+                  [ini,
+                   (mid - ini) /(date_end_vege - date_beginning_dev ) * (day-date_beginning_dev)  + ini,
+                   mid,
+                   -(end - mid )/(date_senescence_beginning -  dateend) * (day-date_senescence_beginning) + mid],
+                  ini)
+    if k.ndim == 0:
+        return float(k)
+    return k
+
+
 #def write_data(chemin,first_day,dico) :
 #        f=open(chemin,"w")
 #        f.write("day" + '\t')
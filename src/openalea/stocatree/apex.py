@@ -156,6 +156,14 @@ class apex_data(object):
         # Added by Han
         self.parent_unit_id = 0
 
+        # The key of the random streams of the apex (see srandom): the
+        # organ_key of the metamer that bears it, 0 for the trunk. It does not
+        # change from one growth unit to the next one.
+        self.key = 0
+
+        # node of the apex in the OrganTopology of the tree (see topology)
+        self.node = -1
+
         # This is used to record the parent branch id (first-order branch)
         # Added by Han on 02-05-2011
         self.parent_fbr_id = 0
@@ -0,0 +1,475 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+"""
+.. topic:: benchmark.py summary
+
+    Timing of the hot paths of the simulation, comparable across commits
+
+    :Code: in progress
+    :Documentation: in progress
+    :Revision: $Id$
+    :Usage: >>> from openalea.stocatree.benchmark import *
+
+.. testsetup::
+
+    from openalea.stocatree.benchmark import *
+
+Two kinds of benchmarks are available:
+
+    * micro benchmarks time many calls of a function of the package on fixed
+      random inputs (reorient_frame, get_new_radius, rotate_frame_at_branch,
+      generate_sequence, ReadFunction.gety...). They are registered in
+      :data:`micro_benchmarks` by name, each one by a setup function that
+      returns the function to time and the number of calls it makes.
+    * macro benchmarks run MAppleT.lpy headless, with a fixed seed, for a
+      number of simulated years, through
+      :class:`~openalea.stocatree.runner.ExperimentRunner`.
+
+The inputs are drawn with fixed seeds so that two runs time the same work.
+A benchmark whose dependencies are missing (e.g. the compiled optimisation
+module) is reported with its error instead of a time. The results are
+saved as JSON, together with the commit and the platform, and
+:func:`compare_results` lists the benchmarks that became slower between
+two such files. share/Scripts/benchmark.py is the command line interface.
+
+:func:`object_size` measures the memory of the objects of the lstring, e.g.
+a metamer_data with its leaf, fruit, frame and vectors.
+
+:Example:
+
+    >>> results = run_micro(['get_new_radius', 'rotate_frame_at_branch'])
+    >>> results += run_macro(years=[1, 3])
+    >>> save_results(results, 'benchmark.json')
+    >>> for name, before, after, ratio in compare_results('baseline.json', 'benchmark.json'):
+    ...     print name, ratio
+"""
+
+import gc
+import os
+import sys
+import json
+import time
+import random
+import platform
+import datetime
+import subprocess
+
+__all__ = ['micro_benchmarks', 'micro', 'time_calls', 'run_micro', 'run_macro',
+           'save_results', 'load_results', 'compare_results', 'object_size']
+
+#: micro benchmarks: name -> setup function returning (function, number of calls)
+micro_benchmarks = {}
+
+#: the seed of the inputs of the micro benchmarks
+seed = 0
+
+
+def micro(name):
+    """decorator registering a setup function in :data:`micro_benchmarks`"""
+    def register(setup):
+        micro_benchmarks[name] = setup
+        return setup
+    return register
+
+
+def _frames(n):
+    """n random (frame, rotation velocity, norm of the velocity, length)"""
+    from vplants.plantgl.all import Vector3, cross
+    from openalea.stocatree.frame import Frame
+    rng = random.Random(seed)
+    arguments = []
+    for i in range(n):
+        heading = Vector3(rng.gauss(0, 1), rng.gauss(0, 1), rng.gauss(0, 1))
+        heading.normalize()
+        left = cross(heading, Vector3(rng.gauss(0, 1), rng.gauss(0, 1), rng.gauss(0, 1)))
+        left.normalize()
+        velocity = Vector3(rng.gauss(0, 1), rng.gauss(0, 1), rng.gauss(0, 1))
+        norm = velocity.normalize()
+        arguments.append((Frame(heading, left, cross(heading, left)), velocity, norm,
+                          rng.uniform(0, 0.05)))
+    return arguments
+
+
+@micro('reorient_frame')
+def _reorient_frame():
+    from openalea.stocatree.physics import reorient_frame
+    arguments = [(hlu, velocity * norm, length) for hlu, velocity, norm, length in _frames(1000)]
+    def run():
+        for a in arguments:
+            reorient_frame(*a)
+    return run, len(arguments)
+
+
+@micro('reorient_frame.non_optimised')
+def _reorient_frame_non_optimised():
+    from openalea.stocatree.non_optimised import reorient_frame
+    arguments = _frames(1000)
+    def run():
+        for a in arguments:
+            reorient_frame(*a)
+    return run, len(arguments)
+
+
+@micro('reorient_frame.optimisation')
+def _reorient_frame_optimisation():
+    from openalea.stocatree.optimisation import reorient_frame
+    arguments = _frames(1000)
+    def run():
+        for a in arguments:
+            reorient_frame(*a)
+    return run, len(arguments)
+
+
+def _frame_arrays(n):
+    import numpy
+    numpy.random.seed(seed)
+    heading = numpy.random.randn(n, 3)
+    heading /= numpy.sqrt((heading ** 2).sum(axis=1))[:, None]
+    left = numpy.cross(heading, numpy.random.randn(n, 3))
+    left /= numpy.sqrt((left ** 2).sum(axis=1))[:, None]
+    velocity = numpy.random.randn(n, 3)
+    norm = numpy.sqrt((velocity ** 2).sum(axis=1))
+    velocity /= norm[:, None]
+    length = numpy.random.rand(n) * 0.05
+    return heading, left, velocity, norm, length
+
+
+@micro('reorient_frames')
+def _reorient_frames():
+    from openalea.stocatree.physics import reorient_frames
+    heading, left, velocity, norm, length = _frame_arrays(10000)
+    def run():
+        reorient_frames(heading.copy(), left.copy(), velocity, norm, length)
+    return run, 1
+
+
+@micro('propagate_frames')
+def _propagate_frames():
+    import numpy
+    from openalea.stocatree.physics import propagate_frames
+    n = 10000
+    heading, left, velocity, norm, length = _frame_arrays(n)
+    # a tree made of axes of 50 metamers, each axis borne by a random metamer
+    parent = numpy.arange(-1, n - 1)
+    branch = numpy.zeros(n, dtype=bool)
+    starts = numpy.arange(50, n, 50)
+    parent[starts] = (numpy.random.rand(len(starts)) * starts).astype(int)
+    branch[starts] = True
+    branching_angle = numpy.ones(n) * 0.7
+    phyllotactic_angle = numpy.ones(n) * 2.4
+    def run():
+        propagate_frames(parent, branch, heading.copy(), left.copy(), velocity, norm,
+                         length, branching_angle, phyllotactic_angle)
+    return run, 1
+
+
+def _radii(n):
+    rng = random.Random(seed)
+    return [(rng.uniform(0.001, 0.05), rng.uniform(0.001, 0.05)) for i in range(n)]
+
+
+@micro('get_new_radius')
+def _get_new_radius():
+    from openalea.stocatree.pipe import get_new_radius
+    arguments = _radii(10000)
+    def run():
+        for ra, rb in arguments:
+            get_new_radius(ra, rb)
+    return run, len(arguments)
+
+
+@micro('get_new_radius.optimisation')
+def _get_new_radius_optimisation():
+    from openalea.stocatree.optimisation import get_new_radius
+    arguments = _radii(10000)
+    def run():
+        for ra, rb in arguments:
+            get_new_radius(ra, rb)
+    return run, len(arguments)
+
+
+@micro('rotate_frame_at_branch')
+def _rotate_frame_at_branch():
+    from openalea.stocatree.physics import rotate_frame_at_branch
+    rng = random.Random(seed)
+    arguments = [(hlu, rng.uniform(0, 90), rng.uniform(0, 360)) for hlu, v, n, l in _frames(1000)]
+    def run():
+        for a in arguments:
+            rotate_frame_at_branch(*a)
+    return run, len(arguments)
+
+
+def _markov():
+    from openalea.sequence_analysis import HiddenSemiMarkov
+    from openalea.stocatree import get_shared_data
+    from openalea.stocatree.sequences import Markov
+    markov = Markov()
+    markov.hsm_medium = HiddenSemiMarkov(get_shared_data('fmodel_fuji_5_15_y3_96.txt'))
+    markov.hsm_long = HiddenSemiMarkov(get_shared_data('fmodel_fuji_16_65_y3_96.txt'))
+    return markov
+
+
+def _generate_sequence(obs, number):
+    def setup():
+        from openalea.stocatree.sequences import generate_sequence
+        markov = _markov()
+        def run():
+            random.seed(seed)
+            for i in range(number):
+                generate_sequence(obs, markov, year=1)
+        return run, number
+    return setup
+
+for _obs, _number in [('small', 1000), ('floral', 1000), ('medium', 100), ('large', 100)]:
+    micro('generate_sequence.' + _obs)(_generate_sequence(_obs, _number))
+
+
+@micro('generate_sequence.trunk')
+def _generate_trunk():
+    from openalea.stocatree import get_shared_data
+    from openalea.stocatree.sequences import generate_sequence
+    trunk_seq = get_shared_data('sequences_Fuji_4_txt.seq')
+    def run():
+        for select in range(4):
+            generate_sequence('trunk', trunk_seq=trunk_seq, select_trunk=select)
+    return run, 4
+
+
+@micro('terminal_fate')
+def _terminal_fate():
+    from openalea.stocatree.sequences import terminal_fate
+    def run():
+        random.seed(seed)
+        for i in range(1000):
+            terminal_fate(2, 'large')
+    return run, 1000
+
+
+@micro('terminal_fate.terminal_fates')
+def _terminal_fates():
+    from openalea.stocatree.sequences import terminal_fates
+    def run():
+        random.seed(seed)
+        terminal_fates(2, 'large', 1000)
+    return run, 1000
+
+
+def _function():
+    from openalea.stocatree import get_shared_data
+    from openalea.stocatree.tools.read_function import ReadFunction
+    return ReadFunction(get_shared_data('functions.fset'), 'leaf_area')
+
+
+@micro('ReadFunction.gety')
+def _gety():
+    function = _function()
+    rng = random.Random(seed)
+    x = [rng.uniform(0, 1) for i in range(10000)]
+    def run():
+        for value in x:
+            function.gety(value)
+    return run, len(x)
+
+
+@micro('ReadFunction.gety_array')
+def _gety_array():
+    import numpy
+    function = _function()
+    x = numpy.random.RandomState(seed).uniform(0, 1, 10000)
+    def run():
+        function.gety_array(x)
+    return run, 1
+
+
+def time_calls(function, repeat=5, clock=time.time):
+    """the durations of repeat calls of function, in seconds"""
+    durations = []
+    for i in range(repeat):
+        start = clock()
+        function()
+        durations.append(clock() - start)
+    return durations
+
+
+#: objects shared by all the instances, not counted by object_size
+_shared_types = (type, type(os), type(time_calls), type(len), basestring, type(None), bool)
+
+def object_size(obj, seen=None):
+    """the memory of an object and of the objects it references, in bytes
+
+    The objects referenced by obj are found with gc.get_referents (the
+    attributes stored in slots, the instance dictionary if it was created,
+    the items of containers); an object referenced several times is
+    counted once. Strings, classes, functions
+    and modules are shared, hence not counted. The objects of extension
+    modules (e.g. the Vector3 of plantgl) count for their sys.getsizeof.
+
+    >>> object_size(metamer)       # bytes per metamer of the lstring
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen or isinstance(obj, _shared_types):
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    for referent in gc.get_referents(obj):
+        size += object_size(referent, seen)
+    return size
+
+
+def _result(name, kind, durations=None, calls=1, error=None, **extra):
+    result = {'name': name, 'kind': kind, 'calls': calls, 'error': error}
+    if durations:
+        durations = sorted(durations)
+        result.update({'repeat': len(durations),
+                       'best': durations[0],
+                       'median': durations[len(durations) // 2],
+                       'per_call': durations[0] / calls})
+    result.update(extra)
+    return result
+
+
+def run_micro(names=None, repeat=5, verbose=False):
+    """run micro benchmarks
+
+    :param names: the names of the benchmarks (default is all of them)
+    :param repeat: number of timed runs of each benchmark, after a warm up run
+    :returns: list of result dictionaries with the name, the number of calls
+        per run, the best and median durations of a run and the best
+        duration per call (in seconds), or the error
+    """
+    if names is None:
+        names = sorted(micro_benchmarks)
+    results = []
+    for name in names:
+        try:
+            function, calls = micro_benchmarks[name]()
+            function()
+            result = _result(name, 'micro', time_calls(function, repeat), calls)
+        except Exception, e:
+            result = _result(name, 'micro', error='%s: %s' % (e.__class__.__name__, e))
+        if verbose:
+            _print(result)
+        results.append(result)
+    return results
+
+
+def run_macro(years=(1, 3, 5), lsystem_file=None, ini_file=None, seed=123456,
+              starting_year=None, parameters=None, verbose=False):
+    """run MAppleT.lpy headless for several numbers of simulated years
+
+    :param years: the numbers of simulated years
+    :param lsystem_file: the L-system (default is MAppleT.lpy of share/data)
+    :param ini_file: the configuration (default is MAppleT.ini next to the L-system)
+    :param seed: the seed of the simulations
+    :param starting_year: the first year (default is the one of the ini file)
+    :param parameters: other options, as a dictionary `section.name` -> value
+    :returns: list of result dictionaries with the duration of each simulation
+    """
+    from openalea.stocatree import get_shared_data
+    from openalea.stocatree.runner import ExperimentRunner
+
+    if lsystem_file is None:
+        lsystem_file = get_shared_data('MAppleT.lpy')
+    if ini_file is None:
+        ini_file = os.path.join(os.path.dirname(os.path.abspath(lsystem_file)), 'MAppleT.ini')
+    if starting_year is None:
+        starting_year = _starting_year(ini_file)
+    runner = ExperimentRunner(lsystem_file, ini_file, processes=0)
+
+    results = []
+    for n in years:
+        options = {'general.headless': True,
+                   'general.seed': seed,
+                   'general.starting_year': starting_year,
+                   'general.end_year': '%d-12-31' % (starting_year + n - 1)}
+        options.update(parameters or {})
+        name = 'MAppleT.%dy' % n
+        for run in runner.run([(0, options)]):
+            if run.success:
+                result = _result(name, 'macro', [run.duration], years=n, seed=seed)
+            else:
+                result = _result(name, 'macro', error=run.error, years=n, seed=seed)
+        if verbose:
+            _print(result)
+        results.append(result)
+    return results
+
+
+def _starting_year(ini_file):
+    from ConfigParser import ConfigParser
+    config = ConfigParser()
+    config.read(ini_file)
+    return config.getint('general', 'starting_year')
+
+
+def _print(result):
+    if result['error'] is None:
+        print '%-32s %12.6f s %12.3e s/call' % (result['name'], result['best'], result['per_call'])
+    else:
+        print '%-32s %s' % (result['name'], result['error'].strip().splitlines()[-1])
+
+
+def _commit():
+    """the git commit of the package, or None"""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    try:
+        process = subprocess.Popen(['git', 'rev-parse', 'HEAD'], cwd=directory,
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        output = process.communicate()[0]
+    except OSError:
+        return None
+    if process.returncode != 0:
+        return None
+    return output.strip()
+
+
+def save_results(results, filename):
+    """write results in a JSON file, with the commit and the platform"""
+    document = {'commit': _commit(),
+                'date': datetime.datetime.now().isoformat(),
+                'python': sys.version.split()[0],
+                'platform': platform.platform(),
+                'results': results}
+    f = open(filename, 'w')
+    try:
+        json.dump(document, f, indent=1, sort_keys=True)
+    finally:
+        f.close()
+
+
+def load_results(filename):
+    """the document written by :func:`save_results`"""
+    f = open(filename)
+    try:
+        return json.load(f)
+    finally:
+        f.close()
+
+
+def compare_results(baseline, current, tolerance=0.):
+    """compare the durations per call of two result files
+
+    :param baseline: the results of the reference commit (a filename or the
+        document of :func:`load_results`)
+    :param current: the results to compare
+    :param tolerance: only the benchmarks whose ratio current / baseline is
+        greater than 1 + tolerance are returned (use -1 to get all of them)
+    :returns: list of (name, baseline duration, current duration, ratio),
+        the slowest first
+    """
+    if isinstance(baseline, basestring):
+        baseline = load_results(baseline)
+    if isinstance(current, basestring):
+        current = load_results(current)
+    before = dict((r['name'], r['per_call']) for r in baseline['results'] if r['error'] is None)
+    rows = []
+    for result in current['results']:
+        name = result['name']
+        if result['error'] is not None or name not in before or before[name] <= 0:
+            continue
+        ratio = result['per_call'] / before[name]
+        if ratio > 1 + tolerance:
+            rows.append((name, before[name], result['per_call'], ratio))
+    rows.sort(key=lambda row: -row[3])
+    return rows
@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+"""
+.. topic:: checkpoint.py summary
+
+    Columnar binary checkpoints of a simulation
+
+    :Code: in progress
+    :Documentation: in progress
+    :Revision: $Id$
+    :Usage: >>> from openalea.stocatree.checkpoint import *
+
+.. testsetup::
+
+    from openalea.stocatree.checkpoint import *
+
+The writelstring phase of MAppleT.lpy used to pickle the whole
+:class:`~openalea.stocatree.tools.simulation.SimulationStocatree`, including
+the lstring, with the text protocol of cPickle. :func:`save_checkpoint` writes
+the same information in a NumPy `.npz` archive instead:
+
+    * the structure of the lstring, one code per module (see :data:`MODULES`)
+    * for each kind of data (metamer, apex, growth_unit), one array per
+      attribute, nested objects (leaf, fruit, hlu...) and vectors being
+      flattened into several columns
+    * the attributes that cannot be stored as arrays (lists, None, shared
+      objects...) and the simulation itself, pickled with the binary protocol
+
+:func:`load_checkpoint` returns the simulation with its lstring attribute
+filled, exactly as the unpickled `.simu` file, so that the axiom of
+MAppleT.lpy can restart from either format.
+
+:Example:
+
+    >>> simulation.load_save(thestring, data, tree, bud_break)
+    >>> save_checkpoint('1.0.npz', simulation)
+    >>> simulation = load_checkpoint('1.0.npz')
+"""
+
+import cPickle
+from itertools import izip
+
+import numpy
+from vplants.plantgl.all import Vector3
+
+from openalea.stocatree.metamer import metamer_data
+from openalea.stocatree.apex import apex_data
+from openalea.stocatree.growth_unit import growth_unit_data
+from openalea.stocatree.slotted import Slotted
+
+__all__ = ['save_checkpoint', 'load_checkpoint', 'FORMAT_VERSION', 'MODULES']
+
+#: version of the checkpoint format, increased at each incompatible change
+#: (2: the leaf and fruit states are stored as codes)
+FORMAT_VERSION = 2
+
+#: modules of the lstring, in the order of their codes
+MODULES = ['root', 'branch', 'sb', 'eb', 'metamer', 'apex', 'growth_unit']
+
+_kinds = [('metamer', metamer_data), ('apex', apex_data), ('growth_unit', growth_unit_data)]
+_scalars = {bool: bool, int: numpy.int64, long: numpy.int64, float: numpy.float64, str: str}
+_separator = '.'
+
+
+class _Missing(object):
+    """marks an attribute that some objects of a column do not have"""
+
+
+class _Empty:
+    """used to create old-style instances without calling their constructor"""
+
+
+def _new(cls):
+    """create an instance of cls without calling its constructor"""
+    if isinstance(cls, type):
+        return cls.__new__(cls)
+    obj = _Empty()
+    obj.__class__ = cls
+    return obj
+
+
+def _attributes(obj):
+    """dictionary of the attributes of an object, stored in slots or not"""
+    if isinstance(obj, Slotted):
+        return obj.__getstate__()
+    return vars(obj)
+
+
+def _restore(obj, state):
+    """set the attributes of an object created by :func:`_new`"""
+    if isinstance(obj, Slotted):
+        obj.__setstate__(state)
+    else:
+        obj.__dict__.update(state)
+
+
+def _record(values):
+    """return the class of the values if they can be flattened into columns
+
+    The values must be distinct instances of the same class of the
+    openalea.stocatree package.
+    """
+    if not values:
+        return None
+    cls = getattr(values[0], '__class__', None)
+    if not (hasattr(values[0], '__dict__') or isinstance(values[0], Slotted)) or \
+            not getattr(cls, '__module__', '').startswith('openalea.stocatree'):
+        return None
+    for value in values:
+        if getattr(value, '__class__', None) is not cls:
+            return None
+    if len(set(id(value) for value in values)) != len(values):
+        return None
+    return cls
+
+
+def _flatten(values, path, arrays, schema, residual):
+    """store the values of an attribute of all the objects of a kind
+
+    :param values: the value of the attribute for each object
+    :param path: name of the attribute, nested attributes being separated by dots
+    :param arrays: dictionary of the numpy columns
+    :param schema: dictionary path -> (type of column, class, attribute names)
+    :param residual: dictionary path -> list of the values that are pickled
+    """
+    types = set(type(value) for value in values)
+    if len(types) == 1:
+        vtype = types.pop()
+        if vtype in _scalars:
+            arrays[path] = numpy.array(values, dtype=_scalars[vtype])
+            schema[path] = ('scalar', vtype, None)
+            return
+        if vtype is Vector3:
+            arrays[path] = numpy.array([(v.x, v.y, v.z) for v in values], dtype=numpy.float64)
+            schema[path] = ('vector', None, None)
+            return
+    cls = _record(values)
+    if cls is not None:
+        states = [_attributes(value) for value in values]
+        names = set()
+        for state in states:
+            names.update(state.keys())
+        names = sorted(names)
+        schema[path] = ('record', cls, names)
+        for name in names:
+            _flatten([state.get(name, _Missing) for state in states],
+                     path + _separator + name, arrays, schema, residual)
+        return
+    schema[path] = ('object', None, None)
+    residual[path] = list(values)
+
+
+def _unflatten(size, path, arrays, schema, residual):
+    """rebuild the values of an attribute stored by :func:`_flatten`"""
+    kind, cls, names = schema[path]
+    if kind == 'scalar':
+        values = arrays[path].tolist()
+        if cls is long:
+            values = [long(value) for value in values]
+        return values
+    elif kind == 'vector':
+        return [Vector3(*row) for row in arrays[path].tolist()]
+    elif kind == 'record':
+        states = [{} for i in range(size)]
+        for name in names:
+            values = _unflatten(size, path + _separator + name, arrays, schema, residual)
+            for state, value in izip(states, values):
+                state[name] = value
+            if any(value is _Missing for value in values):
+                for state in states:
+                    if state[name] is _Missing:
+                        del state[name]
+        objects = [_new(cls) for i in range(size)]
+        for obj, state in izip(objects, states):
+            _restore(obj, state)
+        return objects
+    return residual[path]
+
+
+def _dumps(obj):
+    return numpy.frombuffer(cPickle.dumps(obj, cPickle.HIGHEST_PROTOCOL), dtype=numpy.uint8)
+
+
+def _loads(array):
+    return cPickle.loads(array.tostring())
+
+
+def save_checkpoint(filename, simulation, compress=True):
+    """save a simulation and its lstring in a columnar .npz archive
+
+    :param filename: name of the archive (numpy appends .npz if missing)
+    :param simulation: a :class:`~openalea.stocatree.tools.simulation.SimulationStocatree`
+        instance whose lstring, data, tree and bud_break attributes were set by
+        :meth:`~openalea.stocatree.tools.simulation.SimulationStocatree.load_save`
+    :param compress: compress the arrays (smaller files, slightly slower)
+    """
+    lstring = simulation.lstring or []
+    objects = dict((name, []) for name, cls in _kinds)
+    structure = numpy.zeros(len(lstring), dtype=numpy.int8)
+    for i, module in enumerate(lstring):
+        if isinstance(module, str):
+            structure[i] = MODULES.index(module)
+            continue
+        for name, cls in _kinds:
+            if isinstance(module, cls):
+                structure[i] = MODULES.index(name)
+                objects[name].append(module)
+                break
+        else:
+            raise TypeError('cannot save module %r of the lstring' % module)
+
+    arrays = {}
+    schema = {}
+    residual = {}
+    for name, cls in _kinds:
+        if objects[name]:
+            _flatten(objects[name], name, arrays, schema, residual)
+
+    simulation.lstring = None
+    try:
+        archive = dict(('column' + _separator + path, array) for path, array in arrays.iteritems())
+        archive['version'] = numpy.array(FORMAT_VERSION)
+        archive['structure'] = structure
+        archive['schema'] = _dumps(schema)
+        archive['residual'] = _dumps(residual)
+        archive['simulation'] = _dumps(simulation)
+    finally:
+        simulation.lstring = lstring
+
+    if compress:
+        numpy.savez_compressed(filename, **archive)
+    else:
+        numpy.savez(filename, **archive)
+
+
+def load_checkpoint(filename):
+    """load a simulation saved by :func:`save_checkpoint`
+
+    :returns: the simulation, whose lstring attribute is the list of strings
+        and metamer_data, apex_data, growth_unit_data instances expected by
+        the axiom of MAppleT.lpy
+    """
+    archive = numpy.load(filename)
+    try:
+        version = int(archive['version'])
+        if version > FORMAT_VERSION:
+            raise ValueError('%s uses the checkpoint format %s, only formats up to %s are supported'
+                             % (filename, version, FORMAT_VERSION))
+        structure = archive['structure']
+        schema = _loads(archive['schema'])
+        residual = _loads(archive['residual'])
+        simulation = _loads(archive['simulation'])
+        prefix = 'column' + _separator
+        arrays = dict((key[len(prefix):], archive[key]) for key in archive.files
+                      if key.startswith(prefix))
+    finally:
+        archive.close()
+
+    objects = {}
+    for name, cls in _kinds:
+        size = int((structure == MODULES.index(name)).sum())
+        if size:
+            objects[name] = iter(_unflatten(size, name, arrays, schema, residual))
+
+    lstring = []
+    for code in structure.tolist():
+        name = MODULES[code]
+        if name in objects:
+            lstring.append(objects[name].next())
+        else:
+            lstring.append(name)
+    simulation.lstring = lstring
+    return simulation
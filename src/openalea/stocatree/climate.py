@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+"""
+.. topic:: climate.py summary
+
+    Daily temperatures of several years and the phenology derived from them
+
+    :Code: in progress
+    :Documentation: in progress
+    :Revision: $Id$
+    :Usage: >>> from openalea.stocatree.climate import *
+
+.. testsetup::
+
+    from openalea.stocatree.climate import *
+
+:class:`~openalea.stocatree.temperature_effects.Tp_date` used to open
+temperature_data.xls with xlrd each time the date of bud break of a year was
+required, and walked the sheet cell by cell. :class:`ClimateCalendar` reads
+the sheet (or its CSV copy, which does not need xlrd) once into a NumPy array
+with one row per day and one column per year. The chilling and heat
+accumulations are then cumulative sums over the rows, computed for all the
+years at once by :meth:`ClimateCalendar.bud_break_dates`.
+
+The rows follow the calendar of the sheet: only the month and the day of the
+dates of the first column matter. The column of a year Y contains the
+temperatures from the onset of the chilling effect (end of October) of the
+year Y-1 to the spring of the year Y.
+
+:Example:
+
+    >>> climate = read_climate('temperature_data.csv')
+    >>> dates = climate.bud_break_dates([1994, 1995], heat_quantity_required=83.58)
+    >>> dormancy_break, bud_break = dates[1994]
+    >>> bud_break
+    (1994, 4, 13, 0, 0)
+"""
+# the stocatree package has its own csv module
+from __future__ import absolute_import
+
+import os
+import csv
+import calendar
+import datetime
+
+import numpy
+
+__all__ = ['ClimateCalendar', 'read_climate']
+
+
+class ClimateCalendar(object):
+    """daily temperatures of several years on a common calendar
+
+    :param dates: the (month, day) of each row
+    :param years: the year of each column
+    :param temperatures: array of shape (number of dates, number of years)
+    """
+    def __init__(self, dates, years, temperatures):
+        self.dates = [(int(month), int(day)) for month, day in dates]
+        self.years = [int(year) for year in years]
+        self.temperatures = numpy.asarray(temperatures, dtype=float)
+        assert self.temperatures.shape == (len(self.dates), len(self.years))
+        self._columns = dict((year, i) for i, year in enumerate(self.years))
+
+    @classmethod
+    def from_xls(cls, filename, sheet='moy'):
+        """read a sheet of temperature_data.xls (requires xlrd)
+
+        The first row contains the years, the first column the dates.
+        """
+        import xlrd
+        book = xlrd.open_workbook(filename)
+        data = book.sheet_by_name(sheet)
+        years = data.row_values(0)[1:]
+        dates = []
+        temperatures = []
+        for i in range(1, data.nrows):
+            row = data.row_values(i)
+            dates.append(xlrd.xldate_as_tuple(row[0], book.datemode)[1:3])
+            temperatures.append([numpy.nan if value == '' else value for value in row[1:]])
+        return cls(dates, years, temperatures)
+
+    @classmethod
+    def from_csv(cls, filename):
+        """read a CSV file written by :meth:`save_csv`
+
+        The first row contains the years, the first column the dates
+        (YYYY-MM-DD, the year being ignored).
+        """
+        f = open(filename, 'rb')
+        try:
+            rows = list(csv.reader(f))
+        finally:
+            f.close()
+        years = rows[0][1:]
+        dates = []
+        temperatures = []
+        for row in rows[1:]:
+            if not row:
+                continue
+            dates.append(row[0].split('-')[1:3])
+            temperatures.append([float(value) if value != '' else numpy.nan for value in row[1:]])
+        return cls(dates, years, temperatures)
+
+    def save_csv(self, filename, year=2011):
+        """write the calendar in a CSV file readable by :meth:`from_csv`
+
+        :param year: the year written in the dates of the first column
+        """
+        f = open(filename, 'wb')
+        try:
+            writer = csv.writer(f, lineterminator='\n')
+            writer.writerow([''] + self.years)
+            for (month, day), row in zip(self.dates, self.temperatures):
+                writer.writerow(['%04d-%02d-%02d' % (year, month, day)] +
+                                ['' if numpy.isnan(value) else repr(value) for value in row])
+        finally:
+            f.close()
+
+    def column(self, year):
+        """the daily temperatures of a year"""
+        return self.temperatures[:, self._columns[year]]
+
+    def onset_row(self, month, day):
+        """the first row of the calendar at the given month and day"""
+        try:
+            return self.dates.index((month, day))
+        except ValueError:
+            raise ValueError('no date %02d-%02d in the climate calendar' % (month, day))
+
+    def _date(self, row, onset_year, onset_month):
+        """the date of a row as (year, month, day, 0, 0), as in Tp_date
+
+        The dates before the onset month are in the onset year, shifted by
+        one day after February in leap years since the calendar of the sheet
+        has no 29 February.
+        """
+        month, day = self.dates[row]
+        if month < onset_month:
+            if calendar.isleap(onset_year) and month > 2:
+                date = datetime.date(onset_year, month, day) - datetime.timedelta(1)
+                return (date.year, date.month, date.day, 0, 0)
+            return (onset_year, month, day, 0, 0)
+        return (onset_year - 1, month, day, 0, 0)
+
+    def bud_break_dates(self, years=None,
+                        optimal_temperature=1.1,
+                        chilling_effect_interval=20,
+                        chilling_effect_onset_month=10,
+                        chilling_effect_onset_day=30,
+                        chilling_quantity_required=56,
+                        characteristic_temperature=9.0,
+                        heat_sigmoidal=False,
+                        sigmoidal_slope=6.0,
+                        heat_quantity_required=83.58):
+        """dates of dormancy break and bud break of several years
+
+        From the onset date, the chilling effect of each day is accumulated
+        until chilling_quantity_required is reached (dormancy break), then
+        the heat effect of the following days until heat_quantity_required
+        is reached (bud break). The parameters are those of
+        :class:`~openalea.stocatree.temperature_effects.Tp_date`.
+
+        :param years: the years (default is all the years of the calendar)
+        :returns: dictionary year -> (dormancy break date, bud break date),
+            the dates being (year, month, day, 0, 0) tuples or None if the
+            quantity required is never reached
+        """
+        if years is None:
+            years = self.years
+        years = list(years)
+        for year in years:
+            if year not in self._columns:
+                raise ValueError('no temperature for the year %s in the climate calendar' % year)
+        onset = self.onset_row(chilling_effect_onset_month, chilling_effect_onset_day)
+        temperatures = self.temperatures[onset:, [self._columns[year] for year in years]]
+
+        chilling = numpy.where((temperatures > optimal_temperature - chilling_effect_interval) &
+                               (temperatures < optimal_temperature + chilling_effect_interval),
+                               1 - numpy.abs(temperatures - optimal_temperature) / chilling_effect_interval,
+                               0.)
+        reached = numpy.cumsum(chilling, axis=0) >= chilling_quantity_required
+        dormancy = reached.argmax(axis=0)
+        dormant = reached.any(axis=0)
+
+        if heat_sigmoidal:
+            heat = 2 / (1 + numpy.exp((temperatures - characteristic_temperature) / sigmoidal_slope))
+        else:
+            heat = numpy.exp(temperatures / characteristic_temperature - 1)
+        after = numpy.arange(len(temperatures))[:, numpy.newaxis] > dormancy
+        heat = numpy.cumsum(numpy.where(after, heat, 0.), axis=0)
+        reached = after & (heat >= heat_quantity_required)
+        bud = reached.argmax(axis=0)
+        budding = reached.any(axis=0) & dormant
+
+        dates = {}
+        for i, year in enumerate(years):
+            dormancy_date = bud_date = None
+            if dormant[i]:
+                dormancy_date = self._date(onset + dormancy[i], year, chilling_effect_onset_month)
+            if budding[i]:
+                bud_date = self._date(onset + bud[i], year, chilling_effect_onset_month)
+            dates[year] = (dormancy_date, bud_date)
+        return dates
+
+
+#: climate files already read: absolute filename -> (modification time, ClimateCalendar)
+_climates = {}
+
+def read_climate(filename):
+    """the :class:`ClimateCalendar` of a .csv or .xls file, read only once
+    (until the file is modified)"""
+    key = os.path.abspath(filename)
+    mtime = os.path.getmtime(key)
+    cached = _climates.get(key)
+    if cached is None or cached[0] != mtime:
+        if filename.endswith('.xls'):
+            climate = ClimateCalendar.from_xls(filename)
+        else:
+            climate = ClimateCalendar.from_csv(filename)
+        cached = (mtime, climate)
+        _climates[key] = cached
+    return cached[1]
@@ -67,6 +67,11 @@ class LstringCSV(GroupCSV):
                         self.op.write("N/A" + ",")
                 self.op.write("\n")
 
+    def item_rows(self, rows):
+        # rows of strings, one per metamer, in the order of item_name_list
+        for row in rows:
+            self.op.write("".join(v + "," for v in row) + "\n")
+
 class ExprecCSV(GroupCSV):
     def __init__(self, exp_id, finidate, para_dic, file_name, output_directory):
         self.exp_id = exp_id
@@ -1,15 +1,128 @@
 """
 This module was written by Han in April and May, 2011
+
+The attributes of the metamers are read from the lstring once by
+:class:`MetamerTable` and shared by the grouping levels. Each metamer gets the
+code of its group (groups numbered by first appearance) so that the sums and
+counts of all the groups are computed at once with numpy.bincount.
 """
 
+import numpy
+
 from openalea.stocatree.csv import GroupCSV, LstringCSV
 
+# attributes that are strings: the value of a group is the one of its first metamer
+_first_value_attributes = ("parent_observation", "leaf_state", "zone")
+
+_required = object()
+_absent = object()
+
+
+class MetamerTable(object):
+    """the metamers of an lstring and their attributes, read once
+
+    :param lstring: the lstring (or a pseudo lstring of the post-processing)
+    """
+    def __init__(self, lstring):
+        # the index of each metamer in the lstring
+        self.index = []
+        self.metamers = []
+        for i, elt in enumerate(lstring):
+            if elt.name == 'metamer':
+                self.index.append(i)
+                self.metamers.append(elt[0])
+        self._columns = {}
+        self._arrays = {}
+        self._floats = {}
+
+    def __len__(self):
+        return len(self.metamers)
+
+    def column(self, name, default=_required):
+        """the list of the values of an attribute of the metamers
+
+        :param default: the value for the metamers without this attribute;
+            if not given, AttributeError is raised for such metamers
+        """
+        key = (name, default)
+        if key not in self._columns:
+            if default is _required:
+                values = [getattr(m, name) for m in self.metamers]
+            else:
+                values = [getattr(m, name, default) for m in self.metamers]
+            self._columns[key] = values
+        return self._columns[key]
+
+    def array(self, name):
+        """the values of an attribute as a numeric array, or None if some
+        values are not numbers or are missing"""
+        if name not in self._arrays:
+            self._arrays[name] = _numeric(self.column(name, "N/A"))
+        return self._arrays[name]
+
+    def floats(self, name):
+        """boolean array, True for the metamers whose attribute is a float"""
+        if name not in self._floats:
+            if self.array(name).dtype.kind == 'f':
+                floats = [isinstance(v, float) for v in self.column(name, "N/A")]
+            else:
+                floats = numpy.zeros(len(self), dtype=bool)
+            self._floats[name] = numpy.array(floats, dtype=bool)
+        return self._floats[name]
+
+
+def _codes(values):
+    """the distinct values in order of first appearance and the code of each value"""
+    first = {}
+    codes = [first.setdefault(value, len(first)) for value in values]
+    groups = [None] * len(first)
+    for value, code in first.iteritems():
+        groups[code] = value
+    return groups, numpy.array(codes, dtype=int)
+
+
+def _numeric(values):
+    """values as a numeric array, or None if some values are not numbers"""
+    array = numpy.array(values)
+    if array.dtype.kind not in 'biuf':
+        return None
+    return array
+
+
+def _grouped_sums(array, floats, codes, size):
+    """the sum of the values of each group, as Python's sum() gives it
+
+    The sum of a group is an int if none of its values is a float (so that
+    the division of Han's averages remains an integer division).
+
+    :param array: the numeric values
+    :param floats: True for the values that are floats (empty if none is)
+    """
+    sums = numpy.bincount(codes, weights=array, minlength=size).tolist()
+    floats = numpy.bincount(codes[floats], minlength=size).tolist()
+    return [s if f else int(s) for s, f in zip(sums, floats)]
+
+
+def _average(avl):
+    # Here it is divided by (len(avl) - avl.count(0)) rather
+    # than len(avl). This is to avoid that, in a branch for
+    # example, there are some metamers without leaves (scar),
+    # thus the average value of leaf area of this branch should
+    # not be calculated from division by the number of metamers
+    # it has.
+    if len(avl) != 0 and (len(avl) - avl.count(0)) != 0:
+        return sum(avl)/(len(avl) - avl.count(0))
+    return 0
+
+
 class Group(object):
-    def __init__(self, lstring, group_id_name = '', attribute_list = []):
+    def __init__(self, lstring, group_id_name = '', attribute_list = [], table = None):
         # The name for the group id. For example, "parent_unit_id" if this is for the unit level.
         self.group_id_name = group_id_name
         # The list of attributes that are studied here. For example ['length', 'radius']
         self.attribute_list = attribute_list
+        # The MetamerTable of the lstring, built by id_group if not given
+        self.table = table
 
         # a dictionary to store match between group id and its included metamer ids, {group_id:[id_metamer_1, id_metamer_2, ...]}
         # where the group can be a unit or a branch
@@ -23,6 +136,14 @@ class Group(object):
 
         self.group_metamer_attributes = {}
 
+        # The group ids in order of first appearance and the position of the
+        # group of each metamer of the table in this list
+        self.groups = []
+        self.codes = numpy.zeros(0, dtype=int)
+        # The order of the metamers sorted by group and the bounds of the groups in it
+        self._order = []
+        self._bounds = [0]
+
     """
     The id_group method is to fill the
             self.group_metamer dictionary to:
@@ -53,30 +174,35 @@ class Group(object):
     """
 
     def id_group(self,lstring):
-        for i, elt in enumerate(lstring):
-            if elt.name == 'metamer':
-                # For example, if the value of self.group_id_name is "parent_unit_id",
-                # then group_id will have the value of elt[0].parent_unit_id
-                group_id = getattr(elt[0], self.group_id_name)
-
-                if group_id in self.group_metamer:
-                    self.group_metamer[group_id].append(i)
-                else:
-                    self.group_metamer.update({group_id:[i]})
-
-                if self.group_id_name != "parent_unit_id":
-                    if group_id in self.group_unit:
-                        if lstring[i][0].parent_unit_id not in self.group_unit[group_id]:
-                            self.group_unit[group_id].append(lstring[i][0].parent_unit_id)
-                    else:
-                        self.group_unit.update({group_id: [lstring[i][0].parent_unit_id]})
-
-                if self.group_id_name == "parent_tree_id":
-                    if group_id in self.group_fbr:
-                        if lstring[i][0].parent_fbr_id not in self.group_fbr[group_id]:
-                            self.group_fbr[group_id].append(lstring[i][0].parent_fbr_id)
-                    else:
-                        self.group_fbr.update({group_id: [lstring[i][0].parent_fbr_id]})
+        if self.table is None:
+            self.table = MetamerTable(lstring)
+        # For example, if the value of self.group_id_name is "parent_unit_id",
+        # then the group id of a metamer is the value of its parent_unit_id
+        self.groups, self.codes = _codes(self.table.column(self.group_id_name))
+        self._order = numpy.argsort(self.codes, kind='mergesort').tolist()
+        self._bounds = [0] + numpy.bincount(self.codes, minlength=len(self.groups)).cumsum().tolist()
+
+        for gid, mid_list in zip(self.groups, self._split(self.table.index)):
+            self.group_metamer[gid] = mid_list
+
+        if self.group_id_name != "parent_unit_id":
+            self._distinct(self.group_unit, "parent_unit_id")
+        if self.group_id_name == "parent_tree_id":
+            self._distinct(self.group_fbr, "parent_fbr_id")
+
+    def _split(self, values):
+        """the values of the metamers of each group, in the order of self.groups"""
+        ordered = [values[i] for i in self._order]
+        return [ordered[start:end] for start, end in zip(self._bounds[:-1], self._bounds[1:])]
+
+    def _distinct(self, group_dict, name):
+        """fill group_dict with the distinct values of an attribute in each
+        group, in order of first appearance"""
+        seen = set()
+        for code, value in zip(self.codes.tolist(), self.table.column(name)):
+            if (code, value) not in seen:
+                seen.add((code, value))
+                group_dict.setdefault(self.groups[code], []).append(value)
 
     def attr_group(self,lstring):
         self.id_group(lstring)
@@ -90,17 +216,10 @@ class Group(object):
                 else:
                     self.group_metamer_attributes.update({attribute:{}})
 
-        for gid,mid_list in self.group_metamer.iteritems():
-            for attr in self.group_metamer_attributes:
-                if gid not in self.group_metamer_attributes[attr]:
-                    self.group_metamer_attributes[attr].update({gid:[]})
-                for mid in mid_list:
-                    # Note that the value of attr is a string, thus the "getattr()" method is needed here
-                    # to return the value of attribute that corresponds to attr
-                    if hasattr(lstring[mid][0],attr):
-                        self.group_metamer_attributes[attr][gid].append(getattr(lstring[mid][0],attr))
-                    else:
-                        self.group_metamer_attributes[attr][gid].append("N/A")
+        for attr in self.group_metamer_attributes:
+            # The metamers without this attribute have the value "N/A"
+            for gid, values in zip(self.groups, self._split(self.table.column(attr, "N/A"))):
+                self.group_metamer_attributes[attr].setdefault(gid, []).extend(values)
 
 
         """
@@ -128,10 +247,29 @@ class Group(object):
         }
 
         """
-        """
-            if hasattr(elt[0], attribute):
-                if attribute in self.group_metamer_attributes:
-        """
+
+    def sums(self, attr):
+        """the sum of an attribute in each group, in the order of self.groups"""
+        array = self.table.array(attr)
+        if array is None:
+            return [sum(self.group_metamer_attributes[attr][gid]) for gid in self.groups]
+        return _grouped_sums(array, self.table.floats(attr), self.codes, len(self.groups))
+
+    def nonzero(self, attr):
+        """the number of metamers of each group whose attribute is not 0"""
+        array = self.table.array(attr)
+        if array is None:
+            nonzero = numpy.array([v != 0 for v in self.table.column(attr, "N/A")], dtype=bool)
+        else:
+            nonzero = array != 0
+        return numpy.bincount(self.codes[nonzero], minlength=len(self.groups)).tolist()
+
+    def averages(self, attr):
+        """the average of an attribute in each group, the metamers with a
+        value of 0 being ignored (see Statistics.average)"""
+        if self.table.array(attr) is None:
+            return [_average(self.group_metamer_attributes[attr][gid]) for gid in self.groups]
+        return [s/n if n != 0 else 0 for s, n in zip(self.sums(attr), self.nonzero(attr))]
 
 
 
@@ -158,6 +296,9 @@ class Statistics(object):
 
         self.metamer_file_name = "Statistics_Metamer.csv"
 
+        # the attributes of the metamers, shared by the three levels
+        self.table = MetamerTable(lstring)
+
         if self.shoot_level:
             self.shoot_avg = self.average(lstring, "parent_unit_id")
             self.output("parent_unit_id", self.shoot_avg)
@@ -191,7 +332,7 @@ class Statistics(object):
             .
         }
         """
-        grp = Group(lstring, group_id_name, self.attribute_list)
+        grp = Group(lstring, group_id_name, self.attribute_list, table=self.table)
         grp.attr_group(lstring)
 
         self.groupid_values.update({group_id_name: grp.group_metamer.keys()})
@@ -226,45 +367,31 @@ class Statistics(object):
         """
 
         for attr,groups in grp.group_metamer_attributes.iteritems():
-            if attr not in group_avg:
-                group_avg.update({attr:{}})
-            # Here avl is a list of metamer attribute values
-            for gid,avl in groups.iteritems():
-                # Since the value of "parent_observation" is a string, it cannot
-                # really be averaged
-                if attr == "parent_observation" \
-                            or attr == "leaf_state"\
-                            or attr == "zone":
-                    group_avg[attr].update({gid : grp.group_metamer_attributes[attr][gid][0]})
-                    #print attr, group_avg[attr]
-                else:
-                    if len(avl) != 0:
-                        # Here it is divided by (len(avl) - avl.count(0)) rather
-                        # than len(avl). This is to avoid that, in a branch for
-                        # example, there are some metamers without leaves (scar),
-                        # thus the average value of leaf area of this branch should
-                        # not be calculated from division by the number of metamers
-                        # it has.
-                        if (len(avl) - avl.count(0)) != 0:
-                            a = sum(avl)/(len(avl) - avl.count(0))
-                        else:
-                            a = 0
-                    else:
-                        a = 0
-                    group_avg[attr].update({gid:a})
+            # Since the value of "parent_observation" is a string, it cannot
+            # really be averaged
+            if attr in _first_value_attributes:
+                group_avg[attr] = dict((gid, groups[gid][0]) for gid in grp.groups)
+            else:
+                group_avg[attr] = dict(zip(grp.groups, grp.averages(attr)))
 
 
         if "star_pgl" in group_avg:
             group_avg.update({"total_star":{}})
-            for gid in grp.group_metamer.keys():
-                if sum(grp.group_metamer_attributes["ta_pgl"][gid]) !=0:
-                    group_avg["total_star"].update({gid: sum(grp.group_metamer_attributes["sa_pgl"][gid])/sum(grp.group_metamer_attributes["ta_pgl"][gid])})
+            for gid, sa, ta in zip(grp.groups, grp.sums("sa_pgl"), grp.sums("ta_pgl")):
+                if ta !=0:
+                    group_avg["total_star"].update({gid: sa/ta})
                 else:
                     group_avg["total_star"].update({gid: 0})
 
         self.gp_stat_updt(group_avg, "metamer_number")
         self.gp_stat_updt(group_avg, "leaf_number")
-        for gid,v in self.group_metamer[group_id_name].iteritems():
+        if "leaf_area" in grp.group_metamer_attributes:
+            leaves = grp.nonzero("leaf_area")
+        else:
+            growing = numpy.array([state == "growing" for state in self.table.column("leaf_state")], dtype=bool)
+            leaves = numpy.bincount(grp.codes[growing], minlength=len(grp.groups)).tolist()
+        for gid, leaf_number in zip(grp.groups, leaves):
+            v = self.group_metamer[group_id_name][gid]
             #group_avg["metamer_number"].update({gid: len(v)})
             #Modified by Han on 12-01-2012, because there are two extra elements
             #lstring[0] and lstring[1] in the pseudo lstring
@@ -272,16 +399,9 @@ class Statistics(object):
                 group_avg["metamer_number"].update({gid: len(v)})
             else:
                 group_avg["metamer_number"].update({gid: (len(v)-2)})
-            if "leaf_area" in grp.group_metamer_attributes:
-                if gid > 0:
-                    group_avg["leaf_number"].update({gid: (len(grp.group_metamer_attributes["leaf_area"][gid]) - grp.group_metamer_attributes["leaf_area"][gid].count(0))})
-                else:
-                    group_avg["leaf_number"].update({gid: (len(grp.group_metamer_attributes["leaf_area"][gid]) - grp.group_metamer_attributes["leaf_area"][gid].count(0) - 2)})
-            else:
-                group_avg["leaf_number"].update({gid: 0})
-                for i in v:
-                    if lstring[i][0].leaf_state == "growing":
-                        group_avg["leaf_number"][gid] += 1
+            if "leaf_area" in grp.group_metamer_attributes and not gid > 0:
+                leaf_number -= 2
+            group_avg["leaf_number"].update({gid: leaf_number})
             assert group_avg["leaf_number"][gid] <= group_avg["metamer_number"][gid]
 
 
@@ -402,9 +522,20 @@ class Statistics(object):
         csv.open()
         if csv.read() == '':
             csv.item_names()
-        csv.item_values(lstring)
+        csv.item_rows(zip(*[self._details(n) for n in item_name_list]))
         csv.close()
 
+    def _details(self, name):
+        """the column of the metamer file for an item name, as LstringCSV.item_values writes it"""
+        values = self.table.column(name, _absent)
+        if name == "lstring_id":
+            return [str(k) if v is _absent else str(v) for k, v in zip(self.table.index, values)]
+        if name in self.exp_info:
+            default = str(self.exp_info[name])
+        else:
+            default = "N/A"
+        return [default if v is _absent else str(v) for v in values]
+
 
     def gp_stat_updt(self, group_stat, attribute_name):
         if attribute_name not in group_stat:
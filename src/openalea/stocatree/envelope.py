@@ -5,11 +5,12 @@ import openalea.fractalysis.light as lit
 import openalea.plantgl.all as pgl
 import os.path as op
 from os import getcwd
-from numpy import sin, radians, array
+from numpy import sin, radians, array, dot
 import os
+from openalea.stocatree.sky import multiscale_star
 #The "eid" argument was added by Han on 19-03-2012, namely exp_id
 #The "growth_date" argument was added by Han on 19-03-2012
-def IntegratedMultiScaleStar(treename, ctrd_scene, scale_dict_list, growth_date, distrib=[['R','R','R'],['A','R','R'],['A','A','R'], ['A','A','A']], save_pth = getcwd(), eid=0):
+def IntegratedMultiScaleStar(treename, ctrd_scene, scale_dict_list, growth_date, distrib=[['R','R','R'],['A','R','R'],['A','A','R'], ['A','A','A']], save_pth = getcwd(), eid=0, processes=0):
 
   #os.chdir(save_pth)
 
@@ -21,53 +22,29 @@ def IntegratedMultiScaleStar(treename, ctrd_scene, scale_dict_list, growth_date,
   - scale_dict_list = the list of scale dictionaries
   - distrib = the list of scenario to compute
   - save_pth = the path to save the outputs, default to current dir
+  - processes = number of processes sharing the directions, see
+    openalea.stocatree.sky.multiscale_star (default 0: current process only)
   """
   pgl.Viewer.setBatchMode(True)
   scc=fruti.centerScene( ctrd_scene )
   ss=lit.ssFromDict(treename, scc, scale_dict_list, "CvxHull")
 
-  myresult = {}
-  #for i in range(1,47):
-  for i in range(1,47):
-    res = ss.computeDir(skt_idx=i, distrib=[['R','R','R'],['A','R','R'],['A','A','R'], ['A','A','A']])
-    az,el,wg = lit.sunDome.getSkyTurtleAt(i)
-    wg2 = wg*sin(radians(el))
-
-    #Added by Han on 19-03-2012
-
-    sc1=ss.genScaleScene(1)
-    sc1_name = str(eid)+"_env_1_"+str(growth_date)
-    sc1.save(sc1_name+".bgeom")
-    sc2=ss.genScaleScene(2)
-    sc2_name = str(eid)+"_env_2_"+str(growth_date)
-    sc2.save(sc2_name+".bgeom")
-    sc3=ss.genScaleScene(3)
-    sc3_name = str(eid)+"_env_3_"+str(growth_date)
-    sc3.save(sc3_name+".bgeom")
-    sc4=ss.genScaleScene(4)
-    sc4_name = str(eid)+"_env_4_"+str(growth_date)
-    sc4.save(sc4_name+".bgeom")
-    """
-    sc1=ss.genScaleScene(1)
-    sc1.save(str(eid)+"_env_1"+str(growth_date)+".bgeom")
-    sc2=ss.genScaleScene(2)
-    sc2.save(str(eid)+"_env_1"+str(growth_date)+".bgeom")
-    sc3=ss.genScaleScene(3)
-    sc3.save(str(eid)+"_env_1"+str(growth_date)+".bgeom")
-    sc4=ss.genScaleScene(4)
-    sc4.save(str(eid)+"_env_1"+str(growth_date)+".bgeom")
-    """
+  #Added by Han on 19-03-2012
+  #The scale scenes do not depend on the direction: saved once
+  for scale in range(1, 5):
+    sc = ss.genScaleScene(scale)
+    sc.save(str(eid)+"_env_"+str(scale)+"_"+str(growth_date)+".bgeom")
 
-    tmplist = myresult.get('weight', [])
-    tmplist.append(wg2)
-    myresult['weight'] = tmplist
-    tmplist = myresult.get('turbid', [])
-    tmplist.append(res['Star_turbid'])
-    myresult['turbid'] = tmplist
-    for d in distrib:
-      tmplist = myresult.get(str(d), [])
-      tmplist.append(res['Star_'+str(d)])
-      myresult[str(d)] = tmplist
+  directions = range(1,47)
+  weights = []
+  for i in directions:
+    az,el,wg = lit.sunDome.getSkyTurtleAt(i)
+    weights.append(wg*sin(radians(el)))
+  soc = array(weights)
+  # one row per direction: turbid STAR then the STAR of each scenario
+  stars = multiscale_star(ss, treename, scc, scale_dict_list, distrib,
+                          indices=directions, processes=processes)
+  integrated = dot(soc, stars)
 
   sav = op.join(save_pth, 'IntegratedMultiScaleStar.csv')
   if not op.isfile(sav):
@@ -80,13 +57,11 @@ def IntegratedMultiScaleStar(treename, ctrd_scene, scale_dict_list, growth_date,
     f.write(header)
     f.close()
 
-  #print myresult
-  soc = array(myresult['weight'])
   f = open(sav, 'a')
   #Modified by Han on 19-03-2012 for the addition of "Growth_Date"
-  row = str(growth_date) + ';' + str(treename) + ';' + str((array(myresult['turbid'])*soc).sum())
-  for d in distrib:
-    row += ';'+str((array(myresult[str(d)])*soc).sum())
+  row = str(growth_date) + ';' + str(treename) + ';' + str(integrated[0])
+  for i, d in enumerate(distrib):
+    row += ';'+str(integrated[i+1])
   row += '\n'
   f.write(row)
   f.close()
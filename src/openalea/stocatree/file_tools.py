@@ -275,36 +275,32 @@ class Mtg_Processing(object):
         #of self.pseudo_lstring are identical at last.
         ############################################################################
 
-        pl = [None] * pl_size
-        for i in range(len(pl)):
-            pl[i] = L_Element()
-            pl[i].append(Metamer_Format())
+        pl = [Metamer_Record() for i in range(pl_size)]
 
 
         #pl = [None] * pl_size
         for k in self.attr_dict.keys():
-            d = Metamer_Format()
+            d = Metamer_Record()
             for attr, value in self.attr_dict[k].iteritems():
-                if attr in vars(d).keys():
-                    vars(d)[attr] = self.attr_dict[k][attr]
+                # leaf_state does not change the state of the leaf, which
+                # stays "" in a pseudo lstring read from an MTG file
+                if attr in Metamer_Record.fields:
+                    setattr(d, attr, value)
                 else:
                     if attr == "branch_id":
-                        d.parent_fbr_id = self.attr_dict[k][attr]
+                        d.parent_fbr_id = value
                     elif attr == "unit_id":
-                        d.parent_unit_id = self.attr_dict[k][attr]
+                        d.parent_unit_id = value
                     elif attr == "observation":
-                        d.parent_observation = self.attr_dict[k][attr]
+                        d.parent_observation = value
                         #print attr, d.parent_observation
-                    elif attr == "leaf_state":
-                        d.leaf_state = self.attr_dict[k][attr]
-                        d.leaf.state = d.leaf_state
                     else:
-                        vars(d).update({attr: value})
+                        # lstring_id has a slot, the other attributes go
+                        # in the __dict__ of the record
+                        setattr(d, attr, value)
                         d.parent_tree_id = 0
             #print d.lstring_id
-            ne = L_Element()
-            ne.append(d)
-            pl[k] = ne
+            pl[k] = d
             #print e.name
             #print "############################"
             #print len(pl[k])
@@ -313,6 +309,65 @@ class Mtg_Processing(object):
 
         return pl
 
+#A compact data format for the elements of pseudo_lstring
+class Metamer_Record(object):
+    """snapshot of the fields of a metamer used by STAR and Statistics
+
+    A record is its own lstring element (record.name, record[0]) and its own
+    leaf (record.leaf.state), so that a pseudo lstring is a plain list of
+    records. It pickles as a tuple of values. The lstring_id slot is only
+    set by Mtg_Processing; until then the record has no lstring_id
+    attribute. The other attributes read from an MTG file (e.g. age) are
+    stored in a __dict__, only created for the records that have some.
+    """
+    name = "metamer"
+    #The copied fields, state being the state of the leaf
+    fields = ("parent_unit_id", "parent_fbr_id", "parent_tree_id",
+              "leaf_state", "leaf_area", "ta_pgl", "sa_pgl", "star_pgl",
+              "length", "radius", "parent_observation", "zone", "state")
+    defaults = (-1, -1, -1, "", 0, 0, 0, 0, 0, 0, "", "", "")
+    __slots__ = fields + ("lstring_id", "__dict__")
+
+    def __init__(self, *values):
+        for field, value in zip(self.fields, values or self.defaults):
+            setattr(self, field, value)
+
+    def __getitem__(self, i):
+        if i != 0:
+            raise IndexError(i)
+        return self
+
+    def __len__(self):
+        return 1
+
+    @property
+    def leaf(self):
+        return self
+
+    def copy_from(self, metamer):
+        """copy the fields that metamer (e.g. a metamer_data) has"""
+        for field in self.fields[:-1]:
+            value = getattr(metamer, field, self)
+            if value is not self:
+                setattr(self, field, value)
+        if hasattr(metamer, "leaf_state"):
+            self.state = getattr(getattr(metamer, "leaf", None), "state", self.state)
+
+    def __reduce__(self):
+        values = tuple(getattr(self, field) for field in self.fields)
+        state = dict(getattr(self, "__dict__", ()))
+        if hasattr(self, "lstring_id"):
+            state["lstring_id"] = self.lstring_id
+        if state:
+            return (Metamer_Record, values, state)
+        return (Metamer_Record, values)
+
+    def __setstate__(self, state):
+        for field, value in state.iteritems():
+            setattr(self, field, value)
+
+#The previous format of the elements of pseudo_lstring, kept to load the
+#pseudo lstrings pickled with it
 #A data format/type for elements in pseudo_lstring[i][0]
 class Metamer_Format(object):
     def __init__(self):
@@ -349,45 +404,18 @@ class Cp_Lstring(object):
         self.lstring = lstring
         self.pseudo_lstring = None
     def copy(self):
-        ###e = L_Element()
-        ###e.append(Metamer_Format())
-        #print len(lstring)
-        self.pseudo_lstring = [None] * len(self.lstring)
-        for i  in range(len(self.pseudo_lstring)):
-            self.pseudo_lstring[i] = L_Element()
-            self.pseudo_lstring[i].append(Metamer_Format())
-
-        ###self.pseudo_lstring = [e] * len(self.lstring)
-        ##################!!!!!!!!!!!!!!!!!!NOTE!!!!!!!!!!!!!!!!!!##################
-        #Be careful of the use of initialisation like
-        #        self.pseudo_lstring = [e] * len(self.lstring)
-        #The drawback is that, if self.pseudo_lstring[i] is updated, e will be
-        #updated and then all other elements in self.pseudo_lstring will be
-        #updated with the same changes too. The result is that, all elements
-        #of self.pseudo_lstring are identical at last.
-        ############################################################################
-
-
-        #print len(pseudo_lstring)
-        #print vars(lstring[1][0]).keys()
-        #print isinstance(lstring[2][0], metamer_data)
-        #print len(lstring), len(self.pseudo_lstring)
-
-        for i in range(len(self.pseudo_lstring)):
-          try:
-            for attr in vars(self.pseudo_lstring[i][0]).keys():
-              if attr in vars(self.lstring[i][0]).keys():
-                if attr == "leaf_state":
-                  self.pseudo_lstring[i][0].leaf_state = self.lstring[i][0].leaf_state
-                  self.pseudo_lstring[i][0].leaf.state = self.lstring[i][0].leaf.state
-                  #print i, self.lstring[i][0].leaf.state, self.pseudo_lstring[i][0].leaf.state, self.pseudo_lstring[i-1][0].leaf.state
-                else:
-                  vars(self.pseudo_lstring[i][0])[attr] = vars(self.lstring[i][0])[attr]
-                  #print i, self.lstring[i][0].leaf_area, self.pseudo_lstring[i][0].leaf_area
-              else:
-                continue
-          except:
-            continue
+        #One Metamer_Record per element of the lstring; the elements that are
+        #not metamers keep the default values
+        self.pseudo_lstring = []
+        for elt in self.lstring:
+            record = Metamer_Record()
+            try:
+                parameter = elt[0]
+            except Exception:
+                parameter = None
+            if parameter is not None:
+                record.copy_from(parameter)
+            self.pseudo_lstring.append(record)
 
         """
         for i in range(len(self.pseudo_lstring)):
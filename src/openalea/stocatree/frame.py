@@ -18,10 +18,11 @@
 
 
 from vplants.plantgl.all import Vector3
+from openalea.stocatree.slotted import Slotted
 
 __all__ = ['Frame']
 
-class Frame(object):
+class Frame(Slotted):
     """Frame is a simple class to define a Frame in LPy and to print it if needed
 
     :Example:
@@ -34,6 +35,8 @@ class Frame(object):
 
 
     """
+    __slots__ = ('heading', 'left', 'up')
+
     #def __init__(self, heading=Vector3(0.,0.,1.), up=Vector3(0.,1.,0.), 
     #left=Vector3(1.,0.,0.)):
     def __init__(self, heading=Vector3(0., 1., 0.), up=Vector3(0., 0., 1.),
@@ -18,6 +18,7 @@
 """
 
 from math import log, exp
+from openalea.stocatree.slotted import Slotted
 
 
 config_options = {'flower_duration': 10.,
@@ -30,14 +31,15 @@ config_options = {'flower_duration': 10.,
 
 
 
-class Fruit(object):
+class Fruit(Slotted):
     """a base class interface for fruits
 
     A fruit is defined by an **age**, a **mass** and a **state** that may be
     in ['flower', 'no_flower', 'fruit_scar', 'fruit'].
 
 
-    There is a setter/getter for the state.
+    There is a setter/getter for the state. The state is stored as its index
+    in :attr:`states`.
 
     There is a compulsary method named :meth:`compute_mass`. Derived classes must
     implement this method.
@@ -52,6 +54,9 @@ class Fruit(object):
 
     """
     states = ['flower', 'no_flower', 'fruit_scar', 'fruit']
+    _codes = dict((state, code) for code, state in enumerate(states))
+    __slots__ = ('age', '_code', 'mass', '__dict__')
+
     def __init__(self, state='flower'):
         """**Constructor**
 
@@ -63,19 +68,21 @@ class Fruit(object):
         .. todo:: make age and  mass real attributes
         """
         self.age = 0
-        self._state = state
+        self.state = state
         self.mass = 0.
 
 
     def _set_state(self, state):
-        if state in Fruit.states:
-            self._state = state
-        else:
-            raise ValueError("state must be in %s , %s provided" % (Fruit.state,state))
+        try:
+            self._code = Fruit._codes[state]
+        except (KeyError, TypeError):
+            raise ValueError("state must be in %s , %s provided" % (Fruit.states,state))
     def _get_state(self):
-        return self._state
+        return Fruit.states[self._code]
     state = property(fget=_get_state, fset=_set_state,
                     doc="getter/setter of :attr:`state` of the component to be specified by the user")
+    # the attribute of the state before it was stored as a code
+    _state = state
 
 
 
@@ -106,6 +113,8 @@ class AppleFruit(Fruit):
     >>> mass = fruit.compute_mass()
 
     """
+    __slots__ = ('_flower_duration', '_max_relative_growth_rate', '_lost_time', '_max_age',
+                 '_probability', '_max_absolute_growth_rate', '_r')
 
     def __init__(self, flower_duration=10., max_relative_growth_rate=0.167, lost_time=28, max_age=147, probability=0.3, max_absolute_growth_rate=.0018):
         """**Construtor**
@@ -9,7 +9,8 @@ import openalea.fractalysis.fractutils as fruti
 import openalea.fractalysis.light as lit
 import openalea.plantgl.all as pgl
 import os, shutil
-from openalea.stocatree.rw_tools import Ensure_dir
+import numpy
+from openalea.stocatree.rw_tools import ensureLocalDir
 
 """
 def metamer_star(scene):
@@ -115,35 +116,50 @@ class STAR(object):
         # total star per shoot, sum(silhouette_areas)/sum(leaf_areas)
         self.total_star_st = {}
 
-    # a method to collect star and relevant data for each leaf (wooden part removed)
-    def collect(self, lstring, scene):
-        sc = dict()
+    #: name of the appearance of the leaf shapes, the other shapes being wood
+    leaf_appearance = "Color_15"
+    #: id of the wood shapes in the scene given to diffuseInterception
+    wood_id = 999999999
+
+    def classify(self, scene, wood_occlusion=True):
+        """leaf surface of each metamer, in a single pass over the scene
+
+        Each id of the scene corresponds to a metamer, thus the elements of a
+        metamer (leaf blade, petiole, internode) have the same id. The shapes
+        whose appearance is :attr:`leaf_appearance` are leaves, the other
+        ones are wood.
+
+        :param wood_occlusion: if True, the wood shapes are kept in the
+            returned scene (with the :attr:`wood_id`) so that they hide the
+            leaves; otherwise the scene only contains the leaves and the ground
+        :returns: the leaf surface of the metamers that have wood shapes
+            {id: surface}, and the scene for diffuseInterception. The shapes
+            of the given scene are not modified.
+        """
+        leafsurface = {}
+        wood = set()
+        leaves = Scene()
         for sh in scene:
             # If the surface is not the ground (with id 0)
             if sh.id > 0:
-                sc[sh.id] = sc.get(sh.id,[])+[sh]
-
-        # Total surface of each metamer #
-        # Each "id" here corresponds to a metamer, thus the elements of a metamer,
-        # including its leaf blade, petiole and internode, have the same id. Each
-        # element also corresponds to its own shape, thus the total surface (namely,
-        # area) of a memater is equivalent to the sum of surface values of all its
-        # elements.
-        totsurface = dict([(id,sum([surface(i) for i in shapes])) for id, shapes in sc.iteritems()])
-
-        # leaf surface only #
-        leafsurface = dict()
-        for id, shapes in sc.iteritems():
-            for shape in shapes:
-                # "Color_19" is the color of internode (wood part).
-                # This is to reduce the surface of this wood part so that the leaf
-                # surface can be calculated.
-                if shape.appearance.getName() != "Color_15":
-                    leafsurface[id] = totsurface[id] - surface(shape)
-                    shape.id = 999999999
-                #print id, shape.id
-
-        d = diffuseInterception(scene)
+                if sh.appearance.getName() == self.leaf_appearance:
+                    leafsurface[sh.id] = leafsurface.get(sh.id, 0) + surface(sh)
+                else:
+                    wood.add(sh.id)
+                    if not wood_occlusion:
+                        continue
+                    sh = Shape(sh.geometry, sh.appearance, self.wood_id)
+            leaves.add(sh)
+        leafsurface = dict((id, surf) for id, surf in leafsurface.iteritems() if id in wood)
+        return leafsurface, leaves
+
+    # a method to collect star and relevant data for each leaf (wooden part removed)
+    # interception may be openalea.stocatree.raster.diffuse_interception on
+    # computers without display
+    def collect(self, lstring, scene, wood_occlusion=True, interception=diffuseInterception):
+        leafsurface, leaves = self.classify(scene, wood_occlusion)
+
+        d = interception(leaves)
         # Note: the surface returned by plantGL is in 10m*10m
         # Thus this value need to be divided by 100 to calculate the real surface in m*m
         for id,surf in leafsurface.iteritems():
@@ -169,39 +185,45 @@ class STAR(object):
                     print id, d[id], surf, lstring[id][0].leaf.age, lstring[id][0].leaf.state
                     print "###########################################################################################################################################"
 
-        if lstring[id][0].leaf.state == 'scar':
-             lstring[id][0].ta_pgl = 0
-             lstring[id][0].sa_pgl = 0
-             lstring[id][0].star_pgl = 0
+                if lstring[id][0].leaf.state == 'scar':
+                    lstring[id][0].ta_pgl = 0
+                    lstring[id][0].sa_pgl = 0
+                    lstring[id][0].star_pgl = 0
 
 
     def process_shoot(self, lstring, scene):
-        # To group data from leaf scale to shoot scale
-        for k in self.id_lf:
-            if lstring[k][0].parent_unit_id in self.unit_leaves:
-                self.unit_leaves[lstring[k][0].parent_unit_id].append(k)
-                self.ta_st[lstring[k][0].parent_unit_id].append(self.ta_lf[k])
-                self.sa_st[lstring[k][0].parent_unit_id].append(self.sa_lf[k])
-                self.star_st[lstring[k][0].parent_unit_id].append(self.star_lf[k])
-            else:
-                self.unit_leaves.update({lstring[k][0].parent_unit_id:[k]})
-                self.ta_st.update({lstring[k][0].parent_unit_id:[self.ta_lf[k]]})
-                self.sa_st.update({lstring[k][0].parent_unit_id:[self.sa_lf[k]]})
-                self.star_st.update({lstring[k][0].parent_unit_id:[self.star_lf[k]]})
-
-        # To calculate statistic result at shoot scale
-        for k,v in self.unit_leaves.iteritems():
-            self.avg_ta_st.update({k : sum(self.ta_st[k])/len(self.ta_st[k])})
-            self.avg_sa_st.update({k : sum(self.sa_st[k])/len(self.sa_st[k])})
-            self.mean_star_st.update({k : sum(self.star_st[k])/len(self.star_st[k])})
-            self.total_star_st.update({k : sum(self.sa_st[k])/sum(self.ta_st[k])})
+        # To group data from leaf scale to shoot scale: the code of the unit
+        # of each leaf is computed once and each variable is reduced over all
+        # the units at once
+        ids = numpy.array(self.id_lf, dtype=int)
+        units, codes = numpy.unique([lstring[k][0].parent_unit_id for k in self.id_lf], return_inverse=True)
+        units = units.tolist()
+        ta = numpy.array([self.ta_lf[k] for k in self.id_lf], dtype=float)
+        sa = numpy.array([self.sa_lf[k] for k in self.id_lf], dtype=float)
+        star = numpy.array([self.star_lf[k] for k in self.id_lf], dtype=float)
+
+        count = numpy.bincount(codes, minlength=len(units))
+        ta_sum = numpy.bincount(codes, weights=ta, minlength=len(units))
+        sa_sum = numpy.bincount(codes, weights=sa, minlength=len(units))
+        star_sum = numpy.bincount(codes, weights=star, minlength=len(units))
+
+        # the leaves of each unit, in the order of self.id_lf
+        order = numpy.argsort(codes, kind='mergesort')
+        bounds = numpy.concatenate(([0], count.cumsum())).tolist()
+        for i, k in enumerate(units):
+            leaves = order[bounds[i]:bounds[i + 1]]
+            self.unit_leaves[k] = ids[leaves].tolist()
+            self.ta_st[k] = ta[leaves].tolist()
+            self.sa_st[k] = sa[leaves].tolist()
+            self.star_st[k] = star[leaves].tolist()
+            self.avg_ta_st[k] = ta_sum[i] / count[i]
+            self.avg_sa_st[k] = sa_sum[i] / count[i]
+            self.mean_star_st[k] = star_sum[i] / count[i]
+            self.total_star_st[k] = sa_sum[i] / ta_sum[i]
 
         for i, elt in enumerate(lstring):
             if elt.name == 'metamer':
-                if elt[0].parent_unit_id in self.unit_metamers:
-                    self.unit_metamers[elt[0].parent_unit_id].append(i)
-                else:
-                    self.unit_metamers.update({elt[0].parent_unit_id:[i]})
+                self.unit_metamers.setdefault(elt[0].parent_unit_id, []).append(i)
 
 
         """
@@ -251,7 +273,7 @@ class Envelope(object):
 		return f_short_name
 
 	def crt_opt_dir(self):
-		Ensure_dir(self.output_dir)
+		ensureLocalDir(self.output_dir)
 
 	def intercept(self):
             self.crt_opt_dir()
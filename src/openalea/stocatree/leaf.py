@@ -23,6 +23,7 @@
 
 import numpy
 from scipy import interpolate
+from openalea.stocatree.slotted import Slotted
 sigmoid = numpy.array([ 0.00247262,  0.00669285,  0.01798621,  0.04742587,
                        0.11920292,   0.26894142,  0.5       ,  0.73105858,
                        0.88079708,  0.95257413,  0.98201379,  0.99330715,
@@ -39,7 +40,7 @@ leaf_options = {'fall_probability': 0.1,
     'preformed_leaves': 8}
 
 
-class Leaf(object):
+class Leaf(Slotted):
     """a base class interface for leaves
 
     A leaf is defined by an **age**, a **mass** and a **surface** (area). Moreover,
@@ -59,10 +60,15 @@ class Leaf(object):
     There is also a :meth:`initialisation` that may be used by derived classes to check
     that the attributes have been set correctly.
 
-    By default, there is a setter/getter for the state.
+    By default, there is a setter/getter for the state. The state is stored as
+    its index in :attr:`valid_state`.
 
     """
     valid_state = ['scar', 'growing']
+    _codes = dict((state, code) for code, state in enumerate(valid_state))
+    __slots__ = ('mass', 'area', 'age', 'max_area', 'mass_per_area', 'maturation',
+                 'func_leaf_area', '_code', 'pathogen', '__dict__')
+
     def __init__(self):
         self.mass = 0.               # in g
         self.area = 0.              # in m^2
@@ -103,14 +109,16 @@ class Leaf(object):
 
 
     def _get_state(self):
-        return self._state
+        return Leaf.valid_state[self._code]
     def _set_state(self, state):
-        if state in Leaf.valid_state:
-            self._state = state
-        else:
+        try:
+            self._code = Leaf._codes[state]
+        except (KeyError, TypeError):
             raise ValueError("state must be in %s , %s provided" % (Leaf.valid_state,state))
     state = property(fget=_get_state, fset=_set_state,
                     doc="setter/getter for the state attribute given a valid state")
+    # the attribute of the state before it was stored as a code
+    _state = state
 
 
 class AppleLeaf(Leaf):
@@ -129,6 +137,10 @@ class AppleLeaf(Leaf):
 
 
     """
+    __slots__ = ('fall_probability', 'min_final_area', 'area_range', 'petiole_radius',
+                 'maturity', 'preformed_leaves', '_inversed_preformed_leaves', 'lg',
+                 'silhouette_area')
+
     def __init__(self, state='growing', fall_probability=0.1, maturation=12,
                  mass_per_area=0.220, max_area=0.0030, min_final_area=0.0020,
                  petiole_radius=0.0006, preformed_leaves=8):
@@ -204,7 +216,7 @@ class AppleLeaf(Leaf):
         if not self.maturity:
             maturity = self.age/float(self.maturation)# dimensionless
             if (maturity > 1.0):
-                self.maturiry = True
+                self.maturity = True
                 maturity = 1.0
             relative_area = func_leaf_area.gety(maturity)
         else:
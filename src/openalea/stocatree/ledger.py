@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+"""
+.. topic:: ledger.py summary
+
+    Append-only record of the state of the experiments of a plan
+
+    :Code: in progress
+    :Documentation: in progress
+    :Revision: $Id$
+    :Usage: >>> from openalea.stocatree.ledger import *
+
+.. testsetup::
+
+    from openalea.stocatree.ledger import *
+
+:class:`~openalea.stocatree.file_tools.Find_missed` works out which
+experiments never finished by scanning the statistics written by the
+experiments, and exp_successful.h only remembers the last experiment of a
+run. :class:`ExperimentLedger` keeps instead one SQLite table to which each
+change of state of an experiment (queued, running, done, failed) is
+appended, with its time, duration, seed, host and process. The database uses
+the write-ahead log so that the workers of several processes or nodes can
+write to it concurrently, and an interrupted plan can be resumed by asking
+the ledger which experiments are still pending.
+
+:Example:
+
+    >>> ledger = ExperimentLedger('experiments.db')
+    >>> todo = ledger.pending(range(300))
+    >>> ledger.start(12, seed=1163078257)
+    >>> ledger.done(12, duration=3600.)
+"""
+
+import os
+import time
+import socket
+import sqlite3
+
+__all__ = ['ExperimentLedger', 'QUEUED', 'RUNNING', 'DONE', 'FAILED']
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+_schema = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    experiment INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    time REAL NOT NULL,
+    duration REAL,
+    seed INTEGER,
+    host TEXT,
+    pid INTEGER,
+    message TEXT
+);
+CREATE INDEX IF NOT EXISTS events_experiment ON events (experiment, id);
+"""
+
+_latest = """
+SELECT experiment, state FROM events
+WHERE id IN (SELECT MAX(id) FROM events GROUP BY experiment)
+"""
+
+
+class ExperimentLedger(object):
+    """states of the experiments of a plan, stored in a SQLite database
+
+    The events are never modified nor deleted: the state of an experiment is
+    the one of its last event and :meth:`history` gives all of them.
+
+    :param filename: the database, created if it does not exist
+    :param timeout: number of seconds to wait for the lock of another writer
+    """
+    def __init__(self, filename, timeout=60.):
+        self.filename = filename
+        self.connection = sqlite3.connect(filename, timeout=timeout)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(_schema)
+        self.host = socket.gethostname()
+
+    def close(self):
+        self.connection.close()
+
+    def record(self, experiments, state, duration=None, seed=None, message=None):
+        """append an event for each of the experiments
+
+        :param experiments: an experiment id or a list of ids
+        :param state: one of :data:`QUEUED`, :data:`RUNNING`, :data:`DONE`, :data:`FAILED`
+        """
+        if isinstance(experiments, (int, long)):
+            experiments = [experiments]
+        now = time.time()
+        pid = os.getpid()
+        with self.connection:
+            self.connection.executemany(
+                'INSERT INTO events (experiment, state, time, duration, seed, host, pid, message) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [(int(e), state, now, duration, seed, self.host, pid, message)
+                 for e in experiments])
+
+    def queue(self, experiments):
+        self.record(experiments, QUEUED)
+
+    def start(self, experiment, seed=None):
+        self.record(experiment, RUNNING, seed=seed)
+
+    def done(self, experiment, duration=None):
+        self.record(experiment, DONE, duration=duration)
+
+    def fail(self, experiment, duration=None, message=None):
+        self.record(experiment, FAILED, duration=duration, message=message)
+
+    def states(self):
+        """dictionary experiment id -> current state"""
+        return dict(self.connection.execute(_latest).fetchall())
+
+    def experiments(self, state):
+        """sorted ids of the experiments whose current state is state"""
+        return sorted(e for e, s in self.states().iteritems() if s == state)
+
+    def pending(self, experiments, retry=True, running=True):
+        """the experiments of the plan that remain to be run
+
+        :param experiments: ids of all the experiments of the plan
+        :param retry: if True, failed experiments are pending
+        :param running: if True, experiments left running are pending, which
+            is what is expected when the plan is resumed after its processes
+            were killed (set it to False while other launchers are alive)
+        """
+        states = self.states()
+        skipped = set([DONE])
+        if not retry:
+            skipped.add(FAILED)
+        if not running:
+            skipped.add(RUNNING)
+        return [e for e in experiments if states.get(e) not in skipped]
+
+    def history(self, experiment):
+        """list of (state, time, duration, seed, host, pid, message) of an experiment"""
+        return self.connection.execute(
+            'SELECT state, time, duration, seed, host, pid, message FROM events '
+            'WHERE experiment = ? ORDER BY id', (experiment,)).fetchall()
@@ -24,7 +24,8 @@ from vplants.plantgl.all import Vector3, dot
 from openalea.stocatree.physics import rotate_frame_at_branch
 from math import acos, degrees
 import constants
-from srandom import boolean_event
+from srandom import boolean_event, organ_key
+from openalea.stocatree.slotted import Slotted
 try:
     import optimisation
 except:
@@ -40,7 +41,7 @@ __all__ = [
     'cambial_layer']
 
 
-class cambial_layer():
+class cambial_layer(Slotted):
     """A simple layer class to manage cambial layers
 
     :param float thickness:  the thickness of the layer (default 0)
@@ -50,6 +51,8 @@ class cambial_layer():
 
     This class is used by :class:`metamer_data` class.
     """
+    __slots__ = ('thickness', 'radius', 'reaction_wood', 'second_moment_of_area')
+
     def __init__(self, thickness=0, radius=0):
 
         self.thickness = thickness
@@ -69,7 +72,7 @@ zone_converter = {
     }
 
 
-class metamer_data(object):
+class metamer_data(Slotted):
     r"""Class to define metamer data structure
 
 
@@ -85,7 +88,22 @@ class metamer_data(object):
 
         \boldsymbol \tau = \mathbf{r}\times \mathbf{F}\,\!= rF\sin \theta\,\!
 
+    The attributes are stored in slots since there is one instance per
+    metamer of the lstring; other attributes may still be added.
 	"""
+    __slots__ = (
+        'number', 'leaf', 'fruit', 'internode', 'wood', 'observation',
+        'parent_observation', 'parent_unit_id', 'parent_fbr_id', 'parent_tree_id',
+        'zone', 'hlu', 'cumulated_mass', 'radius', 'offset', 'cumulated_torque',
+        'developped', 'developed', 'phyllotactic_angle', 'branching_angle',
+        'rigidity', 'age', 'year', 'length', 'trunk', 'rotation_memory',
+        'rotation_velocity', 'acting_rotation', 'position', 'rv_norm',
+        'season_initial_heading', 'external_layer', 'layers', 'nlayers',
+        'total_second_moment_of_area', 'pre_harvest_mass', 'pre_harvest_radius',
+        'pre_harvest_rotation', 'leaf_state', 'leaf_area', 'ta_pgl', 'sa_pgl',
+        'star_pgl', 'sylleptic', 'to_prune', 'cut', 'closest_apex',
+        'farthest_apex', 'sons_nb', 'pruned_data', 'pruning_react', 'node', '__dict__')
+
     def __init__(self, floral=False, number=0, hlu=None,
         zone=None, observation=None,
         parent_observation=None, parent_unit_id=None, parent_fbr_id=None,
@@ -142,6 +160,7 @@ class metamer_data(object):
         self.sons_nb = 0                                  # Cumulated sum of metamer sons
         self.pruning_react = True                        # wether the metamer could react to pruning
         self.pruned_data = None                           # If metamer was below the pruning point, this will contain the data required to determine pruning reaction that will be passed on previous metamers (rankwise), i.e. reacting position from cutting point [0,2], closest_apex, farthest_apex, sons_nb
+        self.node = -1                                    # Node of the metamer in the OrganTopology of the tree
 
         self.observation = observation
         self.parent_observation = parent_observation      # Yield the shoot type of that metamer
@@ -251,24 +270,25 @@ class metamer_data(object):
 
         additional_fruit = 0
 
-        if self.fruit._state == 'no_flower':
+        fruit_state = self.fruit.state
+        if fruit_state == 'no_flower':
             if simulation.events.harvest.active:
                 self.fruit.state = 'fruit_scar'
 
-        elif self.fruit._state == 'flower':
+        elif fruit_state == 'flower':
             if self.age > self.fruit._flower_duration:
-                if boolean_event(self.fruit._probability):
+                if boolean_event(self.fruit._probability, 'fruit_set', organ_key(self.parent_unit_id, self.number)):
                     self.fruit.state = 'fruit'
                     additional_fruit += 1
                 else:
                     self.fruit.state = 'fruit_scar'
-        elif self.fruit._state == 'fruit':
+        elif fruit_state == 'fruit':
             if simulation.events.harvest.active:
                 self.fruit.state = 'fruit_scar'
                 self.fruit.mass = 0.
             else:
                 self.fruit.mass = self.fruit.compute_mass() #useless ? mass already set by compute_mass
-        elif self.fruit._state == 'fruit_scar':
+        elif fruit_state == 'fruit_scar':
             self.fruit.mass = 0.
 
         if self.leaf.state != 'scar':
@@ -278,7 +298,7 @@ class metamer_data(object):
             if simulation.events.leaf_fall.active:
                 #print "Falling proba: {0} x {1}".format(self.leaf.fall_probability , simulation.dt.days)
                 #if (boolean_event(self.leaf.fall_probability * simulation.dt.days)):
-                if (boolean_event(self.leaf.fall_probability)):
+                if (boolean_event(self.leaf.fall_probability, 'leaf_fall', organ_key(self.parent_unit_id, self.number))):
                     self.leaf.state = 'scar'
             #elif simulation.events.leaf_forced_fall:
             #    self.leaf.state = 'scar'
@@ -0,0 +1,641 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+"""
+.. topic:: metamer_array.py summary
+
+    A struct-of-arrays mirror of the metamers of an lstring used to perform
+    the daily update of the parameters (group 1 of MAppleT.lpy) and the
+    physics (group 2) with numpy instead of one python call per metamer.
+
+    :Code: in progress
+    :Documentation: in progress
+    :Revision: $Id$
+    :Usage: >>> from openalea.stocatree.metamer_array import *
+
+.. testsetup::
+
+    from openalea.stocatree.metamer_array import *
+
+The daily update of a metamer in group 1 of the L-system consists of
+
+    * :meth:`~openalea.stocatree.metamer.metamer_data.update_metamer_parameters`
+    * :meth:`~openalea.stocatree.metamer.metamer_data.organ_activity`
+    * the reorientation of its HLU frame with respect to its left neighbour
+      (:func:`~openalea.stocatree.physics.rotate_frame_at_branch` and
+      :func:`~openalea.stocatree.optimisation.reorient_frame`)
+    * :meth:`~openalea.stocatree.metamer.metamer_data.update_position`
+
+:class:`MetamerArray` gathers the metamers of the lstring into numpy arrays,
+performs the same computations on all of them at once and writes the results
+back into the :class:`~openalea.stocatree.metamer.metamer_data` instances.
+The frames and positions depend on the new frame of the parent metamer; they
+are composed along the axes by the batched quaternion functions of
+:mod:`~openalea.stocatree.physics`.
+
+The productions of group 2 are performed in the same way by
+:class:`PhysicsArray`, from the leaves of the tree to the trunk. Both classes
+rely on a :class:`~openalea.stocatree.topology.TopologyIndex` to find the
+neighbours of the metamers.
+
+The random events (fruit set and leaf fall) are drawn with
+:func:`~openalea.stocatree.srandom.boolean_event` in the lstring order, so that
+the random sequence is the same as the one of the L-system productions. If
+random streams are used (see :mod:`~openalea.stocatree.srandom`), they are
+drawn at once from the streams of the metamers.
+
+.. note:: frames are computed with double precision quaternions, whereas
+    the cython :mod:`~openalea.stocatree.optimisation` module uses single
+    precision floats. The trees are therefore equal up to rounding errors.
+"""
+
+import numpy
+from vplants.plantgl.all import Vector3
+
+from frame import Frame
+from metamer import cambial_layer
+from srandom import boolean_event, organ_key, get_random_streams
+from physics import propagate_frames, propagate_positions
+from topology import TopologyIndex, RULE_NONE, RULE_BRANCH, RULE_APEX
+import constants
+
+__all__ = ['MetamerArray', 'PhysicsArray']
+
+#: state codes of the leaves, indices in :attr:`Leaf.valid_state`
+LEAF_SCAR, LEAF_GROWING = 0, 1
+leaf_states = ['scar', 'growing']
+
+#: state codes of the fruits, indices in :attr:`Fruit.states`
+FRUIT_FLOWER, FRUIT_NO_FLOWER, FRUIT_SCAR, FRUIT = 0, 1, 2, 3
+fruit_states = ['flower', 'no_flower', 'fruit_scar', 'fruit']
+
+
+def _vectors(objects, getter):
+    """array of the Vector3 getter(o) of the objects"""
+    return numpy.array([(v.x, v.y, v.z) for v in map(getter, objects)],
+                       dtype=float).reshape(len(objects), 3)
+
+
+def _dot(a, b):
+    return (a * b).sum(axis=1)
+
+
+def _reaction_wood_target(up, heading, previous_heading):
+    """vectorised version of :func:`~openalea.stocatree.optimisation.reaction_wood_target`"""
+    cos_gh = heading[:, 2]
+    cos_pu = _dot(previous_heading, up)
+    cos_ph = _dot(previous_heading, heading)
+    inclination = numpy.arccos(numpy.clip(cos_ph, -1., 1.))
+    inclination[cos_pu * cos_ph < 0.] *= -1.
+    percentage = 0.1635 * (1.0 - cos_gh) - 0.1778 * inclination
+    r = 3.14159 * 2. * percentage
+    r[r < 0.] = 0.
+    r[r > 3.14159] = 3.141459
+    return r
+
+
+def _annular_section(inner_radius, thickness, section):
+    """vectorised version of :func:`~openalea.stocatree.physics.second_moment_of_area_annular_section`"""
+    rt = inner_radius + thickness
+    return 0.125 * (rt ** 4 - inner_radius ** 4) * (section + numpy.sin(section))
+
+
+class MetamerArray(object):
+    """Struct-of-arrays mirror of the metamers of an lstring
+
+    :Example:
+
+        >>> engine = MetamerArray(mechanics=True)
+        >>> engine.update(lstring, simulation)
+        >>> engine.update_counts(data.counts)
+
+    The arrays (e.g., :attr:`age`, :attr:`length`, :attr:`radius`,
+    :attr:`heading`, :attr:`position`, :attr:`leaf_state`,
+    :attr:`fruit_state`) are indexed by the rank of the metamer in the
+    lstring. :attr:`parent` contains the index of the left neighbour metamer
+    (-1 for the first metamer of the trunk) and :attr:`branch` is True for
+    the first metamer of a lateral branch.
+    """
+
+    #: constant parameters of a metamer, gathered once per metamer
+    parameters = ['growth_rate', 'elongation_period', 'youngs_modulus',
+        'reaction_wood_rate', 'reaction_wood_coefficient',
+        'leaf_maturation', 'leaf_max_area', 'leaf_mass_per_area',
+        'leaf_preformed', 'leaf_fall_probability', 'number',
+        'flower_duration', 'fruit_probability', 'fruit_r',
+        'fruit_growth_rate', 'fruit_lost_time', 'fruit_max_age']
+
+    def __init__(self, mechanics=True, topology=None):
+        """**Constructor**
+
+        :param bool mechanics: if True, reorient the frames with the rotation
+            velocity computed in the physics group (options.stocatree.mechanics)
+        :param topology: a :class:`~openalea.stocatree.topology.TopologyIndex`
+            shared with other engines and invalidated by the L-system when the
+            structure changes. If None, the lstring is scanned at each update.
+        """
+        self.mechanics = mechanics
+        self.topology = topology
+        self.metamers = []
+        self.size = 0
+        self._parameters = {}
+
+    def __len__(self):
+        return self.size
+
+    def _metamer_parameters(self, m, growth_rates):
+        key = (id(m.internode), m.zone)
+        if key not in growth_rates:
+            growth_rates[key] = m.internode.growth_rate(m.zone)
+        leaf = m.leaf
+        fruit = m.fruit
+        return (growth_rates[key], m.internode._elongation_period,
+            m.wood._youngs_modulus, m.wood._reaction_wood_rate,
+            m.wood._reaction_wood_inertia_coefficient,
+            leaf.maturation, leaf.max_area, leaf.mass_per_area,
+            leaf.preformed_leaves, leaf.fall_probability, m.number,
+            fruit._flower_duration, fruit._probability, fruit._r,
+            fruit._max_relative_growth_rate, fruit._lost_time, fruit._max_age)
+
+    def gather(self, lstring):
+        """Build the arrays from the metamers of lstring
+
+        :param lstring: the lstring (or any sequence of modules that have a
+            name and the metamer_data as first parameter)
+        """
+        if self.topology is None:
+            index = TopologyIndex(lstring)
+        else:
+            index = self.topology
+            index.update(lstring)
+        self.index = index
+        self.metamers = metamers = index.metamers
+        self.size = n = len(metamers)
+        self.parent = index.parent
+        self.branch = index.branch
+
+        # constant parameters are cached per metamer instance
+        growth_rates = {}
+        cache = {}
+        rows = []
+        for m in metamers:
+            key = id(m)
+            entry = self._parameters.get(key)
+            if entry is None or entry[0] is not m:
+                entry = (m, self._metamer_parameters(m, growth_rates))
+            cache[key] = entry
+            rows.append(entry[1])
+        self._parameters = cache
+        table = numpy.array(rows, dtype=float).reshape(n, len(self.parameters))
+        for i, name in enumerate(self.parameters):
+            setattr(self, name, table[:, i])
+
+        rows = [(m.age, m.leaf.age, m.fruit.age, m.length, m.radius, m.year,
+                 m.layers[-1].radius, m.layers[-1].thickness,
+                 m.layers[-1].reaction_wood, m.total_second_moment_of_area,
+                 m.nlayers, m.leaf.area, m.leaf.mass, m.fruit.mass,
+                 m.rv_norm, m.branching_angle, m.phyllotactic_angle)
+                for m in metamers]
+        table = numpy.array(rows, dtype=float).reshape(n, 17)
+        (self.age, self.leaf_age, self.fruit_age, self.length, self.radius,
+         self.year, self.layer_radius, self.layer_thickness,
+         self.reaction_wood, self.total_second_moment_of_area, self.nlayers,
+         self.leaf_area, self.leaf_mass, self.fruit_mass, self.rv_norm,
+         self.branching_angle, self.phyllotactic_angle) = table.T.copy()
+
+        self.leaf_state = numpy.array([leaf_states.index(m.leaf._state) for m in metamers], dtype=int)
+        self.fruit_state = numpy.array([fruit_states.index(m.fruit._state) for m in metamers], dtype=int)
+
+        self.heading = _vectors(metamers, lambda m: m.hlu.heading)
+        self.up = _vectors(metamers, lambda m: m.hlu.up)
+        self.left = _vectors(metamers, lambda m: m.hlu.left)
+        self.season_initial_heading = _vectors(metamers, lambda m: m.season_initial_heading)
+        self.rotation_velocity = _vectors(metamers, lambda m: m.rotation_velocity)
+        self.new_layer = numpy.zeros(n, dtype=bool)
+        self.previous_second_moment_of_area = numpy.zeros(n)
+
+    def update_parameters(self, simulation):
+        """vectorised :meth:`~openalea.stocatree.metamer.metamer_data.update_metamer_parameters`"""
+        dt = simulation.dt.days
+        self.age += dt
+        self.leaf_age += dt
+        self.fruit_age += dt
+
+        # new cambial layer event
+        self.new_layer[:] = False
+        if simulation.events.new_cambial_layer.active:
+            self.new_layer = self.year < simulation.date.year
+            new = self.new_layer
+            self.season_initial_heading[new] = self.heading[new]
+            smoa = _annular_section(self.layer_radius[new], self.layer_thickness[new],
+                self.reaction_wood[new]) * self.reaction_wood_coefficient[new]
+            self.previous_second_moment_of_area[new] = smoa
+            self.total_second_moment_of_area[new] += smoa
+            self.layer_radius[new] = self.radius[new]
+            self.layer_thickness[new] = 0.
+            self.reaction_wood[new] = 0.
+            self.nlayers[new] += 1
+
+        # reaction wood (not for the central layer)
+        layered = numpy.flatnonzero(self.nlayers >= 2)
+        r = _reaction_wood_target(self.up[layered], self.heading[layered],
+                                  self.season_initial_heading[layered])
+        rw = self.reaction_wood[layered]
+        grow = r > rw
+        rw[grow] += self.reaction_wood_rate[layered][grow] * dt * (r[grow] - rw[grow])
+        self.reaction_wood[layered] = rw
+
+        # growth of internode
+        growing = self.age < self.elongation_period
+        self.length[growing] += self.growth_rate[growing] * dt
+
+        second_moment_of_area = self.total_second_moment_of_area \
+            + 0.78539816339744828 * self.radius ** 4 \
+            + _annular_section(self.layer_radius, self.layer_thickness,
+                self.reaction_wood) * self.reaction_wood_coefficient
+        self.rigidity = second_moment_of_area * self.youngs_modulus
+
+    def organ_activity(self, simulation):
+        """vectorised :meth:`~openalea.stocatree.metamer.metamer_data.organ_activity`"""
+        events = simulation.events
+        fruit_state = self.fruit_state
+        leaf_state = self.leaf_state
+        new_fruit_state = fruit_state.copy()
+        new_leaf_state = leaf_state.copy()
+
+        # random events, drawn in the lstring order as in the L-system
+        need_fruit = (fruit_state == FRUIT_FLOWER) & (self.age > self.flower_duration)
+        need_leaf = numpy.zeros(self.size, dtype=bool)
+        if events.leaf_fall.active:
+            need_leaf = leaf_state != LEAF_SCAR
+        fruit_set = numpy.zeros(self.size, dtype=bool)
+        leaf_fall = numpy.zeros(self.size, dtype=bool)
+        streams = get_random_streams()
+        if streams is None:
+            for i in numpy.flatnonzero(need_fruit | need_leaf).tolist():
+                if need_fruit[i]:
+                    fruit_set[i] = boolean_event(self.fruit_probability[i])
+                if need_leaf[i]:
+                    leaf_fall[i] = boolean_event(self.leaf_fall_probability[i])
+        elif need_fruit.any() or need_leaf.any():
+            keys = numpy.array([organ_key(m.parent_unit_id, m.number) for m in self.metamers],
+                               dtype=numpy.int64)
+            fruit_set[need_fruit] = streams.boolean_events('fruit_set',
+                self.fruit_probability[need_fruit], keys[need_fruit])
+            leaf_fall[need_leaf] = streams.boolean_events('leaf_fall',
+                self.leaf_fall_probability[need_leaf], keys[need_leaf])
+
+        # fruits
+        new_fruit_state[need_fruit & fruit_set] = FRUIT
+        new_fruit_state[need_fruit & ~fruit_set] = FRUIT_SCAR
+        fruits = fruit_state == FRUIT
+        if events.harvest.active:
+            new_fruit_state[fruit_state == FRUIT_NO_FLOWER] = FRUIT_SCAR
+            new_fruit_state[fruits] = FRUIT_SCAR
+            self.fruit_mass[fruits] = 0.
+        else:
+            age = numpy.minimum(self.fruit_age[fruits] - self.flower_duration[fruits],
+                                self.fruit_max_age[fruits])
+            rate = self.fruit_growth_rate[fruits]
+            self.fruit_mass[fruits] = self.fruit_r[fruits] * \
+                numpy.log(1.0 + numpy.exp(rate * (age - self.fruit_lost_time[fruits])))
+        self.fruit_mass[fruit_state == FRUIT_SCAR] = 0.
+
+        # leaves
+        if events.leaf_out.active:
+            new_leaf_state[:] = LEAF_SCAR
+        new_leaf_state[leaf_fall] = LEAF_SCAR
+        growing = (leaf_state != LEAF_SCAR) & (new_leaf_state == LEAF_GROWING)
+        expanding = growing & (self.leaf_age < self.leaf_maturation)
+        maturity = numpy.minimum(self.leaf_age[expanding] / self.leaf_maturation[expanding], 1.)
+        func = simulation.func_leaf_area
+        relative_area = func.gety_array(maturity)
+        number = self.number[expanding]
+        preformed = self.leaf_preformed[expanding]
+        max_area = self.leaf_max_area[expanding]
+        self.leaf_area[expanding] = numpy.where(number >= preformed,
+            max_area * relative_area,
+            relative_area * number * (1. / preformed) * max_area)
+        self.leaf_mass[growing] = self.leaf_area[growing] * self.leaf_mass_per_area[growing]
+        self.leaf_area[new_leaf_state == LEAF_SCAR] = 0.
+
+        self.fruit_state = new_fruit_state
+        self.leaf_state = new_leaf_state
+
+    def update_frames(self):
+        """Reorient the frames and update the positions
+
+        Equivalent to the frame and position updates of group 1 of the
+        L-system: the first metamer of a branch is rotated from the frame of
+        its bearing metamer by :func:`~openalea.stocatree.physics.rotate_frame_at_branch`;
+        all the frames are then reoriented by the rotation velocity. The
+        rotations are composed along the axes in a single prefix pass by
+        :func:`~openalea.stocatree.physics.propagate_frames`.
+        """
+        if self.mechanics:
+            self.heading, self.left, self.up = propagate_frames(self.parent,
+                self.branch, self.heading, self.left, self.rotation_velocity,
+                self.rv_norm, self.length, self.branching_angle,
+                self.phyllotactic_angle)
+        self.position = propagate_positions(self.parent, self.heading, self.length)
+
+    def scatter(self, simulation):
+        """Write the arrays back into the metamer_data instances"""
+        events = simulation.events
+        pre_harvest = events.pre_harvest.active
+        bud_break = events.bud_break.active
+        new_layer = self.new_layer.tolist()
+        rw = self.reaction_wood.tolist()
+        position = self.position.tolist()
+        if self.mechanics:
+            heading = self.heading.tolist()
+            up = self.up.tolist()
+            left = self.left.tolist()
+        columns = zip(self.age.tolist(), self.leaf_age.tolist(),
+            self.fruit_age.tolist(), self.length.tolist(),
+            self.rigidity.tolist(), self.leaf_area.tolist(),
+            self.leaf_mass.tolist(), self.fruit_mass.tolist(),
+            self.leaf_state.tolist(), self.fruit_state.tolist())
+        for i, m in enumerate(self.metamers):
+            (m.age, m.leaf.age, m.fruit.age, m.length, m.rigidity, area,
+             m.leaf.mass, m.fruit.mass, leaf_state, fruit_state) = columns[i]
+            if new_layer[i]:
+                m.season_initial_heading = m.hlu.heading
+                m.layers[-1].second_moment_of_area = self.previous_second_moment_of_area[i]
+                m.total_second_moment_of_area += self.previous_second_moment_of_area[i]
+                m.layers.append(cambial_layer(radius=m.radius))
+                m.nlayers += 1
+            m.layers[-1].reaction_wood = rw[i]
+            m.leaf._state = leaf_states[leaf_state]
+            m.fruit._state = fruit_states[fruit_state]
+            m.leaf.area = area
+            if leaf_state == LEAF_SCAR:
+                m.ta_pgl = 0
+                m.sa_pgl = 0
+                m.star_pgl = 0
+            m.leaf_state = m.leaf._state
+            m.leaf_area = area
+            if pre_harvest:
+                m.pre_harvest_mass = m.cumulated_mass
+                m.pre_harvest_rotation = m.rotation_velocity
+            if bud_break:
+                m.pre_harvest_radius = m.radius
+            if self.mechanics and self.parent[i] >= 0:
+                m.hlu = Frame(Vector3(*heading[i]), Vector3(*left[i]), Vector3(*up[i]))
+            m.position = Vector3(*position[i])
+
+    def update(self, lstring, simulation):
+        """Perform the daily update of group 1 on all the metamers of lstring
+
+        :param lstring: the lstring
+        :param simulation: the :class:`~openalea.stocatree.tools.simulation.SimulationStocatree` instance
+        """
+        self.gather(lstring)
+        if self.size == 0:
+            return
+        self.update_parameters(simulation)
+        self.organ_activity(simulation)
+        self.update_frames()
+        self.scatter(simulation)
+
+    def update_counts(self, counts):
+        """Update a :class:`~openalea.stocatree.output.counts` instance
+
+        Equivalent to calling counts.update(m) on every metamer.
+        """
+        fruits = self.fruit_state == FRUIT
+        leaves = self.leaf_state == LEAF_GROWING
+        counts.metamers += self.size
+        counts.fruits += int(fruits.sum())
+        counts.fruitdw += sum(self.fruit_mass[fruits].tolist())
+        counts.leaves += int(leaves.sum())
+        counts.tla += sum(self.leaf_area[leaves].tolist())
+
+
+def _pipe(ra, rb, exponent):
+    """vectorised :func:`~openalea.stocatree.pipe.get_new_radius`"""
+    return (ra ** exponent + rb ** exponent) ** (1. / exponent)
+
+
+class PhysicsArray(object):
+    """Struct-of-arrays version of the physics productions (group 2)
+
+    :Example:
+
+        >>> physics = PhysicsArray(gravity, mechanics=True, stake=True)
+        >>> physics.update(lstring, simulation, tree)
+
+    The production of group 2 that applies to a metamer depends on its right
+    context (see :attr:`~openalea.stocatree.topology.TopologyIndex.rule`).
+    It computes
+
+        * the radius with the pipe model
+        * the distances to the closest and farthest apices and the number of sons
+        * the cumulated mass (:meth:`~openalea.stocatree.metamer.metamer_data.compute_mass`)
+        * the cumulated torque
+        * the rotation velocity (:meth:`~openalea.stocatree.metamer.metamer_data.calculate_rotation_velocity`)
+
+    These quantities depend on the new values of the successor and lateral
+    metamers, so they are reduced bottom-up, one topological level at a time.
+    The apices are expanded and the trunk parameters of the tree are updated
+    as in the apex() and root() productions.
+
+    .. note:: the pipe model is computed in double precision as in
+        :mod:`~openalea.stocatree.non_optimised`.
+    """
+
+    def __init__(self, gravity, mechanics=True, stake=True, exponent=2.49,
+                 topology=None):
+        """**Constructor**
+
+        :param gravity: the gravity Vector3 (in m s^-2)
+        :param bool mechanics: compute the torques and rotation velocities
+            (options.stocatree.mechanics)
+        :param bool stake: the trunk is staked (options.stocatree.stake)
+        :param float exponent: exponent of the pipe model
+        :param topology: a shared :class:`~openalea.stocatree.topology.TopologyIndex`.
+            If None, the lstring is scanned at each update.
+        """
+        self.gravity = numpy.array([gravity.x, gravity.y, gravity.z], dtype=float)
+        self.mechanics = mechanics
+        self.stake = stake
+        self.exponent = exponent
+        self.topology = topology
+        self.metamers = []
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def gather(self, lstring):
+        """Build the arrays from the metamers of lstring"""
+        if self.topology is None:
+            index = TopologyIndex(lstring)
+        else:
+            index = self.topology
+            index.update(lstring)
+        self.index = index
+        self.metamers = metamers = index.metamers
+        self.size = n = len(metamers)
+
+        rows = [(m.radius, m.leaf.petiole_radius, m.layers[-1].radius,
+                 m.length, m.wood._density, m.leaf.mass, m.fruit.mass,
+                 m.cumulated_mass, m.closest_apex, m.farthest_apex, m.sons_nb,
+                 m.rigidity, m.pre_harvest_mass, m.rv_norm)
+                for m in metamers]
+        table = numpy.array(rows, dtype=float).reshape(n, 14)
+        (self.radius, self.petiole_radius, self.layer_radius, self.length,
+         self.density, self.leaf_mass, self.fruit_mass, self.cumulated_mass,
+         self.closest_apex, self.farthest_apex, self.sons_nb, self.rigidity,
+         self.pre_harvest_mass, self.rv_norm) = table.T.copy()
+        self.growing = numpy.array([m.leaf._state == 'growing' for m in metamers], dtype=bool)
+        self.trunk = numpy.array([m.trunk for m in metamers], dtype=bool)
+
+        self.heading = _vectors(metamers, lambda m: m.hlu.heading)
+        self.cumulated_torque = _vectors(metamers, lambda m: m.cumulated_torque)
+        self.rotation_velocity = _vectors(metamers, lambda m: m.rotation_velocity)
+        self.rotation_memory = _vectors(metamers, lambda m: m.rotation_memory)
+        self.pre_harvest_rotation = _vectors(metamers, lambda m: m.pre_harvest_rotation)
+        self.acting_rotation = _vectors(metamers, lambda m: m.acting_rotation)
+
+    def expand_apices(self, simulation):
+        """the apex() production of group 2"""
+        dt = simulation.dt.days
+        for a in self.index.apices:
+            if a.sequence_position == 0 and a.radius < a.target_radius:
+                a.terminal_expansion(dt)
+
+    def _moment(self, idx):
+        """torque of the mass of the metamers idx"""
+        return numpy.cross(self.heading[idx] * self.length[idx][:, numpy.newaxis],
+                           self.gravity * self.cumulated_mass[idx][:, numpy.newaxis])
+
+    def reduce(self, simulation, tropism):
+        """Compute the radii, masses, torques and rotation velocities bottom-up"""
+        index = self.index
+        rule = index.rule
+        tropism = numpy.array([tropism.x, tropism.y, tropism.z], dtype=float)
+        harvest = simulation.events.harvest.active
+        step = simulation.rotation_convergence.step
+        R = self.radius
+        for idx in index.bottom_up():
+            idx = idx[rule[idx] != RULE_NONE]
+            if len(idx) == 0:
+                continue
+            r = rule[idx]
+            axis = r != RULE_APEX
+            branch = r == RULE_BRANCH
+            successor = index.successor[idx]
+            lateral = index.lateral[idx][branch]
+            # dummy indices are masked below
+            successor[~axis] = 0
+            sb = successor[branch]
+
+            # pipe model
+            radius = numpy.where(axis, R[successor], self.apex_radius[idx])
+            radius[branch] = _pipe(R[lateral], R[sb], self.exponent)
+            growing = self.growing[idx]
+            radius[growing] = _pipe(radius[growing], self.petiole_radius[idx][growing], self.exponent)
+            R[idx] = numpy.maximum(radius, R[idx])
+
+            # distances to the apices
+            closest = numpy.where(axis, self.closest_apex[successor] + 1, 0)
+            closest[branch] = numpy.minimum(self.closest_apex[lateral], self.closest_apex[sb]) + 1
+            farthest = numpy.where(axis, self.farthest_apex[successor] + 1, 0)
+            farthest[branch] = numpy.maximum(self.farthest_apex[lateral], self.farthest_apex[sb]) + 1
+            sons = numpy.where(axis, self.sons_nb[successor] + 1, 0)
+            sons[branch] = self.sons_nb[lateral] + self.sons_nb[sb]
+            self.closest_apex[idx] = closest
+            self.farthest_apex[idx] = farthest
+            self.sons_nb[idx] = sons
+
+            # cumulated mass
+            mass = constants.pi * R[idx] * R[idx] * self.length[idx] * self.density[idx]
+            mass += self.leaf_mass[idx] + self.fruit_mass[idx]
+            mass[axis] += self.cumulated_mass[successor[axis]]
+            mass[branch] += self.cumulated_mass[lateral]
+            self.cumulated_mass[idx] = mass
+
+            # cumulated torque
+            own = numpy.cross(self.heading[idx] * self.length[idx][:, numpy.newaxis], tropism)
+            terminal = idx[~axis]
+            self.cumulated_torque[terminal] = own[~axis]
+            if not self.mechanics:
+                continue
+            sa = successor[axis]
+            torque = self._moment(sa) + self.cumulated_torque[sa] + own[axis]
+            torque[branch[axis]] += self.cumulated_torque[lateral] + self._moment(lateral)
+            self.cumulated_torque[idx[axis]] = torque
+
+            # rotation velocity
+            staked = self.trunk[idx] if self.stake else numpy.zeros(len(idx), dtype=bool)
+            self.rotation_velocity[idx[staked]] = 0.
+            k = idx[~staked]
+            self.acting_rotation[k] = self.cumulated_torque[k] / self.rigidity[k][:, numpy.newaxis]
+            if harvest:
+                phm = self.pre_harvest_mass[k]
+                delta = numpy.zeros(len(k))
+                nonzero = phm != 0
+                delta[nonzero] = (phm[nonzero] - self.cumulated_mass[k][nonzero]) / phm[nonzero]
+                self.rotation_memory[k] = self.pre_harvest_rotation[k] * delta[:, numpy.newaxis]
+            rv = (self.acting_rotation[k] + self.rotation_memory[k]) * step \
+                + self.rotation_velocity[k] * (1.0 - step)
+            norm = numpy.sqrt(_dot(rv, rv))
+            self.rv_norm[k] = norm
+            nonzero = norm > 0
+            rv[nonzero] /= norm[nonzero][:, numpy.newaxis]
+            self.rotation_velocity[k] = rv
+
+    def scatter(self, simulation):
+        """Write the arrays back into the metamer_data instances"""
+        harvest = simulation.events.harvest.active
+        rule = self.index.rule.tolist()
+        trunk = self.trunk.tolist()
+        columns = zip(self.radius.tolist(), self.closest_apex.tolist(),
+            self.farthest_apex.tolist(), self.sons_nb.tolist(),
+            self.cumulated_mass.tolist(), self.rv_norm.tolist())
+        torque = self.cumulated_torque.tolist()
+        rv = self.rotation_velocity.tolist()
+        acting = self.acting_rotation.tolist()
+        memory = self.rotation_memory.tolist()
+        for i, m in enumerate(self.metamers):
+            if rule[i] == RULE_NONE:
+                continue
+            radius, closest, farthest, sons, m.cumulated_mass, rv_norm = columns[i]
+            m.radius = radius
+            m.closest_apex = int(closest)
+            m.farthest_apex = int(farthest)
+            m.sons_nb = int(sons)
+            m.layers[-1].thickness = radius - m.layers[-1].radius
+            if self.mechanics or rule[i] == RULE_APEX:
+                m.cumulated_torque = Vector3(*torque[i])
+            if not self.mechanics:
+                continue
+            if self.stake and trunk[i]:
+                m.rotation_velocity = Vector3()
+                continue
+            m.acting_rotation = Vector3(*acting[i])
+            if harvest:
+                m.rotation_memory = Vector3(*memory[i])
+            m.rotation_velocity = Vector3(*rv[i])
+            m.rv_norm = rv_norm
+
+    def update(self, lstring, simulation, tree):
+        """Apply the productions of group 2 to the lstring
+
+        :param lstring: the lstring
+        :param simulation: the :class:`~openalea.stocatree.tools.simulation.SimulationStocatree` instance
+        :param tree: the :class:`~openalea.stocatree.tree.Tree` instance
+        """
+        self.gather(lstring)
+        self.expand_apices(simulation)
+        if self.size == 0:
+            return
+        self.apex_radius = numpy.array([0. if a is None else a.radius
+                                        for a in self.index.apex], dtype=float)
+        self.reduce(simulation, tree.tropism)
+        self.scatter(simulation)
+        if self.index.trunk >= 0:
+            radius = self.radius[self.index.trunk]
+            tree.trunk_radius = radius
+            tree.trunk_cross_sectional_area = constants.pi * radius * radius
+            tree.fruit_load = tree.fruits / tree.trunk_cross_sectional_area
@@ -19,7 +19,7 @@
 
 """
 import datetime
-from os.path import join
+from os.path import join, getsize
 
 
 class output(object):
@@ -380,90 +380,233 @@ class mtg(output):
   def write_header(self):
       self.file.write(self.header)
 
-  def save(self, lstring, date, trunk_radius):
-      """
+  def rows(self, lstring, trunk_radius, lstring_id=True):
+      """Return the rows of the MTG of the lstring (without the header)
 
-      :param date: date in format compatible with `datetime.date()`
+      The rows are formatted in memory and returned as a list of
+      (object, lstring_id, row) tuples where object is the growth_unit_data
+      or metamer_data described by the row (None for the trunk) and
+      lstring_id the position of the metamer in the lstring (None for the
+      trunk and the growth units).
+
+      :param lstring_id: if False, the lstring_id column of the metamers is
+          left empty
       """
-      year = date.year
-      self.write_header()
+      columns = self.columns
+      rows = []
       self.current_column = 1
-      self.file.write("/T1\t")
-      self.write_trailing_tabs()
-      self.file.write("\t%.4f\t%.4f\t%.4f\t%.4f\t%4.0f\t%.4f\n" % \
-          (trunk_radius * 2000.0, 0.0, 0.0, 0.0, 1994, 0.0))
+      rows.append((None, None, "/T1\t" + '\t' * (columns - 1) +
+          "\t%.4f\t%.4f\t%.4f\t%.4f\t%4.0f\t%.4f\n" % \
+          (trunk_radius * 2000.0, 0.0, 0.0, 0.0, 1994, 0.0)))
 
+      previous = None
       for i, elt in enumerate(lstring):
-          if i!=0:
-              #print lstring[i-1].name
-              previous = lstring[i-1].name
-          else:
-              #print 'NONE'
-              previous = None
-          if  elt.name=='growth_unit' and previous=='branch':
+          name = elt.name
+          if name == 'growth_unit' and previous == 'branch':
               u = elt[0]
               self.current_column += 1
-              if (self.current_column > self.columns):
+              if (self.current_column > columns):
                   raise ValueError("ERROR: Not enough columns were allocated for the MTG file.\n");
-
-              self.write_leading_tabs()
-
               if u.inflorescence:
-                  self.file.write('+I' + str(u.index))
+                  label = '+I' + str(u.index)
               else:
-                  self.file.write('+G' + str(u.index))
-              self.write_trailing_tabs();
-              self.file.write("\t\t\t\t\t%4.0f\n" % u.year)
-          elif elt.name=='growth_unit':
+                  label = '+G' + str(u.index)
+              rows.append((u, None, '\t' * self.current_column + label +
+                  '\t' * (columns - self.current_column) +
+                  "\t\t\t\t\t%4.0f\n" % u.year))
+          elif name == 'growth_unit':
               u = elt[0]
-              self.write_leading_tabs()
-
-
-              if u.index==1:
-                  self.file.write('/')
+              if u.index == 1:
+                  label = '/'
               else:
-                  self.file.write('^<')
+                  label = '^<'
               if u.inflorescence:
-                  self.file.write('I' + str(u.index))
+                  label += 'I' + str(u.index)
               else:
-                  self.file.write('G' + str(u.index))
-              self.write_trailing_tabs();
+                  label += 'G' + str(u.index)
               if u.index == 1:
-                  self.file.write("\t%.4f\t%.4f\t%.4f\t%.4f\t%4.0f\n" % \
-                      (trunk_radius * 2000.0, 0.0, 0.0, 0.0, u.year))
-
+                  features = "\t%.4f\t%.4f\t%.4f\t%.4f\t%4.0f\n" % \
+                      (trunk_radius * 2000.0, 0.0, 0.0, 0.0, u.year)
               else:
-                  self.file.write("\t\t\t\t\t%4.0f\n"  % u.year)
-          elif elt.name=='metamer':
+                  features = "\t\t\t\t\t%4.0f\n" % u.year
+              rows.append((u, None, '\t' * self.current_column + label +
+                  '\t' * (columns - self.current_column) + features))
+          elif name == 'metamer':
               # Modified by Han on 03-05-2011
-              m = lstring[i][0]
-              #m = elt[0]
-              self.write_leading_tabs();
-              if m.number==1:
-                  self.file.write("^/M%d"  % m.number)
+              m = elt[0]
+              if m.number == 1:
+                  label = "^/M%d" % m.number
               else:
-                  self.file.write("^<M%d" % m.number)
-              self.write_trailing_tabs();
-              self.file.write("\t%.4f\t%.4f\t%.4f\t%.4f\t%4.0f\t%s\t%.4f\t%s\t%.4f\t%.4f\t%.4f\t%.4f\t%u\t%u\t%u\t%s\t%.4f\t%.4f\n" \
+                  label = "^<M%d" % m.number
+              rows.append((m, i, '\t' * self.current_column + label +
+                  '\t' * (columns - self.current_column) +
+                  "\t%.4f\t%.4f\t%.4f\t%.4f\t%4.0f\t%s\t%.4f\t%s\t%.4f\t%.4f\t%.4f\t%.4f\t%u\t%u\t%s\t%s\t%.4f\t%.4f\n" \
                   % (m.radius * 2000.0, m.position.x, m.position.y, m.position.z, m.year,\
                       m.parent_observation, m.length, m.leaf.state, m.leaf_area,\
                       m.ta_pgl, m.sa_pgl, m.star_pgl,\
-                      m.parent_unit_id, m.parent_fbr_id, i,\
-                      m.zone, m.radius, m.fruit.mass))
-          elif elt.name=='apex' and not previous == 'branch':
-              a = elt
+                      m.parent_unit_id, m.parent_fbr_id, i if lstring_id else '',\
+                      m.zone, m.radius, m.fruit.mass)))
+          elif name == 'apex' and not previous == 'branch':
               #This assert was filtered by Han on 06=07-2012 because of an
               #assert error after the modification of plastochrons
               #assert self.current_column > 0
-              self.current_column-=1
-
+              self.current_column -= 1
+          previous = name
+      return rows
 
+  def save(self, lstring, date, trunk_radius):
+      """
 
+      :param date: date in format compatible with `datetime.date()`
 
+      The whole MTG is formatted in memory and written at once.
+      """
+      rows = self.rows(lstring, trunk_radius)
+      self.file.write(self.header + ''.join([row for obj, i, row in rows]))
       self.file.close()
       self.file = None
 
 
+class mtg_delta(mtg):
+  """MTG snapshots saved as differences with the previous snapshot
+
+  All the snapshots are appended to a single file. The first snapshot
+  contains all the rows of the MTG; the next ones only contain the rows that
+  changed (or appeared) since the previous snapshot. Each row is identified
+  by an integer attributed to the growth unit or metamer it describes::
+
+      <MTG header>
+      #SNAPSHOT\t<date>
+      #ORDER\t<identifiers of the rows of the MTG, or = if unchanged>
+      #LSTRING\t<lstring_id of the rows (- if none), or = if unchanged>
+      <identifier>\t<row without its lstring_id>
+      ...
+      #SNAPSHOT\t<date>
+      ...
+
+  The lstring_id of a metamer changes whenever a module is inserted before
+  it, so it is written once per snapshot instead of being compared with the
+  other columns. The full MTGs are rebuilt with :func:`read_mtg_delta`.
+  """
+
+  def __init__(self, init_date=datetime.datetime(1994,1,1), frequency=365., filename="trunk", ext='.mtgd'):
+    mtg.__init__(self, init_date=init_date, frequency=frequency, filename=filename, ext=ext)
+    self.previous = {}      # identifier -> row of the previous snapshot
+    self.order = []         # identifiers of the rows of the previous snapshot
+    self.lstring_ids = []   # lstring_id of the rows of the previous snapshot
+    self.identifiers = {}   # id(object) -> (object, identifier)
+    self.next_identifier = 0
+
+  def __setstate__(self, state):
+    # the id of the objects change when the simulation is reloaded
+    self.__dict__.update(state)
+    self.__dict__.setdefault('lstring_ids', [])
+    self.identifiers = dict([(id(obj), (obj, n)) for obj, n in self.identifiers.values()])
+
+  def save(self, lstring, date, trunk_radius):
+      """append the differences with the previous snapshot to the file
+
+      :param date: date in format compatible with `datetime.date()`
+      """
+      rows = self.rows(lstring, trunk_radius, lstring_id=False)
+      out = []
+      if getsize(self.filename) == 0:
+          out.append(self.header)
+      out.append('#SNAPSHOT\t%s\n' % date)
+      identifiers = {}
+      current = {}
+      order = []
+      lstring_ids = []
+      changed = []
+      for obj, i, row in rows:
+          key = id(obj)
+          entry = self.identifiers.get(key)
+          if entry is None or entry[0] is not obj:
+              entry = (obj, self.next_identifier)
+              self.next_identifier += 1
+          identifiers[key] = entry
+          n = entry[1]
+          order.append(n)
+          if i is None:
+              lstring_ids.append('-')
+          else:
+              lstring_ids.append(str(i))
+          current[n] = row
+          if self.previous.get(n) != row:
+              changed.append('%d\t%s' % (n, row))
+      if order == self.order:
+          out.append('#ORDER\t=\n')
+      else:
+          out.append('#ORDER\t%s\n' % ' '.join([str(n) for n in order]))
+      if lstring_ids == self.lstring_ids:
+          out.append('#LSTRING\t=\n')
+      else:
+          out.append('#LSTRING\t%s\n' % ' '.join(lstring_ids))
+      out.extend(changed)
+      self.file.write(''.join(out))
+      self.file.flush()
+      self.previous = current
+      self.order = order
+      self.lstring_ids = lstring_ids
+      self.identifiers = identifiers
+
+
+def read_mtg_delta(filename):
+  """Rebuild the MTGs saved by :class:`mtg_delta`
+
+  :param filename: a file written by :class:`mtg_delta`
+  :returns: a generator of (date, mtg) tuples where mtg is the content of the
+      MTG file that :meth:`mtg.save` would have written at that date.
+
+  ::
+
+      for date, text in read_mtg_delta('trunk_1.mtgd'):
+          open('trunk_%s.mtg' % date[:10], 'w').write(text)
+  """
+  header = []
+  rows = {}
+  order = []
+  lstring_ids = None
+  date = None
+  for line in open(filename):
+      if line.startswith('#SNAPSHOT\t'):
+          if date is not None:
+              yield date, _delta_text(header, rows, order, lstring_ids)
+              rows = dict([(n, rows[n]) for n in order])
+          date = line[10:-1]
+      elif date is None:
+          header.append(line)
+      elif line.startswith('#ORDER\t'):
+          value = line[7:].split()
+          if value != ['=']:
+              order = [int(n) for n in value]
+      elif line.startswith('#LSTRING\t'):
+          value = line[9:].split()
+          if value != ['=']:
+              lstring_ids = value
+      else:
+          n, row = line.split('\t', 1)
+          rows[int(n)] = row
+  if date is not None:
+      yield date, _delta_text(header, rows, order, lstring_ids)
+
+
+def _delta_text(header, rows, order, lstring_ids):
+  """the MTG of a snapshot of :func:`read_mtg_delta`, the lstring_id of the
+  metamers being put back in their column"""
+  if lstring_ids is None:
+      # written before the lstring_id were stored apart from the rows
+      return ''.join(header) + ''.join([rows[n] for n in order])
+  column = header[-1].rstrip('\n').split('\t').index('lstring_id')
+  text = []
+  for n, lstring_id in zip(order, lstring_ids):
+      row = rows[n]
+      if lstring_id != '-':
+          fields = row.split('\t')
+          fields[column] = lstring_id
+          row = '\t'.join(fields)
+      text.append(row)
+  return ''.join(header) + ''.join(text)
 
 
 class Data(object):
@@ -509,6 +652,9 @@ class Data(object):
       if self.options.output.mtg :
         self.mtg = mtg(init_date=self.init_date)
 
+      if getattr(self.options.output, 'mtg_delta', False):
+        self.mtg_delta = mtg_delta(init_date=self.init_date)
+
       #self.l_string =l_string(directory=self.directory, tag=options.general.tag, verbose=self.verbose)
       #self.light_interception=light_interception(tag=options.general.tag, verbose=self.verbose)
       
@@ -542,6 +688,11 @@ class Data(object):
         self.counts.build_filename(directory=self.directory, tag="{0}_{1}".format(self.options.general.tag, simu_id))
         self.counts.openfile()
 
+      # init the incremental MTG output
+      if getattr(self.options.output, 'mtg_delta', False):
+        self.mtg_delta.build_filename(directory=self.directory, tag="{0}_{1}".format(self.options.general.tag, simu_id))
+        self.mtg_delta.openfile()
+
       # init the l_srting output
       #Filtered by Han on 12-12-2011
       #if self.options.output.l_string:
@@ -578,6 +729,8 @@ class Data(object):
 
       if self.options.output.mtg :
         self.mtg.close()
+      if getattr(self.options.output, 'mtg_delta', False):
+        self.mtg_delta.close()
         #self.trunk.close()
         #self.light_interception.close()
 
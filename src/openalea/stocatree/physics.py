@@ -45,7 +45,14 @@ __all__ = [
     'rupture',
     'stress',
     'reorient_frame',
-    'rotate_frame_at_branch']
+    'rotate_frame_at_branch',
+    'axis_angle_to_quaternions',
+    'quaternion_multiply',
+    'quaternion_rotate',
+    'frames_to_quaternions',
+    'reorient_frames',
+    'propagate_frames',
+    'propagate_positions']
 
 
 
@@ -236,6 +243,220 @@ def rotate_frame_at_branch(initial_hlu, branching_angle, phyllotactic_angle):
     return hlu
 
 
+def _normalize_rows(v):
+    """normalise the rows of v in place (null rows are left unchanged)"""
+    norm = numpy.sqrt((v * v).sum(axis=1))
+    norm[norm == 0] = 1.
+    v /= norm[:, numpy.newaxis]
+    return v
+
+
+def axis_angle_to_quaternions(axis, angle):
+    """Quaternions of the rotations around the rows of axis
+
+    Vectorised version of :meth:`_AxisAngle.axis_angle_to_quaternion`: the
+    quaternions are stored as the rows [x, y, z, w] of an N x 4 array.
+
+    :param axis: N x 3 array of unit vectors
+    :param angle: N angles in radians
+    """
+    half_angle = 0.5 * numpy.asarray(angle, dtype=float)
+    q = numpy.empty((len(half_angle), 4))
+    q[:, :3] = axis * numpy.sin(half_angle)[:, numpy.newaxis]
+    q[:, 3] = numpy.cos(half_angle)
+    return _normalize_rows(q)
+
+
+def quaternion_multiply(q, r):
+    """Hamilton product of the rows of q and r (rotation r then q)"""
+    x1, y1, z1, w1 = q[:, 0], q[:, 1], q[:, 2], q[:, 3]
+    x2, y2, z2, w2 = r[:, 0], r[:, 1], r[:, 2], r[:, 3]
+    res = numpy.empty(numpy.broadcast(q, r).shape)
+    res[:, 0] = w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2
+    res[:, 1] = w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2
+    res[:, 2] = w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2
+    res[:, 3] = w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2
+    return res
+
+
+def quaternion_rotate(q, v):
+    """rotate the rows of v by the unit quaternions q"""
+    u = q[:, :3]
+    t = 2. * numpy.cross(u, v)
+    return v + q[:, 3:4] * t + numpy.cross(u, t)
+
+
+def frames_to_quaternions(heading, left):
+    """Quaternions of the frames (heading, left, heading x left)
+
+    The quaternion q of a frame maps the axes x, y, z onto the heading, left
+    and up vectors of the frame. The heading and left vectors are expected to
+    be orthonormal.
+    """
+    h = _normalize_rows(numpy.array(heading, dtype=float))
+    l = _normalize_rows(numpy.array(left, dtype=float))
+    u = numpy.cross(h, l)
+    m00, m10, m20 = h[:, 0], h[:, 1], h[:, 2]
+    m01, m11, m21 = l[:, 0], l[:, 1], l[:, 2]
+    m02, m12, m22 = u[:, 0], u[:, 1], u[:, 2]
+    q = numpy.empty((len(h), 4))
+    trace = m00 + m11 + m22
+    # 4 cases to avoid divisions by small numbers (Shepperd's method)
+    case = numpy.argmax(numpy.array([trace, m00, m11, m22]), axis=0)
+    c = case == 0
+    s = numpy.sqrt(1. + trace[c]) * 2.
+    q[c] = numpy.array([(m21 - m12)[c] / s, (m02 - m20)[c] / s,
+                        (m10 - m01)[c] / s, 0.25 * s]).T
+    c = case == 1
+    s = numpy.sqrt(1. + m00[c] - m11[c] - m22[c]) * 2.
+    q[c] = numpy.array([0.25 * s, (m01 + m10)[c] / s,
+                        (m02 + m20)[c] / s, (m21 - m12)[c] / s]).T
+    c = case == 2
+    s = numpy.sqrt(1. + m11[c] - m00[c] - m22[c]) * 2.
+    q[c] = numpy.array([(m01 + m10)[c] / s, 0.25 * s,
+                        (m12 + m21)[c] / s, (m02 - m20)[c] / s]).T
+    c = case == 3
+    s = numpy.sqrt(1. + m22[c] - m00[c] - m11[c]) * 2.
+    q[c] = numpy.array([(m02 + m20)[c] / s, (m12 + m21)[c] / s,
+                        0.25 * s, (m10 - m01)[c] / s]).T
+    return _normalize_rows(q)
+
+
+def reorient_frames(heading, left, rotation_velocity, rv_norm, length):
+    """Batched version of :func:`reorient_frame`
+
+    Rotate N frames around their rotation velocity (in place).
+
+    :param heading: N x 3 array of headings, modified in place
+    :param left: N x 3 array of left vectors, modified in place
+    :param rotation_velocity: N x 3 array of normalised rotation velocities
+    :param rv_norm: N norms of the rotation velocities
+    :param length: N lengths of the metamers
+
+    :returns: heading, left and the N x 3 array of the up vectors (heading x left)
+
+    As in :func:`~openalea.stocatree.optimisation.reorient_frame`, a frame
+    is rotated only if the product of the rotation velocity norm and length
+    is larger than 0.01.
+    """
+    _normalize_rows(heading)
+    _normalize_rows(left)
+    angle = numpy.asarray(rv_norm) * numpy.asarray(length)
+    rotated = numpy.abs(angle) >= 0.01
+    if rotated.any():
+        q = axis_angle_to_quaternions(rotation_velocity[rotated], angle[rotated])
+        heading[rotated] = _normalize_rows(quaternion_rotate(q, heading[rotated]))
+        left[rotated] = _normalize_rows(quaternion_rotate(q, left[rotated]))
+    return heading, left, numpy.cross(heading, left)
+
+
+def _prefix(parent, combine, values):
+    """combine the values along the paths from each node to its root
+
+    Pointer jumping: after k iterations, values[i] combines the values of the
+    2**k first ancestors of i, so that log2(depth) vectorised passes are
+    required instead of one pass per level. combine(child, ancestor) must be
+    associative.
+    """
+    ancestor = numpy.array(parent, dtype=int)
+    active = numpy.flatnonzero(ancestor >= 0)
+    while len(active):
+        a = ancestor[active]
+        values = combine(values, active, a)
+        ancestor[active] = ancestor[a]
+        active = active[ancestor[active] >= 0]
+    return values
+
+
+def propagate_frames(parent, branch, heading, left, rotation_velocity, rv_norm,
+                     length, branching_angle, phyllotactic_angle):
+    """Reorient all the frames of a tree at once (in place)
+
+    This is the composition, along each axis, of the frame updates done
+    metamer per metamer in group 1 of the L-system::
+
+        if branch:
+            hlu = rotate_frame_at_branch(parent_hlu, parent_branching_angle, parent_phyllotactic_angle)
+        hlu = reorient_frame(hlu, rotation_velocity, rv_norm, length)
+
+    The frame of a metamer is the quaternion :math:`Q_i = A_i Q_p B_i` where
+    :math:`A_i` is the rotation around the rotation velocity, :math:`Q_p`
+    the frame of the parent and :math:`B_i` the branching rotation expressed
+    in the parent frame. The products along the paths from the roots are
+    computed with a prefix (pointer jumping) scan instead of one pass per
+    level.
+
+    :param parent: N indices of the parent metamers (-1 for the roots whose
+        frames are left unchanged)
+    :param branch: N booleans, True for the first metamer of a branch
+    :param heading: N x 3 array of headings, modified in place
+    :param left: N x 3 array of left vectors, modified in place
+    :param rotation_velocity: N x 3 array of normalised rotation velocities
+    :param rv_norm: N norms of the rotation velocities
+    :param length: N lengths of the metamers
+    :param branching_angle: N branching angles (radians)
+    :param phyllotactic_angle: N phyllotactic angles (radians)
+
+    :returns: heading, left and the N x 3 array of the up vectors (heading x left)
+    """
+    parent = numpy.asarray(parent, dtype=int)
+    n = len(parent)
+    child = parent >= 0
+    identity = numpy.zeros((n, 4))
+    identity[:, 3] = 1.
+
+    # left factors: rotation velocity for children, frame for roots
+    lq = identity.copy()
+    lq[~child] = frames_to_quaternions(heading[~child], left[~child])
+    angle = numpy.asarray(rv_norm) * numpy.asarray(length)
+    rotated = child & (numpy.abs(angle) >= 0.01)
+    lq[rotated] = axis_angle_to_quaternions(rotation_velocity[rotated], angle[rotated])
+
+    # right factors: rotation at branch in the frame of the parent
+    rq = identity.copy()
+    branch = child & numpy.asarray(branch, dtype=bool)
+    if branch.any():
+        bearer = parent[branch]
+        m = len(bearer)
+        x = numpy.zeros((m, 3))
+        x[:, 0] = 1.
+        y = numpy.zeros((m, 3))
+        y[:, 1] = 1.
+        rq[branch] = quaternion_multiply(
+            axis_angle_to_quaternions(x, numpy.asarray(phyllotactic_angle)[bearer]),
+            axis_angle_to_quaternions(y, numpy.asarray(branching_angle)[bearer]))
+
+    def combine(values, i, a):
+        lq, rq = values
+        lq[i], rq[i] = quaternion_multiply(lq[i], lq[a]), quaternion_multiply(rq[a], rq[i])
+        return lq, rq
+
+    lq, rq = _prefix(parent, combine, (lq, rq))
+    q = _normalize_rows(quaternion_multiply(lq[child], rq[child]))
+    axes = numpy.eye(3)
+    heading[child] = quaternion_rotate(q, numpy.tile(axes[0], (len(q), 1)))
+    left[child] = quaternion_rotate(q, numpy.tile(axes[1], (len(q), 1)))
+    _normalize_rows(heading)
+    _normalize_rows(left)
+    return heading, left, numpy.cross(heading, left)
+
+
+def propagate_positions(parent, heading, length):
+    """Positions of the tips of the metamers of a tree
+
+    Vectorised version of :meth:`~openalea.stocatree.metamer.metamer_data.update_position`:
+    the position of a metamer is the position of its parent plus
+    heading * length (heading * length for the roots).
+    """
+    positions = heading * numpy.asarray(length)[:, numpy.newaxis]
+
+    def combine(values, i, a):
+        values[i] = values[i] + values[a]
+        return values
+
+    return _prefix(parent, combine, positions)
+
+
 def stress(torque, radius):
     """Stress. Not used for the moment
     """
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+"""
+.. topic:: profiling.py summary
+
+    Timeline of the time spent in each phase of the L-system
+
+    :Code: in progress
+    :Documentation: in progress
+    :Revision: $Id$
+    :Usage: >>> from openalea.stocatree.profiling import *
+
+.. testsetup::
+
+    from openalea.stocatree.profiling import *
+
+MAppleT.lpy goes through several phases per simulated day (update_parameters,
+physics, statistics, update_structure...), each phase being one derivation
+step of the L-system, possibly followed by the interpretation of the lstring
+when the frame is displayed. :class:`PhaseProfiler` accumulates, for each
+simulated day:
+
+    * the time of the derivation step of each phase, from StartEach to EndEach
+    * the time of the interpretation (rendering), which starts when the first
+      interpretation rule is called
+    * the time of named sections of code such as the output writers
+    * the length of the lstring and the number of metamers
+
+:meth:`PhaseProfiler.save` writes the timeline as a CSV file (one row per
+day) and a JSON summary (totals per phase and section). A disabled profiler
+does nothing, so that the calls may stay in the L-system.
+
+:Example:
+
+    >>> profiler = PhaseProfiler(names={1: 'update_parameters', 2: 'physics'})
+    >>> profiler.begin(1, date)          # in StartEach
+    >>> profiler.mark_render()           # in the first interpretation rule
+    >>> profiler.end(lstring_length, metamers)   # in EndEach
+    >>> with profiler.section('mtg'):
+    ...     data.mtg.save(lstring, date, trunk_radius)
+    >>> profiler.save('1_profile')       # writes 1_profile.csv and 1_profile.json
+"""
+
+import time
+import json
+
+__all__ = ['PhaseProfiler']
+
+
+class _Section(object):
+    """context manager adding the time spent in a block to a column"""
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = self.profiler.clock()
+        return self
+
+    def __exit__(self, *args):
+        self.profiler.add(self.name, self.profiler.clock() - self.start)
+        return False
+
+
+class _NoSection(object):
+    """context manager of a disabled profiler"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class PhaseProfiler(object):
+    """time the phases, the rendering and the outputs of a simulation day by day
+
+    :param enabled: if False, all the methods return at once
+    :param names: dictionary phase number -> column name (default is the number)
+    :param clock: function returning the current time in seconds
+    """
+    render = 'render'
+
+    def __init__(self, enabled=True, names=None, clock=time.time):
+        self.enabled = enabled
+        self.names = names or {}
+        self.clock = clock
+        self.columns = []
+        self.rows = []
+        self.totals = {}
+        self.calls = {}
+        self.row = None
+        self.phase = None
+        self.start = None
+        self.render_start = None
+        self.created = clock()
+        self._nosection = _NoSection()
+
+    def _new_row(self, date):
+        if self.row is not None:
+            self.rows.append(self.row)
+        self.row = {'date': date, 'lstring': 0, 'metamers': 0}
+
+    def add(self, name, duration):
+        """add a duration (in seconds) to the column name of the current day"""
+        if not self.enabled:
+            return
+        if self.row is None:
+            self._new_row(None)
+        if name not in self.totals:
+            self.columns.append(name)
+            self.totals[name] = 0.
+            self.calls[name] = 0
+        self.row[name] = self.row.get(name, 0.) + duration
+        self.totals[name] += duration
+        self.calls[name] += 1
+
+    def begin(self, phase, date=None):
+        """a derivation step of the given phase starts (to be called in StartEach)
+
+        A new row of the timeline is started when the date changes.
+        """
+        if not self.enabled:
+            return
+        if self.row is None or self.row['date'] != date:
+            self._new_row(date)
+        self.phase = phase
+        self.render_start = None
+        self.start = self.clock()
+
+    def mark_render(self):
+        """the interpretation of the lstring starts (to be called in the first
+        interpretation rule, e.g. root())"""
+        if not self.enabled or self.start is None or self.render_start is not None:
+            return
+        self.render_start = self.clock()
+
+    def end(self, lstring_length=None, metamers=None):
+        """the derivation step ends (to be called in EndEach)
+
+        :param lstring_length: the length of the lstring
+        :param metamers: the number of metamers
+        """
+        if not self.enabled or self.start is None:
+            return
+        now = self.clock()
+        if self.render_start is None:
+            self.add(self.names.get(self.phase, str(self.phase)), now - self.start)
+        else:
+            self.add(self.names.get(self.phase, str(self.phase)), self.render_start - self.start)
+            self.add(self.render, now - self.render_start)
+        if lstring_length is not None:
+            self.row['lstring'] = lstring_length
+        if metamers is not None:
+            self.row['metamers'] = metamers
+        self.start = None
+        self.render_start = None
+
+    def section(self, name):
+        """context manager timing a block of code in the column name"""
+        if not self.enabled:
+            return self._nosection
+        return _Section(self, name)
+
+    def timeline(self):
+        """the rows of the timeline, one per day, as dictionaries"""
+        if self.row is None:
+            return list(self.rows)
+        return self.rows + [self.row]
+
+    def summary(self):
+        """dictionary with the total time and number of calls per column"""
+        return {'duration': self.clock() - self.created,
+                'days': len(self.timeline()),
+                'columns': self.columns,
+                'totals': self.totals,
+                'calls': self.calls}
+
+    def save(self, filename):
+        """write the timeline in filename.csv and the summary in filename.json"""
+        if not self.enabled:
+            return
+        f = open(filename + '.csv', 'w')
+        f.write(','.join(['date', 'lstring', 'metamers'] + self.columns) + '\n')
+        for row in self.timeline():
+            date = row['date']
+            if hasattr(date, 'strftime'):
+                date = date.strftime('%Y-%m-%d')
+            values = [str(date), str(row['lstring']), str(row['metamers'])]
+            values += ['%.6f' % row.get(name, 0.) for name in self.columns]
+            f.write(','.join(values) + '\n')
+        f.close()
+        f = open(filename + '.json', 'w')
+        json.dump(self.summary(), f, indent=1, sort_keys=True)
+        f.close()
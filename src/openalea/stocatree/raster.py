@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+"""
+.. topic:: raster.py summary
+
+    Projected leaf areas computed on the CPU, without the PlantGL viewer
+
+    :Code: in progress
+    :Documentation: in progress
+    :Revision: $Id$
+    :Usage: >>> from openalea.stocatree.raster import *
+
+.. testsetup::
+
+    from openalea.stocatree.raster import *
+
+diffuseInterception and decomposedSTAR render the scene in the OpenGL frame
+of the PlantGL viewer for each direction of the sky, which requires a
+display. This module projects the triangles of the scene along each direction
+with NumPy instead: the triangles are rasterized into a z-buffer of w x h
+pixels, the nearest triangle to the sky being kept in each pixel, and the
+visible area of each shape id is its number of pixels times the pixel area.
+
+* :func:`diffuse_interception` returns {id: area} weighted over the
+  directions, as diffuseInterception, and may be given to
+  :meth:`~openalea.stocatree.interception.STAR.collect`.
+* :func:`raster_star` returns STAR, iPEA and TLA, as decomposedSTAR, and may
+  be given to :func:`~openalea.stocatree.sky.decomposed_star`.
+
+The directions are (azimuth, elevation, weight), angles in degrees, the
+weights being used as given (the sky turtle weights are normalised to 1 by
+:func:`sky_turtle`).
+
+:Example:
+
+    >>> d = diffuse_interception(scene, w=300, h=300, threads=4)
+    >>> STAR, iPEA, TLA = raster_star(leaves, sky_turtle())
+"""
+
+from math import cos, sin, radians
+from multiprocessing.pool import ThreadPool
+
+import numpy
+
+__all__ = ['sky_turtle', 'sky_vector', 'scene_triangles', 'zbuffer',
+           'projected_areas', 'diffuse_interception', 'triangle_areas', 'raster_star']
+
+#: maximum number of (triangle, pixel) pairs tested at once
+chunk_size = 1000000
+
+
+def sky_turtle():
+    """the 46 directions of the sky turtle with weights normalised to 1"""
+    from openalea.fractalysis.light import directLight as dl
+    sky = dl.sd.skyTurtle()
+    total = float(sum(weight for azimuth, elevation, weight in sky))
+    return [(azimuth, elevation, weight / total) for azimuth, elevation, weight in sky]
+
+
+def sky_vector(azimuth, elevation):
+    """unit vector pointing to the sky in a direction given in degrees"""
+    azimuth, elevation = radians(azimuth), radians(elevation)
+    return numpy.array([cos(elevation) * cos(azimuth),
+                        cos(elevation) * sin(azimuth),
+                        sin(elevation)])
+
+
+def _basis(vector):
+    """two unit vectors orthogonal to vector and to each other"""
+    other = numpy.array([1., 0., 0.]) if abs(vector[2]) > 0.9 else numpy.array([0., 0., 1.])
+    u = numpy.cross(other, vector)
+    u /= numpy.sqrt((u * u).sum())
+    return u, numpy.cross(vector, u)
+
+
+def scene_triangles(scene):
+    """the triangles of the shapes of a pgl.Scene
+
+    :returns: an array of shape (number of triangles, 3, 3) with the
+        coordinates of the vertices, and the array of the shape id of each
+        triangle
+    """
+    import openalea.plantgl.all as pgl
+    tesselator = pgl.Tesselator()
+    triangles = []
+    ids = []
+    for sh in scene:
+        sh.apply(tesselator)
+        mesh = tesselator.triangulation
+        if mesh is None or len(mesh.indexList) == 0:
+            continue
+        points = numpy.array([tuple(p) for p in mesh.pointList], dtype=float)
+        index = numpy.array([tuple(i) for i in mesh.indexList], dtype=int)
+        triangles.append(points[index])
+        ids.append(numpy.repeat(sh.id, len(index)))
+    if not triangles:
+        return numpy.zeros((0, 3, 3)), numpy.zeros(0, dtype=int)
+    return numpy.concatenate(triangles), numpy.concatenate(ids)
+
+
+def _planes(xy, depth):
+    """coefficients (a, b, c) of the barycentric coordinates and of the depth
+    of each triangle as planes a * x + b * y + c of the projection
+
+    :returns: an array (number of triangles, 12), the coordinates being
+        positive inside the triangles, and a mask of the non degenerate
+        triangles
+    """
+    x, y = xy[:, :, 0], xy[:, :, 1]
+    area = (x[:, 1] - x[:, 0]) * (y[:, 2] - y[:, 0]) - (y[:, 1] - y[:, 0]) * (x[:, 2] - x[:, 0])
+    valid = area != 0
+    area = numpy.where(valid, area, 1.)
+    planes = numpy.empty((len(xy), 12))
+    for k in range(3):
+        i, j = (k + 1) % 3, (k + 2) % 3
+        # barycentric coordinate of the vertex k
+        planes[:, 3 * k] = (y[:, i] - y[:, j]) / area
+        planes[:, 3 * k + 1] = (x[:, j] - x[:, i]) / area
+        planes[:, 3 * k + 2] = (x[:, i] * y[:, j] - x[:, j] * y[:, i]) / area
+    # the depth is the sum of the depths of the vertices times their coordinates
+    for m in range(3):
+        planes[:, 9 + m] = (planes[:, m:9:3] * depth).sum(axis=1)
+    return planes, valid
+
+
+def _rasterize(xy, depth, labels, origin, pixel, shape, zbuf, lbuf):
+    """rasterize some triangles into the z-buffer zbuf and the label buffer lbuf"""
+    nx, ny = shape
+    planes, valid = _planes(xy, depth)
+    low = numpy.ceil((xy.min(axis=1) - origin) / pixel - 0.5).astype(int)
+    high = numpy.floor((xy.max(axis=1) - origin) / pixel - 0.5).astype(int)
+    low = numpy.maximum(low, 0)
+    high[:, 0] = numpy.minimum(high[:, 0], nx - 1)
+    high[:, 1] = numpy.minimum(high[:, 1], ny - 1)
+    width = numpy.maximum(high[:, 0] - low[:, 0] + 1, 0)
+    height = numpy.maximum(high[:, 1] - low[:, 1] + 1, 0)
+    counts = numpy.where(valid, width * height, 0)
+    if counts.sum() == 0:
+        return
+
+    # one (triangle, pixel) pair per pixel of the bounding box of each triangle
+    triangle = numpy.repeat(numpy.arange(len(xy)), counts)
+    local = numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+    w = width[triangle]
+    px = low[triangle, 0] + local % w
+    py = low[triangle, 1] + local // w
+    cx = origin[0] + (px + 0.5) * pixel
+    cy = origin[1] + (py + 0.5) * pixel
+    p = planes[triangle]
+    inside = (p[:, 0] * cx + p[:, 1] * cy + p[:, 2] >= 0)
+    inside &= (p[:, 3] * cx + p[:, 4] * cy + p[:, 5] >= 0)
+    inside &= (p[:, 6] * cx + p[:, 7] * cy + p[:, 8] >= 0)
+    if not inside.any():
+        return
+    triangle, px, py, cx, cy, p = triangle[inside], px[inside], py[inside], cx[inside], cy[inside], p[inside]
+    z = p[:, 9] * cx + p[:, 10] * cy + p[:, 11]
+
+    # the nearest triangle to the sky in each pixel
+    pixels = py * nx + px
+    order = numpy.lexsort((-z, pixels))
+    pixels, z, triangle = pixels[order], z[order], triangle[order]
+    first = numpy.ones(len(pixels), dtype=bool)
+    first[1:] = pixels[1:] != pixels[:-1]
+    pixels, z, triangle = pixels[first], z[first], triangle[first]
+    nearer = z > zbuf[pixels]
+    zbuf[pixels[nearer]] = z[nearer]
+    lbuf[pixels[nearer]] = labels[triangle[nearer]]
+
+
+def zbuffer(triangles, labels, vector, w=300, h=300):
+    """the label of the triangle seen in each pixel from a direction
+
+    :param triangles: array (number of triangles, 3, 3)
+    :param labels: an integer >= 0 per triangle
+    :param vector: unit vector pointing to the sky, see :func:`sky_vector`
+    :param w, h: maximum size of the image, the pixels being square
+    :returns: the image of labels (-1 where there is no triangle) and the
+        area of a pixel
+    """
+    u, v = _basis(numpy.asarray(vector, dtype=float))
+    xy = numpy.dstack((numpy.dot(triangles, u), numpy.dot(triangles, v)))
+    depth = numpy.dot(triangles, vector)
+    origin = xy.reshape(-1, 2).min(axis=0)
+    extent = xy.reshape(-1, 2).max(axis=0) - origin
+    pixel = max(extent[0] / w, extent[1] / h)
+    if pixel <= 0:
+        return -numpy.ones((0, 0), dtype=int), 0.
+    nx = min(int(numpy.ceil(extent[0] / pixel)), w) or 1
+    ny = min(int(numpy.ceil(extent[1] / pixel)), h) or 1
+    zbuf = -numpy.inf * numpy.ones(nx * ny)
+    lbuf = -numpy.ones(nx * ny, dtype=int)
+
+    # split the triangles so that each chunk tests at most chunk_size pairs
+    sizes = (numpy.ceil((xy.max(axis=1) - xy.min(axis=1)) / pixel) + 1).prod(axis=1)
+    chunks = (numpy.cumsum(sizes) // chunk_size).astype(int)
+    bounds = [0] + (numpy.flatnonzero(numpy.diff(chunks)) + 1).tolist() + [len(xy)]
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        _rasterize(xy[start:end], depth[start:end], labels[start:end], origin, pixel, (nx, ny), zbuf, lbuf)
+    return lbuf.reshape(ny, nx), pixel * pixel
+
+
+def projected_areas(triangles, ids, directions, w=300, h=300, threads=1):
+    """visible area of each id, summed over the directions with their weights
+
+    :param triangles: array (number of triangles, 3, 3)
+    :param ids: the id of each triangle
+    :param directions: list of (azimuth, elevation, weight)
+    :param threads: number of threads sharing the directions (NumPy
+        releases the GIL in most of the computation)
+    :returns: array with the weighted visible area of each id of
+        numpy.unique(ids), and this array of ids
+    """
+    unique, labels = numpy.unique(ids, return_inverse=True)
+    triangles = numpy.asarray(triangles, dtype=float)
+
+    def direction(d):
+        azimuth, elevation, weight = d
+        image, pixel_area = zbuffer(triangles, labels, sky_vector(azimuth, elevation), w, h)
+        image = image[image >= 0]
+        return weight * pixel_area * numpy.bincount(image, minlength=len(unique))
+
+    if threads > 1 and len(directions) > 1:
+        pool = ThreadPool(min(threads, len(directions)))
+        try:
+            areas = pool.map(direction, directions)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        areas = [direction(d) for d in directions]
+    return numpy.sum(areas, axis=0) if areas else numpy.zeros(len(unique)), unique
+
+
+def diffuse_interception(scene, directions=None, w=300, h=300, threads=1):
+    """visible area of each shape id of a pgl.Scene, as diffuseInterception
+
+    :param directions: list of (azimuth, elevation, weight), default is
+        :func:`sky_turtle`
+    :returns: dictionary id -> visible area weighted over the directions,
+        for the ids that are seen
+    """
+    if directions is None:
+        directions = sky_turtle()
+    triangles, ids = scene_triangles(scene)
+    if len(triangles) == 0:
+        return {}
+    areas, unique = projected_areas(triangles, ids, directions, w, h, threads)
+    return dict((int(id), area) for id, area in zip(unique, areas) if area > 0)
+
+
+def triangle_areas(triangles):
+    """area of each triangle of an array (number of triangles, 3, 3)"""
+    cross = numpy.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    return 0.5 * numpy.sqrt((cross * cross).sum(axis=1))
+
+
+def raster_star(scene, directions, w=300, h=300, dfact=4):
+    """STAR, iPEA and TLA of a scene, as decomposedSTAR
+
+    iPEA is the projected area of the scene weighted over the directions,
+    TLA the total area of the triangles and STAR = iPEA / TLA. The signature
+    is the one of :func:`~openalea.stocatree.sky.directlight_star` (dfact,
+    the distance of the camera, is not used by an orthographic projection).
+
+    :param scene: a pgl.Scene or the name of a .bgeom file
+    """
+    if isinstance(scene, basestring):
+        import openalea.plantgl.all as pgl
+        scene = pgl.Scene(scene)
+    triangles, ids = scene_triangles(scene)
+    if len(triangles) == 0:
+        return 0., 0., 0.
+    areas, unique = projected_areas(triangles, numpy.zeros(len(triangles), dtype=int), directions, w, h)
+    ipea = areas.sum()
+    tla = triangle_areas(triangles).sum()
+    return ipea / tla, ipea, tla
@@ -0,0 +1,291 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+"""
+.. topic:: runner.py summary
+
+    Run a plan of MAppleT experiments on a pool of processes
+
+    :Code: in progress
+    :Documentation: in progress
+    :Revision: $Id$
+    :Usage: >>> from openalea.stocatree.runner import *
+
+.. testsetup::
+
+    from openalea.stocatree.runner import *
+
+The scripts of share/data (parabatch.py, parasuper.py...) split the plan in
+one group of experiments per processor and synchronise the processes through
+lock and record files. :class:`ExperimentRunner` submits each experiment as a
+separate task to a :class:`multiprocessing.Pool` instead: an idle worker
+takes the next experiment, builds the configuration in memory from the ini
+file and the parameters of the experiment, runs the L-system and sends an
+:class:`ExperimentResult` back to the parent process. A failed experiment is
+reported as such and does not stop the other ones. If a ledger is given, the
+state of each experiment is also recorded in an
+:class:`~openalea.stocatree.ledger.ExperimentLedger`.
+
+:Example:
+
+    >>> plan = read_plan('pleqplan.csv')
+    >>> runner = ExperimentRunner('MAppleT.lpy', 'MAppleT_FSPM.ini', processes=4)
+    >>> for result in runner.run(plan):
+    ...     print result
+"""
+# the stocatree package has its own csv module
+from __future__ import absolute_import
+
+import os
+import csv
+import time
+import ConfigParser
+import traceback
+from multiprocessing import Pool, cpu_count
+
+from openalea.stocatree.ledger import ExperimentLedger
+
+__all__ = ['ExperimentResult', 'ExperimentRunner', 'read_plan', 'run_experiment',
+           'set_parameters', 'experiment_name', 'experiment_seed', 'pleqplan_columns']
+
+#: columns of pleqplan.csv: (column index, option, converter). The apex
+#: diameter is converted into a radius as in parasuper.py
+pleqplan_columns = [
+    (1, 'tree.branching_angle', float),
+    (2, 'internode.max_length', float),
+    (3, 'apex.maximum_size', lambda x: float(x) / 2.),
+    (4, 'leaf.max_area', float),
+    (5, 'stocatree.select_trunk', int),
+]
+
+
+def read_plan(filename, columns=pleqplan_columns, delimiter=','):
+    """read an experimental plan
+
+    :param filename: a csv file with one experiment per row. The first row
+        and the rows whose first cell is empty are headers.
+    :param columns: list of (column index, option, converter) where option is
+        `section.name` in the ini file (default is the layout of pleqplan.csv)
+    :param delimiter: the csv delimiter
+    :returns: a list of (experiment id, dictionary option -> value), the
+        experiment id being the index of the row in the plan starting at 1,
+        since MAppleT.lpy names the outputs after stocatree.select_trunk when
+        output.opti_idx is 0 (see :func:`experiment_name`)
+    """
+    plan = []
+    f = open(filename, 'rb')
+    try:
+        for i, row in enumerate(csv.reader(f, delimiter=delimiter)):
+            if i == 0 or not row or row[0] == '':
+                continue
+            parameters = {}
+            for column, option, converter in columns:
+                parameters[option] = converter(row[column])
+            plan.append((len(plan) + 1, parameters))
+    finally:
+        f.close()
+    return plan
+
+
+class ExperimentResult(object):
+    """outcome of one experiment, sent back by the workers
+
+    :attributes:
+        * :attr:`experiment` the experiment id
+        * :attr:`parameters` the options overridden for this experiment
+        * :attr:`success` False if the experiment raised an exception
+        * :attr:`duration` running time in seconds
+        * :attr:`error` the traceback of the exception if any
+        * :attr:`pid` the process that ran the experiment
+    """
+    def __init__(self, experiment, parameters, success=True, duration=0., error=None):
+        self.experiment = experiment
+        self.parameters = parameters
+        self.success = success
+        self.duration = duration
+        self.error = error
+        self.pid = os.getpid()
+
+    def __str__(self):
+        status = 'ok' if self.success else 'failed'
+        return 'experiment {0} {1} in {2:.1f}s'.format(self.experiment, status, self.duration)
+
+
+def set_parameters(options, experiment, parameters):
+    """override the options of the configuration with those of an experiment
+
+    :param options: the configuration, e.g. a ConfigParams
+    :param experiment: the experiment id, used as `output.opti_idx`
+    :param parameters: dictionary `section.name` -> value
+    """
+    for option, value in parameters.iteritems():
+        section, name = option.split('.')
+        setattr(getattr(options, section), name, value)
+    options.output.opti_idx = experiment
+
+
+def experiment_name(options):
+    """the name of the outputs of a simulation (current_experiment in MAppleT.lpy)
+
+    * if output.opti_idx is 0, the number of the trunk sequence
+      stocatree.select_trunk
+    * if output.opti_idx is -1, the trunk sequence and the main parameters
+    * otherwise, output.opti_idx itself
+    """
+    if options.output.opti_idx == 0:
+        return str(options.stocatree.select_trunk)
+    elif options.output.opti_idx == -1:
+        return '{4}_i{0}l{1}a{2}r{3}'.format(options.internode.max_length, options.leaf.max_area,
+                                              options.tree.branching_angle, options.apex.maximum_size,
+                                              options.stocatree.select_trunk)
+    else:
+        return str(options.output.opti_idx)
+
+
+def experiment_seed(ini_file, parameters):
+    """the seed of an experiment: general.seed of its parameters if the plan
+    sets it, of the ini file otherwise (None if neither does)"""
+    seed = parameters.get('general.seed')
+    if seed is None:
+        config = ConfigParser.RawConfigParser()
+        config.read(ini_file)
+        if config.has_option('general', 'seed'):
+            seed = config.get('general', 'seed')
+    if seed is None:
+        return None
+    return int(seed)
+
+
+def run_experiment(lsystem_file, ini_file, experiment, parameters):
+    """run a single experiment (in the current process)
+
+    The configuration is read from the ini file, the parameters of the
+    experiment override its options and the result is given to the L-system
+    as its `options` global variable, so that nothing is written on disk.
+    The experiment id is used as `output.opti_idx`, which names the outputs
+    (see :func:`experiment_name`).
+
+    :param lsystem_file: the L-system, e.g. MAppleT.lpy
+    :param ini_file: the configuration file, e.g. MAppleT.ini
+    :param experiment: the experiment id
+    :param parameters: dictionary `section.name` -> value
+    """
+    import openalea.lpy as lpy
+    from openalea.plantik.tools.config import ConfigParams
+
+    options = ConfigParams(ini_file)
+    set_parameters(options, experiment, parameters)
+    lsystem = lpy.Lsystem(lsystem_file, {'options': options})
+    lsystem.iterate()
+
+
+def _worker(arguments):
+    """run a task of the pool and never raise"""
+    function, directory, ledger, lsystem_file, ini_file, experiment, parameters = arguments
+    if directory is not None:
+        os.chdir(directory)
+    if ledger is not None:
+        ledger = ExperimentLedger(ledger)
+        ledger.start(experiment, seed=experiment_seed(ini_file, parameters))
+    start = time.time()
+    try:
+        function(lsystem_file, ini_file, experiment, parameters)
+    except Exception:
+        result = ExperimentResult(experiment, parameters, success=False,
+                                  duration=time.time() - start,
+                                  error=traceback.format_exc())
+    else:
+        result = ExperimentResult(experiment, parameters, duration=time.time() - start)
+    if ledger is not None:
+        if result.success:
+            ledger.done(experiment, duration=result.duration)
+        else:
+            ledger.fail(experiment, duration=result.duration, message=result.error)
+        ledger.close()
+    return result
+
+
+class ExperimentRunner(object):
+    """run the experiments of a plan in parallel
+
+    :param lsystem_file: the L-system (default MAppleT.lpy)
+    :param ini_file: the configuration file (default MAppleT.ini)
+    :param processes: number of worker processes (default is the number of
+        cpus). With 0, the experiments are run one after the other in the
+        current process, which is convenient to debug.
+    :param directory: working directory of the workers (default is the
+        directory of the L-system file), where the outputs are written
+    :param maxtasksperchild: number of experiments run by a worker before it
+        is replaced by a fresh process (default is 1, to release the memory of
+        the L-system)
+    :param function: the function run for each experiment, with the
+        signature of :func:`run_experiment`
+    :param ledger: filename of an :class:`~openalea.stocatree.ledger.ExperimentLedger`
+        where the experiments are recorded as queued, running, done or failed
+    :param hsm_files: hidden semi markov files (relative to directory) read by
+        the parent before the workers are forked, so that all the workers
+        share the same models (see :func:`~openalea.stocatree.sequences.load_hsm`)
+    """
+    def __init__(self, lsystem_file='MAppleT.lpy', ini_file='MAppleT.ini',
+                 processes=None, directory=None, maxtasksperchild=1,
+                 function=run_experiment, ledger=None, hsm_files=()):
+        self.lsystem_file = lsystem_file
+        self.ini_file = ini_file
+        if processes is None:
+            processes = cpu_count()
+        self.processes = processes
+        if directory is None:
+            directory = os.path.dirname(os.path.abspath(lsystem_file))
+        self.directory = directory
+        self.maxtasksperchild = maxtasksperchild
+        self.function = function
+        if ledger is not None:
+            ledger = os.path.abspath(ledger)
+        self.ledger = ledger
+        self.hsm_files = list(hsm_files)
+
+    def tasks(self, plan, skip=()):
+        """the arguments of :func:`_worker` for each experiment of the plan"""
+        for experiment, parameters in plan:
+            if experiment in skip:
+                continue
+            yield (self.function, self.directory, self.ledger, self.lsystem_file,
+                   self.ini_file, experiment, parameters)
+
+    def run(self, plan, skip=()):
+        """run the experiments and yield their results as soon as they finish
+
+        :param plan: list of (experiment id, parameters), see :func:`read_plan`
+        :param skip: ids of the experiments that must not be run, e.g. the
+            successful experiments of a previous run
+        :returns: an iterator over the :class:`ExperimentResult`, in the order
+            of completion
+        """
+        tasks = list(self.tasks(plan, skip))
+        if self.ledger is not None:
+            ledger = ExperimentLedger(self.ledger)
+            ledger.queue([task[5] for task in tasks])
+            ledger.close()
+        if self.hsm_files:
+            from openalea.stocatree.sequences import load_hsm
+            for filename in self.hsm_files:
+                load_hsm(os.path.join(self.directory, filename))
+
+        if self.processes == 0:
+            cwd = os.getcwd()
+            try:
+                for task in tasks:
+                    yield _worker(task)
+            finally:
+                os.chdir(cwd)
+            return
+
+        pool = Pool(processes=self.processes, maxtasksperchild=self.maxtasksperchild)
+        try:
+            for result in pool.imap_unordered(_worker, tasks):
+                yield result
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
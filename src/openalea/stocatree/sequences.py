@@ -23,7 +23,8 @@ from openalea.sequence_analysis._sequence_analysis import _SemiMarkovIterator, _
 from openalea.sequence_analysis._sequence_analysis import srand
 #srand(123)
 
-import random
+import os
+from bisect import bisect_left
 import srandom
 import numpy as np
 #import cPickle
@@ -34,19 +35,44 @@ import numpy as np
 
 __all__ = [
     'DataTerminalFate',
+    'CategoricalDistribution',
     'terminal_fate',
+    'terminal_fates',
     'Markov',
+    'load_hsm',
     'generate_trunk',
+    'TrunkSequences',
+    'read_trunk_sequences',
     '_non_parametric_distribution',
     '_generate_random_draw_sequence',
     'generate_floral_sequence',
     'generate_short_sequence',
     'generate_hsm_sequence',
     'generate_bounded_hsm_sequence',
+    'HsmSequenceCache',
     'generate_sequence',
     'length_pool'
 ]
 
+#: hidden semi markov models already read: absolute filename -> (modification time, model)
+_hsm_models = {}
+
+def load_hsm(filename):
+    """the HiddenSemiMarkov model of a file, read only once per process
+    (until the file is modified)
+
+    The models read before a :class:`multiprocessing.Pool` is created are
+    shared by its forked workers.
+    """
+    key = os.path.abspath(filename)
+    mtime = os.path.getmtime(key)
+    cached = _hsm_models.get(key)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, HiddenSemiMarkov(filename))
+        _hsm_models[key] = cached
+    return cached[1]
+
+
 class Markov():
     """class to manage all the markov and hidden semi markov sequences
 
@@ -61,13 +87,24 @@ class Markov():
 
     see generate_sequence for an explantion of the arguments
 
+    The models may also be registered with their filename, in which case they
+    are only read (with :func:`load_hsm`) when the attribute is first used:
+
+    .. code-block:: python
+
+        >>> markov.register('hsm_medium1', 'fmodel_fuji_5_15_y3_96.txt')
+        >>> markov.hsm_medium = markov.hsm_medium1
+
     """
-    def __init__(self, maximum_length=70, minimum_length=4):
+    def __init__(self, maximum_length=70, minimum_length=4, cache_size=0):
         """**constructor**
 
         :param max_sequence_length: the maximum length of markov sequence (default is 100)
         :param max_length: the maximum length (default is 70)
         :param min_length: the minimum length (default is 4)
+        :param cache_size: number of pre-drawn sequences kept per (hsm, bounds)
+            pool. See :class:`HsmSequenceCache`. If 0 (default), no cache is
+            used and each bounded sequence is drawn on demand.
 
         :attributes:
             * hsm_medium
@@ -99,6 +136,92 @@ class Markov():
         self.hsm_long2            =  None
         self.hsm_long3            =  None
         self.hsm_long4            =  None
+        if cache_size > 0:
+            self.cache            =  HsmSequenceCache(cache_size, self.max_sequence_length)
+        else:
+            self.cache            =  None
+        self._filenames           =  {}
+
+    def register(self, name, filename):
+        """set the file of the model of attribute name, read on first access
+
+        :param name: the name of the attribute, e.g. hsm_medium1
+        :param filename: a file readable by HiddenSemiMarkov
+        """
+        self._filenames[name] = filename
+        self.__dict__.pop(name, None)
+
+    def __getattr__(self, name):
+        filenames = self.__dict__.get('_filenames', {})
+        if name not in filenames:
+            raise AttributeError(name)
+        model = load_hsm(filenames[name])
+        setattr(self, name, model)
+        return model
+
+
+class CategoricalDistribution(object):
+    """a distribution over the indices 1 to n of a list of probabilities
+
+    The cumulative probabilities are computed once; an index is drawn by a
+    bisection of a uniform value of :func:`~openalea.stocatree.srandom.draw`,
+    which gives the same index as :func:`_non_parametric_distribution` for
+    the same random value.
+
+    :param pdf: the probabilities, whose sum must be 1 (up to tolerance)
+    :param tolerance: the tolerance on the sum of the probabilities
+
+    :Example:
+
+        >>> distribution = CategoricalDistribution([0.25, 0.25, 0.5])
+        >>> index = distribution.draw()
+        >>> indices = distribution.draw_many(100)
+    """
+    def __init__(self, pdf, tolerance=1e-9):
+        if abs(sum(pdf) - 1.) > tolerance:
+            raise ValueError('the probabilities %s do not sum up to 1' % (pdf,))
+        self.pdf = list(pdf)
+        self.cumulative = []
+        cumulation = 0
+        for probability in self.pdf:
+            cumulation += probability
+            self.cumulative.append(cumulation)
+        self._cumulative = np.array(self.cumulative, dtype=float)
+
+    def __len__(self):
+        return len(self.pdf)
+
+    def index(self, target):
+        """the index at which the cumulative probability reaches target"""
+        if target <= 0:
+            return 0
+        return min(bisect_left(self.cumulative, target) + 1, len(self.pdf))
+
+    def draw(self, purpose=None, key=0):
+        """a random index in [1, n]
+
+        :param purpose: the purpose of the draw, see :func:`~openalea.stocatree.srandom.draw`
+        :param key: the key of the stream of the purpose
+        """
+        return self.index(srandom.draw(purpose, key))
+
+    def draw_many(self, size, purpose=None, keys=None):
+        """an array of size random indices
+
+        The random values are drawn in the same order as size calls to
+        :meth:`draw`, so the indices are the same.
+
+        :param keys: the key of each draw if random streams are used (see
+            :class:`~openalea.stocatree.srandom.RandomStreams`)
+        """
+        streams = srandom.get_random_streams()
+        if streams is not None and purpose is not None:
+            targets = streams.uniform(purpose, size, keys)
+        else:
+            targets = np.array([srandom.draw() for i in xrange(size)], dtype=float)
+        indices = np.minimum(np.searchsorted(self._cumulative, targets, side='left') + 1, len(self.pdf))
+        indices[targets <= 0] = 0
+        return indices
 
 
 class DataTerminalFate(object):
@@ -177,6 +300,7 @@ class DataTerminalFate(object):
 
         """
         self.codes = {'large':0, 'medium':1, 'small':2, 'floral':3}
+        self._distributions = {}
 
     def get_data_terminal_fate(self, year, code):
         """Returns the probabilities corresponding to a shoot code and a year
@@ -204,6 +328,16 @@ class DataTerminalFate(object):
             raise ValueError('code must be in %s. %s provided' %
                 (self.codes.keys(), code))
 
+    def get_distribution(self, year, code):
+        """the :class:`CategoricalDistribution` of the probabilities returned
+        by :meth:`get_data_terminal_fate`, built once per year and code"""
+        try:
+            return self._distributions[(year, code)]
+        except KeyError:
+            distribution = CategoricalDistribution(self.get_data_terminal_fate(year, code))
+            self._distributions[(year, code)] = distribution
+            return distribution
+
     def _check_probabilities(self):
         """Check that all arrays sum up to a probability of 1
 
@@ -215,9 +349,9 @@ class DataTerminalFate(object):
             >>> d._check_probabilities()
         """
         for data in self.data.values():
-            assert sum(data)==1
+            assert abs(sum(data) - 1) < 1e-9
 
-def terminal_fate(year, observation):
+def terminal_fate(year, observation, key=0, purpose='fate'):
     """This function returns a type of metamer (large, short, ...)
 
 
@@ -226,17 +360,35 @@ def terminal_fate(year, observation):
     :param year: is an int
     :param observation: is a string. ['large', 'medium','small', 'floral'].
         See :class:`DataTerminalFate` class documentation for details.
+    :param key: the key of the random stream (see :mod:`~openalea.stocatree.srandom`)
+    :param purpose: the purpose of the random stream
 
     :Example:
 
         >>> index=terminal_fate(1994, 'large')
 
     """
-    d = DataTerminalFate()
-    data = d.get_data_terminal_fate(year, observation)
-    index = _non_parametric_distribution(data)
-    codes = {1:'large', 2:'medium', 3:'small', 4:'floral'}
-    return codes[index]
+    index = _data_terminal_fate.get_distribution(year, observation).draw(purpose, key)
+    return _fates[index]
+
+
+def terminal_fates(year, observation, size, keys=None, purpose='fate'):
+    """The types of size metamers, see :func:`terminal_fate`
+
+    The random values are drawn as by size calls to :func:`terminal_fate`.
+    If random streams are used, keys are the keys of the metamers.
+
+    :Example:
+
+        >>> fates = terminal_fates(1, 'large', 100)
+
+    """
+    indices = _data_terminal_fate.get_distribution(year, observation).draw_many(size, purpose, keys)
+    return [_fates[index] for index in indices.tolist()]
+
+
+_data_terminal_fate = DataTerminalFate()
+_fates = {1:'large', 2:'medium', 3:'small', 4:'floral'}
 
 
 def _non_parametric_distribution(pdf):
@@ -248,18 +400,11 @@ def _non_parametric_distribution(pdf):
 
         >>> res = _non_parametric_distribution([0.25,0.25,0.25,0.25])
 
-    .. note:: The sum of PDF must be 1 (checked by this function)
+    .. note:: The sum of PDF must be 1 (checked by this function). Use a
+        :class:`CategoricalDistribution` to draw several times from the same PDF.
 
     """
-    assert sum(pdf)==1
-    target = srandom.random(1.0)
-    cumulation = 0
-    i = 0
-    length = len(pdf)
-    while i < length and cumulation < target:
-        cumulation += pdf[i]
-        i += 1
-    return i
+    return CategoricalDistribution(pdf).draw()
 
 def generate_hsm_sequence(hsm, sequence_length=100):
     """Generate a Hidden Semi Markov Sequence given an input transition matrix
@@ -286,7 +431,14 @@ def generate_hsm_sequence(hsm, sequence_length=100):
     #processes = hsm.nb_output_process() + 1
     #used to free memory in the c++ code
 
-    i = 0
+    return _simulation_to_sequence(simulation, sequence_length)
+
+def _simulation_to_sequence(simulation, sequence_length=100):
+    """Convert the output of a _SemiMarkovIterator simulation into a sequence
+
+    The simulation is truncated at the first state 6 (end of the shoot) and
+    reversed so that it can be consumed from the end by the apex.
+    """
     sequence = []
     for i in range(0, sequence_length):
         if simulation[0][i] == 6 :
@@ -296,7 +448,7 @@ def generate_hsm_sequence(hsm, sequence_length=100):
     sequence.reverse()
     return sequence
 
-def generate_bounded_hsm_sequence(hsm, lower_bound, upper_bound):
+def generate_bounded_hsm_sequence(hsm, lower_bound, upper_bound, cache=None):
     """Returns a bouded sequence
 
     One problem with the Markov chains is that they may produce sequences
@@ -314,12 +466,18 @@ def generate_bounded_hsm_sequence(hsm, lower_bound, upper_bound):
     :param hsm: a HiddenSemiMarkov instance
     :param lower_bound: int
     :param upper_bound: int
+    :param cache: an optional :class:`HsmSequenceCache`. If provided, the
+        sequence is taken from the pre-drawn pool of (hsm, lower_bound,
+        upper_bound) instead of being drawn on demand.
 
     ::
 
         generate_bounded_hsm_sequence(markov.hsm_long,  15, 26);
 
     """
+    if cache is not None:
+        return cache.get(hsm, lower_bound, upper_bound)
+
     length = upper_bound + 1; # defines a max length for the sequence
     count = 0
     while length > upper_bound or length < lower_bound and count<1000:
@@ -333,6 +491,130 @@ def generate_bounded_hsm_sequence(hsm, lower_bound, upper_bound):
     #print 'Counts hsm = ', count
     return sequence
 
+class HsmSequenceCache(object):
+    """Pools of pre-drawn, length-bucketed hidden semi markov sequences
+
+    :func:`generate_bounded_hsm_sequence` throws away every sequence whose
+    length does not fall within the requested bounds, which is expensive for
+    the long shoot buckets (41 to 70 metamers). This class keeps one pool per
+    (hsm, lower_bound, upper_bound) triplet. When a pool is empty, it is
+    refilled in bulk and every draw that falls outside its bounds is given to
+    the other pools of the same model that accept that length instead of being
+    thrown away. Each pool therefore still receives the sequences of the hsm
+    conditioned on its own bounds.
+
+    Pools are refilled synchronously, within the call that finds them empty,
+    so that the sequence of draws (and therefore the tree) only depends on the
+    seed of the simulation.
+
+    :Example:
+
+        >>> cache = HsmSequenceCache(size=20)
+        >>> seq = cache.get(markov.hsm_long, 41, 70)
+        >>> cache.hits, cache.misses, cache.rejects
+
+    :attributes:
+        * hits: number of sequences served directly from a pool
+        * misses: number of requests that found an empty pool
+        * rejects: number of draws that did not fit in the pool being refilled
+    """
+    def __init__(self, size=20, sequence_length=100, max_count=1000):
+        """**constructor**
+
+        :param size: the maximum number of sequences kept in each pool
+        :param sequence_length: length of the simulated markov sequences (default is 100)
+        :param max_count: maximum number of draws allowed to obtain a single
+            sequence within bounds (default is 1000)
+        """
+        assert size > 0
+        self.size = size
+        self.sequence_length = sequence_length
+        self.max_count = max_count
+        self.hits = 0
+        self.misses = 0
+        self.rejects = 0
+        self._pools = {}
+        self._models = {}
+        self._iterators = {}
+
+    def __str__(self):
+        res = 'HsmSequenceCache: %s pools\n' % len(self._pools)
+        res += 'hits %s\n' % self.hits
+        res += 'misses %s\n' % self.misses
+        res += 'rejects %s\n' % self.rejects
+        return res
+
+    def counters(self):
+        """Returns the hit, miss and reject counters as a dictionary"""
+        return {'hits':self.hits, 'misses':self.misses, 'rejects':self.rejects}
+
+    def reset(self):
+        """Empty all the pools and reset the counters"""
+        self.hits = 0
+        self.misses = 0
+        self.rejects = 0
+        self._pools = {}
+        self._models = {}
+        self._iterators = {}
+
+    def get(self, hsm, lower_bound, upper_bound):
+        """Returns a sequence of hsm whose length is in [lower_bound, upper_bound]
+
+        :param hsm: a HiddenSemiMarkov instance
+        :param lower_bound: int
+        :param upper_bound: int
+        """
+        key = (id(hsm), lower_bound, upper_bound)
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = []
+            self._pools[key] = pool
+            self._models[id(hsm)] = hsm
+        if len(pool) == 0:
+            self.misses += 1
+            self._refill(hsm, key)
+        else:
+            self.hits += 1
+        return pool.pop(0)
+
+    def _draw(self, hsm):
+        """Draw a single sequence, reusing the iterator of the model"""
+        iterator = self._iterators.get(id(hsm))
+        if iterator is None:
+            if type(hsm)!=HiddenSemiMarkov and type(hsm)!=_HiddenSemiMarkov:
+                raise TypeError("expected hsm datatype. Got %s" % type(hsm))
+            iterator = _SemiMarkovIterator(hsm)
+            self._iterators[id(hsm)] = iterator
+        simulation = iterator.simulation(self.sequence_length, True)
+        return _simulation_to_sequence(simulation, self.sequence_length)
+
+    def _refill(self, hsm, key):
+        """Draw sequences of hsm until the pool of key is full
+
+        Draws that do not fit in the pool of key are stored in the other pools
+        of the same model whose bounds accept them, if not already full.
+        """
+        model, lower_bound, upper_bound = key
+        pool = self._pools[key]
+        siblings = [(k, p) for k, p in self._pools.iteritems()
+                    if k[0] == model and k != key]
+        count = 0
+        while len(pool) < self.size:
+            sequence = self._draw(hsm)
+            length = len(sequence)
+            for (k, p) in siblings:
+                if k[1] <= length <= k[2] and len(p) < self.size:
+                    p.append([list(x) for x in sequence])
+            if lower_bound <= length <= upper_bound:
+                pool.append(sequence)
+                count = 0
+            else:
+                self.rejects += 1
+                count += 1
+                if count == self.max_count:
+                    raise ValueError('to be done. max count limit reached in HsmSequenceCache')
+
+
 def generate_short_sequence():
     """Generate a short sequence
 
@@ -377,11 +659,53 @@ def generate_floral_sequence():
     return seq
 
 
+class TrunkSequences(object):
+    """the trunk sequences of a file, one sequence per row
+
+    The rows have the same number of observations; a sequence stops at its
+    first 9, the remaining observations being padding.
+
+    :param table: array with one row per sequence
+    """
+    def __init__(self, table):
+        self.table = np.array(table, dtype=float, ndmin=2)
+        end = self.table == 9
+        #: number of observations of each sequence
+        self.lengths = np.where(end.any(axis=1), end.argmax(axis=1), self.table.shape[1])
+
+    def __len__(self):
+        return len(self.table)
+
+    def sequence(self, select):
+        """the trunk sequence of row select, see :func:`generate_trunk`"""
+        assert 0 <= select < len(self.table)
+        # the rows are reversed, as the former generate_trunk did
+        observations = self.table[select, :self.lengths[select]]
+        return [[None, obs] for obs in observations[::-1]]
+
+
+#: trunk sequence files already read: absolute filename -> (modification time, TrunkSequences)
+_trunk_sequences = {}
+
+def read_trunk_sequences(filename):
+    """the :class:`TrunkSequences` of a file, read only once (until the file
+    is modified)"""
+    key = os.path.abspath(filename)
+    mtime = os.path.getmtime(key)
+    cached = _trunk_sequences.get(key)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, TrunkSequences(np.loadtxt(filename, ndmin=2)))
+        _trunk_sequences[key] = cached
+    return cached[1]
+
+
 def generate_trunk(trunk_seq='sequences.seq', select=0):
     """Generate a trunk sequence randomly selected within a list of hard-coded trunk sequences
 
     Used by :meth:`~openalea.stocatree.sequences.generate_sequence` only
 
+    The file is only read once, see :func:`read_trunk_sequences`.
+
     :param list select: the index of the selected trunk in the list of trunk sequence (default is 0).
 
     :Example:
@@ -389,28 +713,17 @@ def generate_trunk(trunk_seq='sequences.seq', select=0):
         >>> deterministic_sequence = generate_trunk(select=1)
 
     """
-    s = np.loadtxt(trunk_seq)
-    print('There are {0} sequences in the files'.format(len(s)))
-    assert 0 <= select < len(s)
-    seq = list(s[select])
-    sequence =[]
-    for obs in seq:
-      if obs == 9:
-        break
-      sequence.append([None, obs])
-
-    #TODO comment this to get same results as in MAppleT. ???
-    sequence.reverse()
-    return sequence
+    return read_trunk_sequences(trunk_seq).sequence(select)
 
 
 
-def _generate_random_draw_sequence():
+def _generate_random_draw_sequence(key=0):
     """an alternative to the long shoot  model of the 2nd year.
 
 
     Usually not used.
 
+    :param key: the key of the random stream of the shoot (see :mod:`~openalea.stocatree.srandom`)
 
     """
     max_length = 65
@@ -433,7 +746,11 @@ def _generate_random_draw_sequence():
             [0, 0, 0, 0, 0, 3, 0, 3, 3, 0,  3, 0, 0, 0, 0, 0, 0, 0, 3, 0,  1, 0, 0, 4, 0, 4, 0, 0, 0, 0,  0, 0, 0, 0, 0, 0, 0, 0, 0, 0,  0, 4, 0, 0, 1, 0, 0, 1, 1, 1,  1, 9, 9, 9, 9, 9, 9, 9, 9, 9,  9, 9, 9, 9, 9]
         ]
 
-    select_branch = srandom.random(number)
+    streams = srandom.get_random_streams()
+    if streams is not None:
+        select_branch = int(streams.random('second_year', key) * number)
+    else:
+        select_branch = srandom.random(number)
     i = 0
     sequence = []
     for i in range(0, max_length):
@@ -453,7 +770,7 @@ def _generate_random_draw_sequence():
 #// Generation of sequences from Markov chains, based directly on the work
 #// of Michael Renton
 def generate_sequence(obs, markov=None, year=0, second_year_draws=False,
-                      trunk_seq='sequences.seq', select_trunk=0):
+                      trunk_seq='sequences.seq', select_trunk=0, key=0):
     """Generation of sequences from Markov chains, based directly on the work
     of Michael Renton
 
@@ -473,13 +790,14 @@ def generate_sequence(obs, markov=None, year=0, second_year_draws=False,
         function instead of generate_bounded_hsm_sequence. (default is False).
         Can only be set to True if year=1
     :param int select_trunk: selection of trunk sequences within the list. See :func:`generate_trunk`
+    :param key: the key of the random streams of the shoot (see :mod:`~openalea.stocatree.srandom`)
 
 
     :returns: a random sequence
     """
     #This fix the c++ seed at each call with a random number from the uniform law in python were the seed was also fixed
     #Therefore the successive seeds used in c++ are fixed for a given python seed allowing to reproduce trees
-    srand(int(random.uniform(0,1e6)))
+    srand(int(srandom.draw('hsm', key) * 1e6))
     
     #The "sylleptic"s to the conditions as following were added by Han on 30-04-2012
     if obs == 'trunk':
@@ -489,23 +807,33 @@ def generate_sequence(obs, markov=None, year=0, second_year_draws=False,
     elif obs == 'floral':
         return generate_floral_sequence()
     elif obs == 'medium' or obs == 'sylleptic_medium':
-        return generate_bounded_hsm_sequence(markov.hsm_medium,  5, 15);
+        return generate_bounded_hsm_sequence(markov.hsm_medium, 5, 15, cache=markov.cache)
     elif obs == 'large' or obs == 'sylleptic_large':
         if (second_year_draws and year== 1):
-            return _generate_random_draw_sequence()
+            return _generate_random_draw_sequence(key)
         else:
-            res = length_pool(year)
+            res = length_pool(year, key)
             assert res in [1, 2, 3], 'Error Bad Length pool category'
             if res == 1:
-                return generate_bounded_hsm_sequence(markov.hsm_long, 15, 26)
+                return generate_bounded_hsm_sequence(markov.hsm_long, 15, 26, cache=markov.cache)
             elif res == 2:
-                return generate_bounded_hsm_sequence(markov.hsm_long, 26, 41)
+                return generate_bounded_hsm_sequence(markov.hsm_long, 26, 41, cache=markov.cache)
             elif res == 3:
-                return generate_bounded_hsm_sequence(markov.hsm_long, 41, markov.maximum_length)
+                return generate_bounded_hsm_sequence(markov.hsm_long, 41, markov.maximum_length, cache=markov.cache)
     else:
         raise("ERROR: A bad sequence observation (%s) was passed to generate_sequence().\n" % obs)
 
-def generate_pruned_sequence(obs, react_pos, rank, closest_apex, farthest_apex, sons_nb, markov=None, year=0 ):
+def generate_pruned_sequence(obs, react_pos, rank, closest_apex, farthest_apex, sons_nb, markov=None, year=0, key=0):
+    """Generation of the sequence of an apex that reacts to pruning
+
+    key is the key of the random streams of the apex (see
+    :mod:`~openalea.stocatree.srandom`). If random streams are used, the c++
+    seed is set from the stream as in :func:`generate_sequence`; otherwise the
+    sequence keeps on the global generators, as before.
+    """
+    if srandom.get_random_streams() is not None:
+        srand(int(srandom.draw('hsm', key) * 1e6))
+
     #The pruned length is assimilated to the distance to the farthest apex
 
     #obs is the shoot type of the prunned shoot
@@ -525,13 +853,13 @@ def generate_pruned_sequence(obs, react_pos, rank, closest_apex, farthest_apex,
       pruned_ratio = 1.0*farthest_apex / (rank + farthest_apex)
       if pruned_ratio < 0.25:
         #case A
-        newobs = shoot_type_react(year,obs,'A', react_pos) 
+        newobs = shoot_type_react(year,obs,'A', react_pos, key)
       elif pruned_ratio < 0.75:
         #case B
-        newobs = shoot_type_react(year,obs,'B', react_pos) 
+        newobs = shoot_type_react(year,obs,'B', react_pos, key)
       else:
         #Case C
-        newobs = shoot_type_react(year,obs,'C', react_pos) 
+        newobs = shoot_type_react(year,obs,'C', react_pos, key)
 
     #Case of pruning a shoot with branching
     #Then depending on the pruned length and biomass represented by the sons_nb,
@@ -540,31 +868,31 @@ def generate_pruned_sequence(obs, react_pos, rank, closest_apex, farthest_apex,
       bio_ratio = 1.0*sons_nb / farthest_apex
       if bio_ratio < 2:
         #case A
-        newobs = shoot_type_react(year,obs,'A', react_pos) 
+        newobs = shoot_type_react(year,obs,'A', react_pos, key)
       if bio_ratio < 3:
         #case B
-        newobs = shoot_type_react(year,obs,'B', react_pos) 
+        newobs = shoot_type_react(year,obs,'B', react_pos, key)
       else:
         #case C
-        newobs = shoot_type_react(year,obs,'C', react_pos) 
+        newobs = shoot_type_react(year,obs,'C', react_pos, key)
 
     hsm_react_long, hsm_react_medium = pruned_hsmc(year, markov)
 
     if newobs == 'trunk' or newobs == 'large' or newobs == 'sylleptic_large':
       if farthest_apex > 30: 
-        return generate_bounded_hsm_sequence(hsm_react_long, 41, markov.maximum_length)
+        return generate_bounded_hsm_sequence(hsm_react_long, 41, markov.maximum_length, cache=markov.cache)
       elif farthest_apex > 20:
-        return generate_bounded_hsm_sequence(hsm_react_long, 26, 41)
+        return generate_bounded_hsm_sequence(hsm_react_long, 26, 41, cache=markov.cache)
       elif farthest_apex > 8:
-        return generate_bounded_hsm_sequence(hsm_react_long, 15, 26)
+        return generate_bounded_hsm_sequence(hsm_react_long, 15, 26, cache=markov.cache)
       else:
-        return generate_bounded_hsm_sequence(hsm_react_medium,  5, 15);
+        return generate_bounded_hsm_sequence(hsm_react_medium, 5, 15, cache=markov.cache)
 
     elif newobs == 'medium'or newobs == 'sylleptic_medium':
       if farthest_apex > 5:
-        return generate_bounded_hsm_sequence(hsm_react_long,  15, 26);
+        return generate_bounded_hsm_sequence(hsm_react_long, 15, 26, cache=markov.cache)
       else:
-        return generate_bounded_hsm_sequence(hsm_react_medium,  5, 15);
+        return generate_bounded_hsm_sequence(hsm_react_medium, 5, 15, cache=markov.cache)
 
     elif newobs == 'small' or newobs == 'sylleptic_short':
       return generate_short_sequence()
@@ -572,17 +900,18 @@ def generate_pruned_sequence(obs, react_pos, rank, closest_apex, farthest_apex,
     elif newobs == 'floral':
       return generate_floral_sequence()
 
-def shoot_type_react(year, pruned_shoot_type, pruning_case, react_pos):
+def shoot_type_react(year, pruned_shoot_type, pruning_case, react_pos, key=0):
+  #key is the key of the random stream of the reacting apex
 
   if pruned_shoot_type == 'trunk':
     pruned_shoot_type = 'large'
     reiteration = 'large'
     succession = 'large'
-    lower_cat = terminal_fate(year, pruned_shoot_type)
+    lower_cat = terminal_fate(year, pruned_shoot_type, key, 'pruned_fate')
   else:
     reiteration = pruned_shoot_type
-    succession = terminal_fate(year, pruned_shoot_type)
-    lower_cat = terminal_fate(year,terminal_fate(year, pruned_shoot_type))
+    succession = terminal_fate(year, pruned_shoot_type, key, 'pruned_fate')
+    lower_cat = terminal_fate(year,terminal_fate(year, pruned_shoot_type, key, 'pruned_fate'), key, 'pruned_fate')
 
   if react_pos == 0:
     if pruning_case == 'A':
@@ -687,26 +1016,21 @@ def pruned_hsmc(year, markov):
 
     #if the trunk was cut far enough from the top, generate the longest possible shoot, otherwise, depending on the pruned length, i.e. farthest apex
 
-def length_pool(year):
+def length_pool(year, key=0):
     """Returns a random number according to `year`
 
-    year should come from simulation.year
+    year should come from simulation.year; key is the key of the random stream
+    (see :mod:`~openalea.stocatree.srandom`)
     """
-    pool_1995 = [0.111, 0.222, 0.667]
-    pool_1996 = [0.538, 0.346, 0.116]
-    pool_1997 = [0.830, 0.170, 0.000]
-    pool_1998 = [0.940, 0.060, 0.000]
-    pool_1999 = [0.965, 0.035, 0.000]
-
-    if year == 0 or year == 1:
-        return _non_parametric_distribution(pool_1995)
-    elif year == 2:
-        return _non_parametric_distribution(pool_1996)
-    elif year == 3:
-        return _non_parametric_distribution(pool_1997)
-    elif year == 4:
-        return _non_parametric_distribution(pool_1998)
-    else:
-        return _non_parametric_distribution(pool_1999)
+    return _length_pools.get(year, _length_pools[5]).draw('length', key)
+
+
+_length_pools = {
+    0: CategoricalDistribution([0.111, 0.222, 0.667]),
+    1: CategoricalDistribution([0.111, 0.222, 0.667]),
+    2: CategoricalDistribution([0.538, 0.346, 0.116]),
+    3: CategoricalDistribution([0.830, 0.170, 0.000]),
+    4: CategoricalDistribution([0.940, 0.060, 0.000]),
+    5: CategoricalDistribution([0.965, 0.035, 0.000])}
 
 
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+"""
+.. topic:: sky.py summary
+
+    Light interception over the sky directions on a pool of processes
+
+    :Code: in progress
+    :Documentation: in progress
+    :Revision: $Id$
+    :Usage: >>> from openalea.stocatree.sky import *
+
+.. testsetup::
+
+    from openalea.stocatree.sky import *
+
+The STAR of a tree is a weighted sum over the 46 directions of the sky
+turtle, each direction being rendered independently. :func:`decomposed_star`
+and :func:`multiscale_star` split the directions into one contiguous group
+per process; each worker loads the scene from a .bgeom file (PlantGL scenes
+cannot be pickled), renders its directions and sends back one value per
+direction. The weighted sums are then computed with NumPy in the parent.
+
+Each worker renders with its own PlantGL viewer. The pool is created with
+fork, so it must not be used from a daemonic process (e.g. a worker of
+:class:`~openalea.stocatree.runner.ExperimentRunner`): use processes=0 there,
+which runs everything in the current process as before.
+
+:Example:
+
+    >>> STAR, iPEA, TLA = decomposed_star(leaves, directions, w=300, h=300, dfact=4, processes=4)
+"""
+
+import os
+import shutil
+import tempfile
+from multiprocessing import Pool, cpu_count
+
+import numpy
+
+__all__ = ['decomposed_star', 'directlight_star', 'multiscale_star', 'split_directions']
+
+
+def split_directions(directions, parts):
+    """split a list of directions into at most parts contiguous groups of
+    nearly equal lengths"""
+    directions = list(directions)
+    parts = max(1, min(parts, len(directions)))
+    size, extra = divmod(len(directions), parts)
+    groups = []
+    start = 0
+    for i in range(parts):
+        end = start + size + (1 if i < extra else 0)
+        groups.append(directions[start:end])
+        start = end
+    return groups
+
+
+def _map(worker, tasks):
+    """results of the worker for each task, one process per task"""
+    pool = Pool(processes=len(tasks))
+    try:
+        results = pool.map(worker, tasks)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return results
+
+
+def _scene_file(scene, directory):
+    """the filename of the scene, saved in directory if it is a pgl.Scene"""
+    if isinstance(scene, basestring):
+        return scene
+    filename = os.path.join(directory, 'scene.bgeom')
+    scene.save(filename)
+    return filename
+
+
+def directlight_star(scene, directions, w, h, dfact):
+    """STAR, iPEA and TLA of directLight.decomposedSTAR
+
+    :param scene: a pgl.Scene or the name of a .bgeom file
+    """
+    import openalea.plantgl.all as pgl
+    from openalea.fractalysis.light import directLight as dl
+    if isinstance(scene, basestring):
+        scene = pgl.Scene(scene)
+    return dl.decomposedSTAR(scene, directions=directions, w=w, h=h, dfact=dfact)
+
+
+def _decomposed_star(arguments):
+    function, filename, directions, w, h, dfact = arguments
+    return function(filename, directions, w, h, dfact)
+
+
+def decomposed_star(scene, directions, w=300, h=300, dfact=4, processes=None,
+                    function=directlight_star):
+    """directLight.decomposedSTAR with the directions shared among processes
+
+    STAR and iPEA are weighted sums over the directions, so they are the sums
+    of the values of the groups of directions; TLA only depends on the scene.
+
+    :param scene: a pgl.Scene (e.g. the leaves) or the name of a .bgeom file
+    :param directions: list of (azimuth, elevation, weight)
+    :param processes: number of processes (default is the number of cpus);
+        with 0, decomposedSTAR is called once in the current process
+    :param function: the function computing (STAR, iPEA, TLA), with the
+        signature of :func:`directlight_star`
+    :returns: STAR, iPEA, TLA
+    """
+    if processes is None:
+        processes = cpu_count()
+    if processes == 0:
+        return function(scene, directions, w, h, dfact)
+
+    directory = tempfile.mkdtemp()
+    try:
+        filename = _scene_file(scene, directory)
+        tasks = [(function, filename, group, w, h, dfact)
+                 for group in split_directions(directions, processes)]
+        results = numpy.array(_map(_decomposed_star, tasks), dtype=float)
+    finally:
+        shutil.rmtree(directory)
+    return results[:, 0].sum(), results[:, 1].sum(), results[0, 2]
+
+
+def _compute_directions(ss, indices, distrib):
+    """turbid and distribution STARs of the sky turtle directions"""
+    rows = []
+    for i in indices:
+        res = ss.computeDir(skt_idx=i, distrib=distrib)
+        rows.append([res['Star_turbid']] + [res['Star_' + str(d)] for d in distrib])
+    return rows
+
+
+def _multiscale_star(arguments):
+    treename, filename, scale_dict_list, indices, distrib = arguments
+    import openalea.plantgl.all as pgl
+    import openalea.fractalysis.light as lit
+    pgl.Viewer.setBatchMode(True)
+    ss = lit.ssFromDict(treename, pgl.Scene(filename), scale_dict_list, "CvxHull")
+    return _compute_directions(ss, indices, distrib)
+
+
+def multiscale_star(ss, treename, scene, scale_dict_list, distrib,
+                    indices=range(1, 47), processes=None):
+    """STAR of each sky turtle direction with the multiscale model
+
+    :param ss: the scale structure built by lit.ssFromDict from the scene,
+        used in the current process
+    :param scene: the centered scene from which ss was built, rebuilt by
+        each worker
+    :param distrib: the list of scenarios, see
+        :func:`~openalea.stocatree.envelope.IntegratedMultiScaleStar`
+    :param indices: the sky turtle directions (1 to 46)
+    :param processes: number of processes (default is the number of cpus);
+        with 0, the directions are computed with ss in the current process
+    :returns: array with one row per direction and the turbid STAR followed
+        by the STAR of each scenario in columns
+    """
+    if processes is None:
+        processes = cpu_count()
+    if processes == 0:
+        return numpy.array(_compute_directions(ss, indices, distrib), dtype=float)
+
+    directory = tempfile.mkdtemp()
+    try:
+        filename = _scene_file(scene, directory)
+        tasks = [(treename, filename, scale_dict_list, group, distrib)
+                 for group in split_directions(indices, processes)]
+        rows = [row for group in _map(_multiscale_star, tasks) for row in group]
+    finally:
+        shutil.rmtree(directory)
+    return numpy.array(rows, dtype=float)
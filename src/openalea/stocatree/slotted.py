@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+"""
+.. topic:: slotted.py summary
+
+    Base class of the compact objects stored in the lstring
+
+    :Code: in progress
+    :Documentation: in progress
+    :Revision: $Id$
+    :Usage: >>> from openalea.stocatree.slotted import *
+
+.. testsetup::
+
+    from openalea.stocatree.slotted import *
+
+Every metamer of the lstring carries a :class:`~openalea.stocatree.metamer.metamer_data`,
+a leaf, a fruit, a frame and its cambial layers. With a per-instance dictionary
+each of these objects costs a few hundred bytes more than its attributes.
+The classes deriving from :class:`Slotted` list their attributes in
+``__slots__`` instead. ``'__dict__'`` may be listed as well so that attributes
+that are not declared can still be added; the dictionary is then only created
+for the instances that need it.
+
+:class:`Slotted` makes these objects picklable with every protocol (the .simu
+files are written with the text protocol) and restores the pickles written
+before the classes had slots, whose state is the former ``__dict__``.
+
+:Example:
+
+    >>> class Point(Slotted):
+    ...     __slots__ = ('x', 'y')
+    >>> point = Point()
+    >>> point.x = 1.
+    >>> point.__getstate__()
+    {'x': 1.0}
+"""
+
+__all__ = ['Slotted', 'slot_names']
+
+
+#: class -> names of the slots of the class and of its bases
+_slot_names = {}
+
+def slot_names(cls):
+    """names of the attributes declared in the __slots__ of a class and of its
+    bases, without __dict__ and __weakref__"""
+    try:
+        return _slot_names[cls]
+    except KeyError:
+        pass
+    names = []
+    for klass in reversed(cls.__mro__):
+        slots = klass.__dict__.get('__slots__', ())
+        if isinstance(slots, basestring):
+            slots = (slots,)
+        for name in slots:
+            if name not in ('__dict__', '__weakref__') and name not in names:
+                names.append(name)
+    _slot_names[cls] = names
+    return names
+
+
+class Slotted(object):
+    """base class of the classes with __slots__
+
+    The state of an instance is a dictionary of its attributes, whether they
+    are stored in slots or in the instance dictionary.
+    """
+    __slots__ = ()
+
+    def __getstate__(self):
+        state = dict(getattr(self, '__dict__', ()))
+        for name in slot_names(type(self)):
+            try:
+                state[name] = getattr(self, name)
+            except AttributeError:
+                pass
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.iteritems():
+            setattr(self, name, value)
@@ -15,11 +15,32 @@
 
     from openalea.stocatree.srandom import *
 
+By default, the random values are drawn from the global generator of the
+:mod:`random` module, so that a tree only depends on the seed and on the order
+in which the productions of the L-system draw their values.
+
+With :func:`set_random_streams`, the values of the functions that are given a
+purpose (e.g. 'fate', 'fruit_set', 'leaf_fall') are drawn from a
+:class:`RandomStreams` instead. Each purpose and key (e.g. the
+:func:`organ_key` of a metamer) has its own stream, and the n-th value of a
+stream only depends on the seed, the purpose, the key and n. The trees are
+then the same whatever the order in which the organs are evaluated, one by
+one or in arrays.
+
+:Example:
+
+    >>> set_random_streams(RandomStreams(seed=123456))
+    >>> fall = boolean_event(0.1, 'leaf_fall', organ_key(12, 3))
+    >>> set_random_streams(None)
 """
 
-__all__ = ['random', 'boolean_event']
+__all__ = ['random', 'boolean_event', 'draw', 'RandomStreams', 'set_random_streams',
+           'get_random_streams', 'organ_key']
 
 import random as std_random
+import zlib
+
+import numpy
 
 """
 # Added by Han on 07-04-2011, to use the seed defined in the "parameters.ini" file #
@@ -73,10 +94,12 @@ def random(*args):
         raise ValueError("1 or 2 arguments expected")
 
 
-def boolean_event(probability):
+def boolean_event(probability, purpose=None, key=0):
     """Return True if the random value is less than the  given probability.
 
     :param probability: a probability in [0,1]
+    :param purpose: the purpose of the event, see :func:`draw`
+    :param key: the key of the stream of the purpose, see :func:`draw`
     :rtype: boolean
 
     ::
@@ -86,5 +109,146 @@ def boolean_event(probability):
     """
     assert probability >= 0.
     assert probability <= 1.0
-    return std_random.random() < probability
+    return draw(purpose, key) < probability
+
+
+def draw(purpose=None, key=0):
+    """returns a random value in [0, 1)
+
+    The value is drawn from the stream of purpose and key if random streams
+    are used (see :func:`set_random_streams`) and purpose is given, from the
+    :mod:`random` module otherwise.
+
+    >>> x = draw('fate', 12)
+    """
+    if _streams is not None and purpose is not None:
+        return _streams.random(purpose, key)
+    return std_random.random()
+
+
+def organ_key(unit_id, number):
+    """the key of the streams of a metamer: the id of its growth unit and its
+    number in the growth unit"""
+    return (int(unit_id or 0) << 16) | int(number)
+
+
+_mask = 0xFFFFFFFFFFFFFFFF
+_golden = numpy.uint64(0x9E3779B97F4A7C15)
+
+def _mix(z):
+    """splitmix64 finalizer of an array of uint64"""
+    z = (z ^ (z >> numpy.uint64(30))) * numpy.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> numpy.uint64(27))) * numpy.uint64(0x94D049BB133111EB)
+    return z ^ (z >> numpy.uint64(31))
+
+
+def _mix_int(z):
+    """splitmix64 finalizer of an integer in [0, 2**64), same as :func:`_mix`
+    without the cost of numpy for a single value"""
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _mask
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _mask
+    return z ^ (z >> 31)
+
+
+class RandomStreams(object):
+    """independent streams of random values, one per purpose and key
+
+    The n-th value of the stream of (purpose, key) is the splitmix64 hash of
+    n and of a state derived from the seed, the purpose and the key: values
+    may be drawn for several keys at once, in any order, with the same result.
+
+    :param seed: the seed of all the streams
+
+    :Example:
+
+        >>> streams = RandomStreams(seed=1)
+        >>> x = streams.random('fate')
+        >>> values = streams.uniform('leaf_fall', keys=[3, 4, 5])
+    """
+    def __init__(self, seed=0):
+        self.seed = int(seed)
+        #: number of values drawn from each (purpose, key) stream
+        self.counters = {}
+        #: purpose -> state derived from the seed and the purpose
+        self._bases = {}
+
+    def _base(self, purpose):
+        """the state of the purpose, shared by the streams of all its keys"""
+        try:
+            return self._bases[purpose]
+        except KeyError:
+            base = _mix_int(_mix_int(self.seed & _mask) ^ (zlib.crc32(purpose) & 0xFFFFFFFF))
+            self._bases[purpose] = base
+            return base
+
+    def _state(self, purpose, keys):
+        """the states of the streams of purpose for an array of keys"""
+        base = numpy.uint64(self._base(purpose))
+        return _mix(base ^ numpy.asarray(keys, dtype=numpy.int64).astype(numpy.uint64))
+
+    def values(self, purpose, keys, counters):
+        """the values number counters of the streams of purpose and keys
+        (no counter is updated)"""
+        counters = numpy.asarray(counters, dtype=numpy.int64).astype(numpy.uint64)
+        z = _mix(self._state(purpose, keys) + (counters + numpy.uint64(1)) * _golden)
+        return (z >> numpy.uint64(11)).astype(float) * (1. / (1 << 53))
+
+    def random(self, purpose, key=0):
+        """the next value in [0, 1) of the stream of purpose and key
+
+        This is called for each organ by :func:`draw`, so the value is
+        computed with python integers rather than with :meth:`values`.
+        """
+        count = self.counters.get((purpose, key), 0)
+        self.counters[(purpose, key)] = count + 1
+        z = _mix_int(self._base(purpose) ^ (int(key) & _mask))
+        z = _mix_int((z + (count + 1) * 0x9E3779B97F4A7C15) & _mask)
+        return (z >> 11) * (1. / (1 << 53))
+
+    def uniform(self, purpose, size=None, keys=None):
+        """an array of values in [0, 1)
+
+        :param size: the number of values drawn from the stream of key 0
+        :param keys: the keys of the streams, one value being drawn per key
+            (in order if a key is repeated)
+        """
+        if keys is None:
+            count = self.counters.get((purpose, 0), 0)
+            self.counters[(purpose, 0)] = count + size
+            return self.values(purpose, numpy.zeros(size, dtype=numpy.int64),
+                               numpy.arange(count, count + size))
+        keys = [int(key) for key in keys]
+        counters = []
+        for key in keys:
+            count = self.counters.get((purpose, key), 0)
+            self.counters[(purpose, key)] = count + 1
+            counters.append(count)
+        return self.values(purpose, keys, counters)
+
+    def boolean_events(self, purpose, probabilities, keys=None):
+        """an array of events, True where the value of the stream is less
+        than the probability
+
+        :param keys: the key of each event (default is the stream of key 0)
+        """
+        probabilities = numpy.asarray(probabilities, dtype=float)
+        return self.uniform(purpose, len(probabilities), keys) < probabilities
+
+
+_streams = None
+
+def set_random_streams(streams):
+    """use streams (a :class:`RandomStreams`) for the values drawn with a
+    purpose, or the :mod:`random` module if streams is None
+
+    :returns: the previous streams
+    """
+    global _streams
+    previous = _streams
+    _streams = streams
+    return previous
+
 
+def get_random_streams():
+    """the :class:`RandomStreams` set by :func:`set_random_streams`, or None"""
+    return _streams
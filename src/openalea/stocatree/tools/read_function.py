@@ -14,6 +14,12 @@
 
     from openalea.stocatree.tools.read_function import *
 """
+import os
+from bisect import bisect_left
+
+import numpy
+
+__all__ = ['ReadFunction', 'read_functions']
 
 
 def _getdata(line, key):
@@ -47,6 +53,63 @@ class _FSet(object):
             output+= '%s %s\n' % (x, y)
         return output
 
+def _readFunctions(filename='functions.fset'):
+    """Read all the functions of a functions.fset file
+
+    :returns: the list of :class:`_FSet`, in the order of the file
+
+    .. warning:: for developers only, see :func:`_readFunction`
+    """
+    try:
+        fdata = open(filename, 'r')
+    except IOError:
+        raise IOError('Could not read filename %s' % filename)
+
+    #skipe first line
+    fdata.readline()
+    # get number of items
+    items = int(_getdata(fdata.readline(), 'items'))
+
+    fsets = []
+    for item in range(0,items):
+        # skip fver
+        fdata.readline()
+        name = _getdata(fdata.readline(), 'name')
+        samples = float(_getdata(fdata.readline(), 'samples'))
+        flip = _getdata(fdata.readline(), 'flip')
+        points = int(_getdata(fdata.readline(), 'points'))
+        datax = []
+        datay = []
+        for i in range(points):
+            data = fdata.readline().split(' ')
+
+            if float(data[0]) not in datax:
+                datax.append(float(data[0]))
+                datay.append(float(data[1]))
+
+        fsets.append(_FSet(name=name, samples=samples, flip=flip,x=datax, y=datay))
+
+    fdata.close()
+    return fsets
+
+
+#: parsed fset files: absolute filename -> (modification time, list of _FSet)
+_fsets_cache = {}
+
+def _cachedFunctions(filename):
+    """:func:`_readFunctions` parsing each file only once (until it is modified)"""
+    key = os.path.abspath(filename)
+    try:
+        mtime = os.path.getmtime(key)
+    except OSError:
+        raise IOError('Could not read filename %s' % filename)
+    cached = _fsets_cache.get(key)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, _readFunctions(filename))
+        _fsets_cache[key] = cached
+    return cached[1]
+
+
 def _readFunction(filename='functions.set', func_name=None, x=0):
     """Function to read a functions.fset file according to L-studio syntax given
     a function name . It returns the f(x) value (interpolated).
@@ -93,39 +156,36 @@ def _readFunction(filename='functions.set', func_name=None, x=0):
         points: number of points
         x1 y1
         x2 y2
-    """
-    try:
-        fdata = open(filename, 'r')
-    except:
-        IOError('Could not read filename %s', filename)
 
-    #skipe first line
-    fdata.readline()
-    # get number of items
-    items = int(_getdata(fdata.readline(), 'items'))
+    The function names of the file may start with an underscore, which is
+    optional in func_name. If func_name is None, the last function of the
+    file is returned.
+    """
+    fsets = _cachedFunctions(filename)
+    if func_name is None:
+        return '', fsets[-1]
+    for fset in fsets:
+        if fset.name in (func_name, '_' + func_name):
+            return '', fset
+    raise ValueError('function %s not found in %s (available: %s)' %
+                     (func_name, filename, ', '.join(f.name for f in fsets)))
 
-    fsets = []
-    for item in range(0,items):
-        # skip fver
-        fdata.readline()
-        name = _getdata(fdata.readline(), 'name')
-        samples = float(_getdata(fdata.readline(), 'samples'))
-        flip = _getdata(fdata.readline(), 'flip')
-        points = int(_getdata(fdata.readline(), 'points'))
-        datax = []
-        datay = []
-        for i in range(points):
-            data = fdata.readline().split(' ')
 
-            if float(data[0]) not in datax:
-                datax.append(float(data[0]))
-                datay.append(float(data[1]))
+def read_functions(filename):
+    """Read all the functions of a functions.fset file at once
 
-        fset = _FSet(name=name, samples=samples, flip=flip,x=datax, y=datay)
+    :returns: a dictionary function name -> :class:`ReadFunction`, the
+        leading underscore of the names being removed
 
-    fdata.close()
+    ::
 
-    return '', fset
+        >>> functions = read_functions('functions.fset')
+        >>> functions['leaf_area'].gety(0.5)
+    """
+    functions = {}
+    for fset in _cachedFunctions(filename):
+        functions[fset.name.lstrip('_')] = ReadFunction(filename, fset.name)
+    return functions
 
 
 
@@ -176,11 +236,17 @@ class ReadFunction():
         self.x = self.fset.x
         self.y = self.fset.y
         self.length = len(self.x)
+        # slopes of the segments, and arrays for gety_array
+        self._slopes = [(self.y[i+1]-self.y[i])/(self.x[i+1]-self.x[i])
+                        for i in range(self.length-1)]
+        self._xarray = numpy.array(self.x)
+        self._yarray = numpy.array(self.y)
 
     def gety(self, x):
         """returns the y values corresponding to x
 
-        Use scipy and its simplest 1D interpolation method..
+        Linear interpolation between the points of the function, the segment
+        being found by bisection.
 
         :param x: the input x value
         :returns y: the interpolated y value derived from the function read in the constructor.
@@ -191,11 +257,19 @@ class ReadFunction():
         """
         if x<=0: return self.y[0]
         if x>=1: return self.y[self.length-1]
-        index = 0
-        for i, this in enumerate(self.x):
-            if x>this:
-                index = i
-            else:
-                break
-        newy = self.y[index] + (self.y[index+1]-self.y[index])/(self.x[index+1]-self.x[index]) * (x-self.x[index])
-        return newy
+        index = min(max(bisect_left(self.x, x) - 1, 0), self.length - 2)
+        return self.y[index] + self._slopes[index] * (x-self.x[index])
+
+    def gety_array(self, x):
+        """returns the y values corresponding to an array of x values
+
+        Same as :meth:`gety` for each value of x.
+
+        ::
+
+            x.gety_array(numpy.array([0.1, 0.5]))
+        """
+        x = numpy.asarray(x, dtype=float)
+        y = numpy.interp(x, self._xarray, self._yarray)
+        y = numpy.where(x <= 0, self.y[0], y)
+        return numpy.where(x >= 1, self.y[self.length-1], y)
@@ -0,0 +1,618 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+"""
+.. topic:: topology.py summary
+
+    Index of the branching structure of an lstring
+
+    :Code: in progress
+    :Documentation: in progress
+    :Revision: $Id$
+    :Usage: >>> from openalea.stocatree.topology import *
+
+.. testsetup::
+
+    from openalea.stocatree.topology import *
+
+The productions of MAppleT.lpy access the neighbours of a metamer through the
+left context (group 1, forward) or the right context (group 2, backward) of
+the L-system. :class:`TopologyIndex` scans the lstring once and stores these
+neighbours as numpy arrays of metamer indices so that the parameters of all
+the metamers can be updated with array operations
+(see :mod:`~openalea.stocatree.metamer_array`).
+
+The index only depends on the structure of the lstring. It remains valid as
+long as no metamer or apex is added or removed, that is until the next
+update_structure or pruning step of the L-system, where :meth:`TopologyIndex.invalidate`
+must be called.
+
+:class:`OrganTopology` is the persistent tree of the metamers and apices. The
+productions that add organs (group 4) or cut branches (pruning) update it in
+place, so that the :class:`TopologyIndex` given this tree is rebuilt from it
+after a change of the structure instead of scanning the lstring again.
+"""
+
+import numpy
+
+__all__ = ['TopologyIndex', 'OrganTopology']
+
+#: codes of the group 2 productions matching a metamer given its right context
+RULE_NONE, RULE_BRANCH, RULE_METAMER, RULE_APEX = 0, 1, 2, 3
+
+#: node of the organs removed from an :class:`OrganTopology` by a cut
+CUT = -2
+
+
+class TopologyIndex(object):
+    """Parent/children arrays of the metamers of an lstring
+
+    :Example:
+
+        >>> index = TopologyIndex()
+        >>> index.update(lstring)     # scans the lstring
+        >>> index.update(lstring)     # nothing to do
+        >>> index.invalidate()        # the structure has changed
+        >>> index.update(lstring)     # scans the lstring again
+
+    Left context (group 1):
+
+        * :attr:`parent` index of the metamer preceding each metamer (-1 if none)
+        * :attr:`branch` True if the metamer is the first one of a branch,
+          i.e. its left context is `metamer(ml) branch()`
+        * :attr:`depth` number of ancestors of the metamer
+
+    Right context (group 2):
+
+        * :attr:`successor` index of the metamer following each metamer on
+          the same axis, branches being skipped (-1 if none)
+        * :attr:`lateral` index of the first metamer of the branch borne by
+          each metamer, i.e. the right context is `SB() branch() metamer(mb) EB()` (-1 if none)
+        * :attr:`apex` the apex_data following each metamer on the same axis (None if none)
+        * :attr:`rule` which production of group 2 applies to each metamer
+        * :attr:`trunk` index of the metamer following the root (-1 if none)
+        * :attr:`apices` all the apex_data of the lstring
+
+    :attr:`post_order` lists the metamers so that the successor and lateral
+    metamers always come before their bearer; :attr:`levels` gives the
+    boundaries of the slices of :attr:`post_order` that share the same depth.
+
+    If the index is given an :class:`OrganTopology`, :meth:`update` reads the
+    structure from it as long as it is valid, and scans the lstring (and
+    rebuilds the organ topology) otherwise.
+    """
+
+    #: modules ignored by the L-system when matching contexts
+    ignored = ['growth_unit']
+
+    def __init__(self, lstring=None, organs=None):
+        """**Constructor**
+
+        :param lstring: if provided, the index is built at once
+        :param organs: an :class:`OrganTopology` kept up to date by the
+            productions (optional)
+        """
+        self.valid = False
+        self.builds = 0
+        self.metamers = []
+        self.apices = []
+        self.size = 0
+        self.organs = organs
+        if lstring is not None:
+            self.build(lstring)
+
+    def __len__(self):
+        return self.size
+
+    def invalidate(self):
+        """mark the index as obsolete (the structure of the lstring has changed)"""
+        self.valid = False
+
+    def update(self, lstring):
+        """build the index if it is not valid anymore"""
+        if self.valid:
+            return
+        if self.organs is not None and self.organs.valid:
+            self.build_from(self.organs)
+        else:
+            self.build(lstring)
+            if self.organs is not None:
+                self.organs.build(lstring)
+
+    def build(self, lstring):
+        """scan the lstring and build the index
+
+        :param lstring: the lstring (or any sequence of modules that have a
+            name and the metamer_data or apex_data as first parameter)
+        """
+        metamers = []
+        parent = []
+        branch = []
+        depth = []
+        successor = []
+        lateral = []
+        apex = []
+        bracket = []
+        apices = []
+        trunk = -1
+
+        stack = []
+        last = -1             # left context
+        after_branch = False
+        pending = -1          # metamer waiting for its right context (-2 for the root)
+        opening = -1          # metamer bearing the current bracket
+        expected = None       # next module expected in the bracket to find a lateral metamer
+
+        for module in lstring:
+            name = module.name
+            if name == '[':
+                stack.append((last, pending, opening, expected))
+                if pending >= 0 and not bracket[pending]:
+                    bracket[pending] = True
+                    opening = pending
+                    expected = 'branch'
+                else:
+                    opening = -1
+                    expected = None
+                pending = -1
+                continue
+            elif name == ']':
+                last, pending, opening, expected = stack.pop()
+                # the right context of the bearer skips the whole bracket
+                opening = -1
+                expected = None
+                after_branch = False
+                continue
+            elif name in self.ignored:
+                continue
+
+            # lateral metamer of the bracket
+            if expected is not None:
+                if name == expected == 'branch':
+                    expected = 'metamer'
+                else:
+                    if name == expected == 'metamer':
+                        lateral[opening] = len(metamers)
+                    expected = None
+
+            # right context of the pending metamer (or root)
+            if name == 'metamer':
+                index = len(metamers)
+                if pending >= 0:
+                    successor[pending] = index
+                elif pending == -2:
+                    trunk = index
+            elif name == 'apex':
+                apices.append(module[0])
+                if pending >= 0:
+                    apex[pending] = module[0]
+
+            # left context
+            if name == 'metamer':
+                parent.append(last)
+                branch.append(after_branch and last >= 0)
+                if last >= 0:
+                    depth.append(depth[last] + 1)
+                else:
+                    depth.append(0)
+                metamers.append(module[0])
+                successor.append(-1)
+                lateral.append(-1)
+                apex.append(None)
+                bracket.append(False)
+                last = pending = index
+                after_branch = False
+            elif name == 'branch':
+                after_branch = True
+                pending = -1
+            else:
+                # any other module (apex, root...) breaks the contexts
+                last = -1
+                after_branch = False
+                pending = -2 if name == 'root' else -1
+
+        self._set(metamers, apices, trunk, parent, branch, depth, successor,
+                  lateral, apex)
+
+    def build_from(self, organs):
+        """build the index from an :class:`OrganTopology`
+
+        The organs are visited in the order of the lstring, so that the index
+        is the same as the one built by :meth:`build`.
+        """
+        metamers = []
+        parent = []
+        branch = []
+        depth = []
+        successor = []
+        lateral = []
+        apex = []
+        apices = []
+        trunk = -1
+
+        organ = organs.organs
+        bearers = organs.parent
+        first_child = organs.first_child
+        next_sibling = organs.next_sibling
+        is_lateral = organs.lateral
+        is_apex = organs.apex
+        alive = organs.alive
+
+        # index of the metamer of each node
+        position = [-1] * len(bearers)
+        stack = [organs.first] if organs.first >= 0 else []
+        while stack:
+            node = stack.pop()
+            if next_sibling[node] >= 0:
+                stack.append(next_sibling[node])
+            if not alive[node]:
+                continue
+            bearer = bearers[node]
+            p = position[bearer] if bearer >= 0 else -1
+            if is_apex[node]:
+                apices.append(organ[node])
+                if p >= 0 and not is_lateral[node]:
+                    apex[p] = organ[node]
+                continue
+
+            index = len(metamers)
+            position[node] = index
+            if p < 0:
+                trunk = index
+                depth.append(0)
+            else:
+                if not is_lateral[node]:
+                    successor[p] = index
+                elif first_child[bearer] == node:
+                    # only the first branch of a metamer is its lateral
+                    lateral[p] = index
+                depth.append(depth[p] + 1)
+            parent.append(p)
+            branch.append(is_lateral[node] and p >= 0)
+            metamers.append(organ[node])
+            successor.append(-1)
+            lateral.append(-1)
+            apex.append(None)
+            if first_child[node] >= 0:
+                stack.append(first_child[node])
+
+        self._set(metamers, apices, trunk, parent, branch, depth, successor,
+                  lateral, apex)
+
+    def _set(self, metamers, apices, trunk, parent, branch, depth, successor,
+             lateral, apex):
+        """set the arrays of the index from the lists of :meth:`build`"""
+        self.metamers = metamers
+        self.apices = apices
+        self.size = len(metamers)
+        self.trunk = trunk
+        self.parent = numpy.array(parent, dtype=int)
+        self.branch = numpy.array(branch, dtype=bool)
+        self.depth = numpy.array(depth, dtype=int)
+        self.successor = numpy.array(successor, dtype=int)
+        self.lateral = numpy.array(lateral, dtype=int)
+        self.apex = apex
+
+        rule = numpy.zeros(self.size, dtype=int)
+        rule[numpy.array([a is not None for a in apex], dtype=bool)] = RULE_APEX
+        rule[self.successor >= 0] = RULE_METAMER
+        rule[(self.successor >= 0) & (self.lateral >= 0)] = RULE_BRANCH
+        self.rule = rule
+
+        self.post_order = numpy.argsort(-self.depth, kind='mergesort')
+        if self.size:
+            self.levels = numpy.searchsorted(-self.depth[self.post_order],
+                                             numpy.arange(-self.depth.max(), 1))
+            self.levels = numpy.append(self.levels, self.size)
+        else:
+            self.levels = numpy.array([0], dtype=int)
+        self.valid = True
+        self.builds += 1
+
+    def bottom_up(self):
+        """iterate over the arrays of metamer indices of same depth, deepest first"""
+        for i in range(len(self.levels) - 1):
+            yield self.post_order[self.levels[i]:self.levels[i + 1]]
+
+    def top_down(self):
+        """iterate over the arrays of metamer indices of same depth, root first"""
+        for i in range(len(self.levels) - 2, -1, -1):
+            yield self.post_order[self.levels[i]:self.levels[i + 1]]
+
+
+class OrganTopology(object):
+    """Tree of the metamers and apices, updated by the productions
+
+    Each organ gets a node when it enters the tree; the node is stored in the
+    :attr:`node` attribute of the metamer_data or apex_data. For each node:
+
+        * :attr:`parent` node of the metamer that precedes the organ on its
+          axis or bears its branch (-1 for the first organ of the trunk)
+        * :attr:`first_child` and :attr:`next_sibling` the children of each
+          node as a linked list in the order of the lstring: the branches
+          first, the organ that continues the axis last (-1 if none)
+        * :attr:`lateral` True if the organ starts a branch of its parent
+        * :attr:`order` branching order of the axis of the organ (0 for the trunk)
+        * :attr:`parent_unit_id` and :attr:`parent_fbr_id` the growth unit and
+          the first order branch of a metamer (-1 for the apices)
+        * :attr:`apex` True for the apices
+        * :attr:`alive` False once the organ has been cut
+
+    A metamer replaced by Cut() stays in the tree as a node that is not alive
+    and has no children, so that the empty branch or the end of axis left in
+    the lstring is still known. The node of the organs that are cut is set to
+    :data:`CUT`.
+
+    :Example:
+
+        >>> organs = OrganTopology()
+        >>> organs.start(a)            # axiom: root() apex(a)
+        >>> organs.grow(a, m)          # metamer(m) apex(a)
+        >>> organs.branch(m, b)        # metamer(m) SB() branch() apex(b) EB()
+        >>> organs.cut(m)              # Cut() in place of metamer(m)
+
+    The tree is :attr:`valid` once started or built from an lstring. The
+    updates do nothing on a tree that is not valid, or on organs that have
+    been cut, as the productions of the modules that follow a Cut() in the
+    same derivation.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """remove all the nodes; the tree is not valid until :meth:`start` or :meth:`build`"""
+        self.organs = []
+        self.parent = []
+        self.first_child = []
+        self.next_sibling = []
+        self.lateral = []
+        self.order = []
+        self.parent_unit_id = []
+        self.parent_fbr_id = []
+        self.apex = []
+        self.alive = []
+        self.first = -1
+        self.size = 0
+        self.valid = False
+
+    def __len__(self):
+        """number of organs that have not been cut"""
+        return self.size
+
+    def _new(self, organ, parent, lateral, apex):
+        """a new node for organ, not linked to its parent yet"""
+        node = len(self.parent)
+        self.organs.append(organ)
+        self.parent.append(parent)
+        self.first_child.append(-1)
+        self.next_sibling.append(-1)
+        self.lateral.append(lateral)
+        if parent >= 0:
+            self.order.append(self.order[parent] + int(lateral))
+        else:
+            self.order.append(0)
+        if apex:
+            self.parent_unit_id.append(-1)
+            self.parent_fbr_id.append(-1)
+        else:
+            self.parent_unit_id.append(organ.parent_unit_id)
+            self.parent_fbr_id.append(organ.parent_fbr_id)
+        self.apex.append(apex)
+        self.alive.append(True)
+        self.size += 1
+        organ.node = node
+        return node
+
+    def _append(self, parent, node):
+        """link node as the last child of parent (the root if parent is -1)"""
+        if parent < 0:
+            self.first = node
+            return
+        child = self.first_child[parent]
+        if child < 0:
+            self.first_child[parent] = node
+            return
+        while self.next_sibling[child] >= 0:
+            child = self.next_sibling[child]
+        self.next_sibling[child] = node
+
+    def _node(self, organ):
+        """the node of organ if it can be updated, -1 otherwise"""
+        if not self.valid:
+            return -1
+        node = organ.node
+        if node == CUT:
+            return -1
+        if node < 0 or node >= len(self.organs) or self.organs[node] is not organ:
+            # the organ was not produced through the updates of this tree
+            self.clear()
+            return -1
+        return node
+
+    def start(self, apex):
+        """the tree of the axiom, made of the apex of the trunk"""
+        self.clear()
+        self.first = self._new(apex, -1, False, True)
+        self.valid = True
+
+    def grow(self, apex, metamer):
+        """the apex produces a metamer: `metamer(metamer) apex(apex)` in place of `apex(apex)`
+
+        :returns: the node of the metamer (-1 if the tree is not updated)
+        """
+        a = self._node(apex)
+        if a < 0:
+            return -1
+        parent = self.parent[a]
+        node = self._new(metamer, parent, self.lateral[a], False)
+        # the metamer takes the place of the apex among the children of parent
+        self.next_sibling[node] = self.next_sibling[a]
+        if parent < 0:
+            self.first = node
+        elif self.first_child[parent] == a:
+            self.first_child[parent] = node
+        else:
+            child = self.first_child[parent]
+            while self.next_sibling[child] != a:
+                child = self.next_sibling[child]
+            self.next_sibling[child] = node
+        # and the apex continues the axis after it
+        self.parent[a] = node
+        self.lateral[a] = False
+        self.next_sibling[a] = -1
+        self.first_child[node] = a
+        return node
+
+    def branch(self, metamer, apex):
+        """the metamer bears a new branch made of the apex:
+        `metamer(metamer) SB() branch() apex(apex) EB()`
+
+        The branch comes first among the children of the metamer, as in the
+        lstring.
+
+        :returns: the node of the apex (-1 if the tree is not updated)
+        """
+        m = self._node(metamer)
+        if m < 0:
+            return -1
+        node = self._new(apex, m, True, True)
+        self.next_sibling[node] = self.first_child[m]
+        self.first_child[m] = node
+        return node
+
+    def cut(self, metamer, keep=False):
+        """remove the organs borne by a metamer, as Cut() does in the lstring
+
+        :param metamer: the metamer replaced by Cut()
+        :param bool keep: if True the metamer itself is kept, as in
+            `metamer(m) ... Cut()`
+        :returns: the list of the removed nodes
+        """
+        m = self._node(metamer)
+        if m < 0:
+            return []
+        removed = self.subtree(m)
+        if keep:
+            removed = removed[1:]
+        for node in removed:
+            self.alive[node] = False
+            self.organs[node].node = CUT
+            self.organs[node] = None
+            if node != m:
+                self.first_child[node] = -1
+                self.next_sibling[node] = -1
+        self.first_child[m] = -1
+        self.size -= len(removed)
+        return removed
+
+    def children(self, node):
+        """the organs borne by a node that have not been cut, in the order of the lstring"""
+        children = []
+        child = self.first_child[node]
+        while child >= 0:
+            if self.alive[child]:
+                children.append(child)
+            child = self.next_sibling[child]
+        return children
+
+    def ancestors(self, node):
+        """the metamers from the parent of a node down to the first metamer of the trunk"""
+        ancestors = []
+        node = self.parent[node]
+        while node >= 0:
+            ancestors.append(node)
+            node = self.parent[node]
+        return ancestors
+
+    def subtree(self, node):
+        """the organs borne by a node, including the node itself, in the order of the lstring"""
+        nodes = []
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if not self.alive[node]:
+                continue
+            nodes.append(node)
+            stack.extend(reversed(self.children(node)))
+        return nodes
+
+    def nodes(self):
+        """the organs that have not been cut, in the order of the lstring"""
+        if self.first < 0:
+            return []
+        nodes = []
+        child = self.first
+        while child >= 0:
+            nodes.extend(self.subtree(child))
+            child = self.next_sibling[child]
+        return nodes
+
+    def array(self, name):
+        """one of the lists of the tree as a numpy array"""
+        return numpy.array(getattr(self, name))
+
+    def build(self, lstring):
+        """build the tree from an lstring, e.g. a simulation restored from a checkpoint
+
+        The tree is not valid if the lstring contains organs that cannot be
+        placed in it, e.g. after a module that is not a metamer or an apex.
+        """
+        self.clear()
+        stack = []
+        last = -1             # node of the metamer continued by the next organ
+        state = 'axis'        # 'bracket' after '[', 'branch' after branch(),
+                              # 'closed' after an apex or any other module
+        for module in lstring:
+            name = module.name
+            if name == '[':
+                if last < 0 or state != 'axis':
+                    return
+                stack.append(last)
+                state = 'bracket'
+            elif name == ']':
+                if not stack:
+                    return
+                if state in ('bracket', 'branch'):
+                    # empty branch
+                    self._append(last, self._stub(last, True))
+                last = stack.pop()
+                state = 'axis'
+            elif name == 'branch':
+                if state != 'bracket':
+                    return
+                state = 'branch'
+            elif name in TopologyIndex.ignored:
+                continue
+            elif name == 'root':
+                last = -1
+                state = 'axis'
+            elif name in ('metamer', 'apex'):
+                if state not in ('axis', 'branch'):
+                    return
+                node = self._new(module[0], last, state == 'branch', name == 'apex')
+                self._append(last, node)
+                if name == 'metamer':
+                    last = node
+                    state = 'axis'
+                else:
+                    state = 'closed'
+            elif state != 'closed':
+                # the end of the axis, e.g. Label('Cut') after a rupture
+                self._append(last, self._stub(last, state != 'axis'))
+                state = 'closed'
+        self.valid = True
+
+    def _stub(self, parent, lateral):
+        """a node that has been cut"""
+        node = len(self.parent)
+        self.organs.append(None)
+        self.parent.append(parent)
+        self.first_child.append(-1)
+        self.next_sibling.append(-1)
+        self.lateral.append(lateral)
+        self.order.append(self.order[parent] + int(lateral) if parent >= 0 else 0)
+        self.parent_unit_id.append(-1)
+        self.parent_fbr_id.append(-1)
+        self.apex.append(False)
+        self.alive.append(False)
+        return node
@@ -0,0 +1,61 @@
+import os
+import tempfile
+
+from openalea.stocatree.benchmark import *
+
+
+def test_micro():
+    assert 'reorient_frame' in micro_benchmarks
+    assert 'generate_sequence.large' in micro_benchmarks
+    calls = []
+    micro('counter')(lambda: (lambda: calls.append(1), 10))
+    micro('failure')(lambda: 1 / 0)
+    try:
+        counter, failure = run_micro(['counter', 'failure'], repeat=3)
+    finally:
+        del micro_benchmarks['counter'], micro_benchmarks['failure']
+    assert len(calls) == 4
+    assert counter['repeat'] == 3 and counter['calls'] == 10 and counter['error'] is None
+    assert counter['per_call'] == counter['best'] / 10
+    assert failure['error'].startswith('ZeroDivisionError')
+
+
+def test_time_calls():
+    ticks = iter(range(10))
+    assert time_calls(lambda: None, repeat=3, clock=lambda: ticks.next()) == [1, 1, 1]
+
+
+def test_compare_results():
+    def result(name, per_call, error=None):
+        return {'name': name, 'kind': 'micro', 'per_call': per_call, 'error': error}
+    baseline = {'results': [result('a', 1.), result('b', 1.), result('c', 1.)]}
+    current = {'results': [result('a', 1.05), result('b', 2.), result('c', None, 'ImportError'),
+                           result('d', 1.)]}
+    assert compare_results(baseline, current, 0.1) == [('b', 1., 2., 2.)]
+    assert [row[0] for row in compare_results(baseline, current, -1)] == ['b', 'a']
+
+    filename = os.path.join(tempfile.mkdtemp(), 'benchmark.json')
+    save_results(current['results'], filename)
+    document = load_results(filename)
+    assert document['results'][1]['per_call'] == 2.
+    assert 'platform' in document and 'commit' in document
+    assert compare_results(filename, filename) == []
+    os.remove(filename)
+    os.rmdir(os.path.dirname(filename))
+
+
+def test_object_size():
+    import sys
+    from openalea.stocatree.slotted import Slotted
+
+    class Point(Slotted):
+        __slots__ = ('x', 'y', '__dict__')
+
+    point = Point()
+    point.x = 1.5
+    point.y = point.x
+    empty = object_size(point)
+    assert empty == sys.getsizeof(point) + sys.getsizeof(1.5)
+    point.label = 2.5
+    assert object_size(point) == empty + object_size(point.__dict__)
+    assert object_size([point, point]) == sys.getsizeof([point, point]) + object_size(point)
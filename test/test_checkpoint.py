@@ -0,0 +1,100 @@
+import os
+import tempfile
+import cPickle
+
+from openalea.stocatree.checkpoint import *
+from openalea.stocatree.metamer import metamer_data
+from openalea.stocatree.apex import apex_data
+from openalea.stocatree.growth_unit import growth_unit_data
+from openalea.stocatree.wood import Wood
+from openalea.stocatree.fruit import AppleFruit
+from openalea.stocatree.leaf import AppleLeaf
+from openalea.stocatree.internode import Internode
+from openalea.stocatree.frame import Frame
+from openalea.stocatree.tree import Tree
+from openalea.stocatree.tools.simulation import SimulationStocatree
+from openalea.stocatree.slotted import Slotted
+from vplants.plantgl.all import Vector3
+
+
+def _thestring(n):
+    """root [ branch growth_unit m ... m apex ] ... as written by the group 7"""
+    thestring = ['root']
+    for i in range(n):
+        m = metamer_data(hlu=Frame(), wood=Wood(), leaf=AppleLeaf(),
+                         fruit=AppleFruit(), internode=Internode(),
+                         number=i + 1, zone=1, b_angle=0.5, p_angle=2.4)
+        m.age = i
+        m.radius = 0.001 * i
+        m.position = Vector3(0., 0., 0.01 * i)
+        m.leaf.state = 'growing' if i % 2 else 'scar'
+        m.layers[-1].thickness = 0.0001 * i
+        if i % 10 == 0:
+            a = apex_data(Frame(), 'small')
+            a.sequence = [i, 2, 3]
+            thestring += ['sb', 'branch', growth_unit_data(i, 1995), m, a, 'eb']
+        else:
+            thestring.append(m)
+    thestring.append(apex_data(Frame(), 'trunk'))
+    return thestring
+
+
+def _attributes(obj):
+    if isinstance(obj, Slotted):
+        return obj.__getstate__()
+    return vars(obj)
+
+
+def _check(value, expected):
+    if isinstance(expected, Vector3):
+        assert (value.x, value.y, value.z) == (expected.x, expected.y, expected.z)
+    elif hasattr(expected, '__dict__') or isinstance(expected, Slotted):
+        assert value.__class__ is expected.__class__
+        assert sorted(_attributes(value).keys()) == sorted(_attributes(expected).keys())
+        for name in _attributes(expected):
+            _check(getattr(value, name), getattr(expected, name))
+    elif isinstance(expected, list):
+        assert len(value) == len(expected)
+        for v, e in zip(value, expected):
+            _check(v, e)
+    else:
+        assert type(value) is type(expected)
+        assert value == expected
+
+
+def test_checkpoint():
+    simulation = SimulationStocatree(dt=1)
+    thestring = _thestring(100)
+    simulation.load_save(thestring, None, Tree(), None)
+    directory = tempfile.mkdtemp()
+    filename = os.path.join(directory, 'test.npz')
+    save_checkpoint(filename, simulation)
+    assert simulation.lstring is thestring
+
+    loaded = load_checkpoint(filename)
+    assert loaded.tree.trunk_radius == simulation.tree.trunk_radius
+    assert len(loaded.lstring) == len(thestring)
+    for value, expected in zip(loaded.lstring, thestring):
+        _check(value, expected)
+
+    # smaller than the text pickle
+    picklefile = os.path.join(directory, 'test.simu')
+    f = open(picklefile, 'w')
+    cPickle.dump(simulation, f)
+    f.close()
+    assert os.path.getsize(filename) < os.path.getsize(picklefile)
+
+    os.remove(filename)
+    os.remove(picklefile)
+    os.rmdir(directory)
+
+
+def test_empty_checkpoint():
+    simulation = SimulationStocatree(dt=1)
+    simulation.load_save(['root'], None, None, None)
+    directory = tempfile.mkdtemp()
+    filename = os.path.join(directory, 'test.npz')
+    save_checkpoint(filename, simulation, compress=False)
+    assert load_checkpoint(filename).lstring == ['root']
+    os.remove(filename)
+    os.rmdir(directory)
@@ -0,0 +1,48 @@
+import os
+import tempfile
+
+import numpy
+
+from openalea.stocatree.climate import *
+from openalea.stocatree.temperature_effects import Tp_date
+from openalea.stocatree import get_shared_data
+
+
+def test_bud_break_dates():
+    climate = read_climate(get_shared_data('temperature_data.csv'))
+    assert climate is read_climate(get_shared_data('temperature_data.csv'))
+    assert climate.years[0] == 1963 and climate.years[-1] == 2010
+    dates = climate.bud_break_dates([1994, 1995])
+    assert dates[1994] == ((1994, 1, 17, 0, 0), (1994, 4, 13, 0, 0))
+    assert dates[1995] == ((1995, 1, 31, 0, 0), (1995, 4, 21, 0, 0))
+    assert len(climate.bud_break_dates()) == len(climate.years)
+
+
+def test_tp_date():
+    tp_date = Tp_date(onset_year=1994)
+    assert tp_date.bud_break() == (1994, 4, 13, 0, 0)
+    assert tp_date.dormancy_break_date == (1994, 1, 17, 0, 0)
+
+
+def test_leap_year():
+    # one day of chilling per day at the optimal temperature, then hot days
+    climate = ClimateCalendar([(10, 30), (2, 28), (3, 1), (3, 2)], [1995, 1996],
+                              [[1.1, 1.1], [1.1, 1.1], [1.1, 1.1], [30., 30.]])
+    dates = climate.bud_break_dates(chilling_quantity_required=3, heat_quantity_required=1.)
+    assert dates[1995] == ((1995, 3, 1, 0, 0), (1995, 3, 2, 0, 0))
+    assert dates[1996] == ((1996, 2, 29, 0, 0), (1996, 3, 1, 0, 0))
+    dates = climate.bud_break_dates(chilling_quantity_required=10)
+    assert dates[1995] == (None, None)
+
+
+def test_csv():
+    climate = ClimateCalendar([(10, 30), (10, 31)], [1995, 1996],
+                              [[1.5, numpy.nan], [0.1, -3.25]])
+    filename = os.path.join(tempfile.gettempdir(), 'test_climate.csv')
+    climate.save_csv(filename)
+    other = ClimateCalendar.from_csv(filename)
+    os.remove(filename)
+    assert other.dates == climate.dates and other.years == climate.years
+    assert numpy.isnan(other.temperatures[0, 1])
+    assert other.column(1996)[1] == -3.25
+    assert other.column(1995).tolist() == [1.5, 0.1]
@@ -0,0 +1,65 @@
+import os
+import shutil
+import tempfile
+
+from openalea.stocatree.data_process import *
+
+
+class Metamer(object):
+    def __init__(self, unit, fbr, leaf_area, length, state='growing'):
+        self.parent_unit_id = unit
+        self.parent_fbr_id = fbr
+        self.parent_tree_id = 1
+        self.leaf_area = leaf_area
+        self.length = length
+        self.leaf_state = state
+        self.ta_pgl = leaf_area
+        self.sa_pgl = leaf_area / 2.
+        self.star_pgl = 0.5
+
+
+class Module(object):
+    def __init__(self, name, metamer=None):
+        self.name = name
+        self.metamer = metamer
+
+    def __getitem__(self, i):
+        return self.metamer
+
+
+def _lstring():
+    metamers = [Metamer(1, 1, 0.2, 0.1), Metamer(1, 1, 0, 0.3, 'scar'),
+                Metamer(2, 1, 0.4, 0.2), Metamer(3, 2, 0.1, 0.1), Metamer(2, 1, 0.1, 1)]
+    lstring = [Module('root')]
+    for m in metamers:
+        lstring += [Module('metamer', m), Module('B')]
+    return lstring
+
+
+def test_group():
+    lstring = _lstring()
+    grp = Group(lstring, 'parent_fbr_id', ['length'])
+    grp.attr_group(lstring)
+    assert grp.group_metamer == {1: [1, 3, 5, 9], 2: [7]}
+    assert grp.group_unit == {1: [1, 2], 2: [3]}
+    assert grp.group_metamer_attributes['length'][1] == [0.1, 0.3, 0.2, 1]
+    assert grp.averages('length') == [(0.1 + 0.3 + 0.2 + 1) / 4, 0.1]
+
+
+def test_statistics():
+    directory = tempfile.mkdtemp() + os.sep
+    try:
+        stat = Statistics(_lstring(), ['parent_observation', 'leaf_area', 'ta_pgl', 'sa_pgl', 'star_pgl'],
+                          shoot_level=True, branch_level=True, tree_level=True, dir=directory)
+        assert stat.shoot_avg['leaf_area'] == {1: 0.2, 2: 0.25, 3: 0.1}
+        assert stat.shoot_avg['parent_observation'] == {1: 'N/A', 2: 'N/A', 3: 'N/A'}
+        assert stat.branch_avg['leaf_number'] == {1: 3, 2: 1}
+        assert stat.branch_avg['metamer_number'] == {1: 4, 2: 1}
+        assert stat.tree_avg['total_star'] == {1: 0.5}
+        assert stat.tree_avg['unit_number'] == {1: 3}
+        assert stat.tree_avg['fbr_number'] == {1: 2}
+        lines = open(directory + 'Statistics_Metamer.csv').read().splitlines()
+        assert len(lines) == 6
+        assert lines[2].split(',')[3:5] == ['3', 'N/A']
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,73 @@
+import cPickle
+
+from openalea.stocatree.file_tools import Cp_Lstring, Metamer_Record, Mtg_Processing
+
+
+class Leaf(object):
+    def __init__(self, state):
+        self.state = state
+        self.age = 3
+
+
+class Metamer(object):
+    def __init__(self, unit, leaf_area, state):
+        self.parent_unit_id = unit
+        self.parent_fbr_id = 1
+        self.parent_tree_id = 1
+        self.leaf_state = state
+        self.leaf_area = leaf_area
+        self.length = 0.03
+        self.leaf = Leaf(state)
+
+
+class Module(object):
+    def __init__(self, name, *args):
+        self.name = name
+        self.args = args
+
+    def __getitem__(self, i):
+        return self.args[i]
+
+
+def _lstring():
+    return [Module('root'), Module('metamer', Metamer(1, 0.002, 'growing')), Module('B', 0.5),
+            Module('metamer', Metamer(2, 0, 'scar'))]
+
+
+def test_copy():
+    cpl = Cp_Lstring(_lstring())
+    cpl.copy()
+    pl = cpl.pseudo_lstring
+    assert len(pl) == 4
+    assert [elt.name for elt in pl] == ['metamer'] * 4
+    assert pl[0][0].parent_unit_id == -1 and pl[2][0].leaf_area == 0
+    assert pl[1][0].leaf_area == 0.002 and pl[1][0].leaf.state == 'growing'
+    assert pl[3][0].parent_unit_id == 2 and pl[3][0].leaf.state == 'scar'
+    assert not hasattr(pl[1][0], 'lstring_id')
+    pl[1][0].star_pgl = 0.5
+
+
+def test_pickle():
+    cpl = Cp_Lstring(_lstring())
+    cpl.copy()
+    cpl.pseudo_lstring[3][0].lstring_id = 3
+    pl = cPickle.loads(cPickle.dumps(cpl.pseudo_lstring, 0))
+    assert isinstance(pl[1], Metamer_Record)
+    assert pl[1].length == 0.03 and pl[1].leaf.state == 'growing'
+    assert pl[3].lstring_id == 3 and not hasattr(pl[1], 'lstring_id')
+
+
+def test_pseudo_lstring():
+    # the attributes read from an MTG file, without reading one
+    processing = Mtg_Processing.__new__(Mtg_Processing)
+    processing.attr_dict = {
+        1: {'unit_id': 2, 'leaf_state': 'scar', 'lstring_id': 1, 'age': 12},
+        3: {'observation': 'large', 'leaf_area': 0.001, 'lstring_id': 3}}
+    pl = processing.crt_pseudo_lstring()
+    assert len(pl) == 4
+    assert pl[1][0].parent_unit_id == 2 and pl[1][0].age == 12
+    # as before the records, the state of the leaves is not read
+    assert pl[1][0].leaf_state == 'scar' and pl[1][0].leaf.state == ''
+    assert pl[3][0].parent_observation == 'large' and not vars(pl[3][0])
+    copy = cPickle.loads(cPickle.dumps(pl, 0))
+    assert copy[1].age == 12 and copy[1].lstring_id == 1
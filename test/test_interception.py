@@ -0,0 +1,71 @@
+from openalea.plantgl.all import Scene, Shape, Material, Cylinder, Disc, surface
+
+from openalea.stocatree.interception import STAR
+
+
+class _element(object):
+    """stands for a module of the lstring"""
+    def __init__(self, name, parent_unit_id):
+        self.name = name
+        self.parent_unit_id = parent_unit_id
+
+    def __getitem__(self, i):
+        return self
+
+
+def _scene():
+    leaf = Material('Color_15')
+    wood = Material('Color_19')
+    return Scene([Shape(Cylinder(0.1, 1), wood, 1),
+                  Shape(Disc(1), leaf, 1),
+                  Shape(Disc(0.5), leaf, 1),
+                  Shape(Cylinder(0.1, 1), wood, 2),
+                  Shape(Disc(2), leaf, 2),
+                  Shape(Disc(1), leaf, 3)])
+
+
+def test_classify():
+    scene = _scene()
+    star = STAR(None, scene)
+    leafsurface, leaves = star.classify(scene)
+    assert sorted(leafsurface.keys()) == [1, 2]
+    assert abs(leafsurface[1] - surface(Disc(1)) - surface(Disc(0.5))) < 1e-9
+    assert [sh.id for sh in scene] == [1, 1, 1, 2, 2, 3]
+    assert sorted(sh.id for sh in leaves) == [1, 1, 2, 3, STAR.wood_id, STAR.wood_id]
+    leafsurface, leaves = star.classify(scene, wood_occlusion=False)
+    assert sorted(sh.id for sh in leaves) == [1, 1, 2, 3]
+
+
+def test_process_shoot():
+    lstring = [_element('metamer', 10), _element('metamer', 10),
+               _element('metamer', 11), _element('apex', 11)]
+    star = STAR(lstring, None)
+    star.id_lf = [0, 1, 2]
+    star.ta_lf = {0: 1., 1: 3., 2: 2.}
+    star.sa_lf = {0: 0.5, 1: 0.5, 2: 1.}
+    star.star_lf = {0: 0.5, 1: 1. / 6, 2: 0.5}
+    star.process_shoot(lstring, None)
+    assert star.unit_leaves == {10: [0, 1], 11: [2]}
+    assert star.avg_ta_st == {10: 2., 11: 2.}
+    assert star.total_star_st == {10: 0.25, 11: 0.5}
+    assert abs(star.mean_star_st[10] - (0.5 + 1. / 6) / 2) < 1e-12
+    assert star.unit_metamers == {10: [0, 1], 11: [2]}
+    assert star.ta_st == {10: [1., 3.], 11: [2.]}
+
+
+def test_process_shoot_interleaved():
+    lstring = [_element('metamer', 11), _element('metamer', 10), _element('metamer', 11)]
+    star = STAR(lstring, None)
+    star.id_lf = [2, 1, 0]
+    star.ta_lf = {0: 1., 1: 2., 2: 3.}
+    star.sa_lf = {0: 1., 1: 1., 2: 1.}
+    star.star_lf = {0: 1., 1: 0.5, 2: 1. / 3}
+    star.process_shoot(lstring, None)
+    assert star.unit_leaves == {10: [1], 11: [2, 0]}
+    assert star.sa_st == {10: [1.], 11: [1., 1.]}
+    assert star.avg_ta_st == {10: 2., 11: 2.}
+    assert star.total_star_st == {10: 0.5, 11: 0.5}
+
+    empty = STAR(lstring, None)
+    empty.process_shoot(lstring, None)
+    assert empty.unit_leaves == {} and empty.avg_ta_st == {}
@@ -70,6 +70,16 @@ def test_apple_leaf_compute_area_from_func():
     f.maturity= True
     mass = f.compute_area_from_func(14, func_leaf_area)
 
+def test_apple_leaf_matured():
+    from openalea.stocatree.tools.read_function import ReadFunction
+    f = AppleLeaf()
+    func_leaf_area = ReadFunction('functions.fset', 'leaf_area')
+    f.age = f.maturation + 1
+    f.compute_area_from_func(14, func_leaf_area)
+    assert f.maturity
+    # the maturity is stored in its slot
+    assert not vars(f)
+
 def test_apple_leaf_compute_area():
     from openalea.stocatree.tools.read_function import ReadFunction
     f = AppleLeaf()
@@ -0,0 +1,47 @@
+import os
+import tempfile
+
+from openalea.stocatree.ledger import *
+
+
+def _ledger():
+    directory = tempfile.mkdtemp()
+    return ExperimentLedger(os.path.join(directory, 'experiments.db'))
+
+
+def _remove(ledger):
+    ledger.close()
+    directory = os.path.dirname(ledger.filename)
+    for filename in os.listdir(directory):
+        os.remove(os.path.join(directory, filename))
+    os.rmdir(directory)
+
+
+def test_ledger():
+    ledger = _ledger()
+    ledger.queue(range(5))
+    ledger.start(0, seed=12)
+    ledger.done(0, duration=10.)
+    ledger.start(1)
+    ledger.fail(1, duration=1., message='Traceback')
+    ledger.start(2)
+
+    assert ledger.states() == {0: DONE, 1: FAILED, 2: RUNNING, 3: QUEUED, 4: QUEUED}
+    assert ledger.experiments(QUEUED) == [3, 4]
+    assert ledger.pending(range(6)) == [1, 2, 3, 4, 5]
+    assert ledger.pending(range(6), retry=False, running=False) == [3, 4, 5]
+
+    history = ledger.history(0)
+    assert [h[0] for h in history] == [QUEUED, RUNNING, DONE]
+    assert history[1][3] == 12
+    assert history[2][2] == 10.
+    assert ledger.history(1)[-1][-1] == 'Traceback'
+
+    # the events are kept by a new connection (e.g. after a restart)
+    other = ExperimentLedger(ledger.filename)
+    other.start(1)
+    other.done(1)
+    other.close()
+    assert ledger.pending(range(6)) == [2, 3, 4, 5]
+    assert len(ledger.history(1)) == 5
+    _remove(ledger)
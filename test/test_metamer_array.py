@@ -0,0 +1,241 @@
+import copy
+import random
+
+from openalea.stocatree.metamer_array import *
+from openalea.stocatree.metamer import metamer_data
+from openalea.stocatree.wood import Wood
+from openalea.stocatree.fruit import AppleFruit
+from openalea.stocatree.leaf import AppleLeaf
+from openalea.stocatree.internode import Internode
+from openalea.stocatree.frame import Frame
+from openalea.stocatree.physics import rotate_frame_at_branch
+from openalea.stocatree.output import counts
+from openalea.stocatree.tools.simulation import SimulationStocatree
+from openalea.stocatree import get_shared_data
+import openalea.stocatree.non_optimised as non_optimised
+from openalea.stocatree.topology import TopologyIndex
+from openalea.stocatree.tree import Tree
+from vplants.plantgl.all import Vector3, cross
+
+
+class Module(object):
+    """mimics an lpy module"""
+    def __init__(self, name, *args):
+        self.name = name
+        self.args = args
+    def __getitem__(self, index):
+        return self.args[index]
+
+
+class Apex(object):
+    """mimics an apex_data"""
+    def __init__(self, radius):
+        self.radius = radius
+        self.target_radius = 0.006
+        self.sequence_position = 0
+    def terminal_expansion(self, dt):
+        self.radius += 0.0001 * dt
+
+
+def _lstring():
+    """root m0 m1 [ branch m2 apex ] m3 apex with some rotation velocities"""
+    lstring = [Module('root')]
+    for number, name in enumerate(['m0', 'm1', '[', 'branch', 'm2', 'a', ']', 'm3', 'a']):
+        if name == 'a':
+            lstring.append(Module('apex', Apex(0.001 * number)))
+        elif name.startswith('m'):
+            m = metamer_data(hlu=Frame(), wood=Wood(), leaf=AppleLeaf(),
+                             fruit=AppleFruit(), internode=Internode(),
+                             floral=True, number=number + 1, zone=1, b_angle=0.5,
+                             p_angle=2.4)
+            m.age = 12
+            m.rotation_velocity = Vector3(0.1 * number, 0.2, 0.)
+            m.rv_norm = m.rotation_velocity.normalize()
+            m.length = 0.02
+            lstring.append(Module('metamer', m))
+        else:
+            lstring.append(Module(name))
+    return lstring
+
+
+def _scalar_update(lstring, sim):
+    """the rules of group 1 of MAppleT.lpy"""
+    stack = []
+    ml = None
+    branch = False
+    for module in lstring:
+        if module.name == 'metamer':
+            m = module[0]
+            m.update_metamer_parameters(sim)
+            m.organ_activity(sim)
+            if ml is not None:
+                hlu = ml.hlu
+                if branch:
+                    hlu = rotate_frame_at_branch(ml.hlu, ml.branching_angle, ml.phyllotactic_angle)
+                m.hlu = non_optimised.reorient_frame(hlu, m.rotation_velocity, m.rv_norm, m.length)
+                m.update_position(ml.position)
+            else:
+                m.update_position()
+            ml = m
+            branch = False
+        elif module.name == '[':
+            stack.append(ml)
+        elif module.name == ']':
+            ml = stack.pop()
+        elif module.name == 'branch':
+            branch = True
+        else:
+            ml = None
+
+
+def _scalar_physics(lstring, sim, tree, gravity):
+    """the rules of group 2 of MAppleT.lpy for the lstring of _lstring"""
+    m0, m1, m2, m3 = [module[0] for module in lstring if module.name == 'metamer']
+    a2, a3 = [module[0] for module in lstring if module.name == 'apex']
+    for a in [a3, a2]:
+        if a.sequence_position == 0 and a.radius < a.target_radius:
+            a.terminal_expansion(sim.dt.days)
+    for m, a in [(m3, a3), (m2, a2)]:
+        radius = a.radius
+        if m.leaf.state == 'growing':
+            radius = non_optimised.get_new_radius(a.radius, m.leaf.petiole_radius)
+        m.radius = max(radius, m.radius)
+        m.layers[-1].thickness = m.radius - m.layers[-1].radius
+        m.compute_mass()
+        m.cumulated_torque = cross(m.hlu.heading * m.length, tree.tropism)
+        m.calculate_rotation_velocity(sim)
+    # m1 bears m2 and is followed by m3
+    radius = non_optimised.get_new_radius(m2.radius, m3.radius)
+    if m1.leaf.state == 'growing':
+        radius = non_optimised.get_new_radius(radius, m1.leaf.petiole_radius)
+    m1.radius = max(radius, m1.radius)
+    m1.closest_apex = min(m2.closest_apex, m3.closest_apex) + 1
+    m1.farthest_apex = max(m2.farthest_apex, m3.farthest_apex) + 1
+    m1.sons_nb = m2.sons_nb + m3.sons_nb
+    m1.layers[-1].thickness = m1.radius - m1.layers[-1].radius
+    m1.compute_mass(m3, m2)
+    m1.cumulated_torque = m2.cumulated_torque + m3.cumulated_torque + \
+        cross(m2.hlu.heading * m2.length, gravity * m2.cumulated_mass) + \
+        cross(m3.hlu.heading * m3.length, gravity * m3.cumulated_mass) + \
+        cross(m1.hlu.heading * m1.length, tree.tropism)
+    m1.calculate_rotation_velocity(sim)
+    # m0 is followed by m1
+    radius = m1.radius
+    if m0.leaf.state == 'growing':
+        radius = non_optimised.get_new_radius(m1.radius, m0.leaf.petiole_radius)
+    m0.radius = max(radius, m0.radius)
+    m0.closest_apex = m1.closest_apex + 1
+    m0.farthest_apex = m1.farthest_apex + 1
+    m0.sons_nb = m1.sons_nb + 1
+    m0.layers[-1].thickness = m0.radius - m0.layers[-1].radius
+    m0.compute_mass(m1)
+    m0.cumulated_torque = cross(m1.hlu.heading * m1.length, gravity * m1.cumulated_mass) + \
+        m1.cumulated_torque + cross(m0.hlu.heading * m0.length, tree.tropism)
+    m0.calculate_rotation_velocity(sim)
+    tree.trunk_radius = m0.radius
+
+
+def test_metamer_array():
+    sim = SimulationStocatree(dt=1)
+    sim.func_leaf_area_init(get_shared_data('functions.fset'))
+    lstring = _lstring()
+    reference = copy.deepcopy(lstring)
+
+    random.seed(1)
+    _scalar_update(reference, sim)
+    random.seed(1)
+    engine = MetamerArray(mechanics=True)
+    engine.update(lstring, sim)
+
+    assert len(engine) == 4
+    assert list(engine.parent) == [-1, 0, 1, 1]
+    assert engine.index.builds == 1
+    assert list(engine.branch) == [False, False, True, False]
+
+    for module, expected in zip(lstring, reference):
+        if module.name != 'metamer':
+            continue
+        m, r = module[0], expected[0]
+        assert m.age == r.age
+        assert abs(m.length - r.length) < 1e-12
+        assert abs(m.rigidity - r.rigidity) < 1e-6 * max(r.rigidity, 1.)
+        assert m.fruit.state == r.fruit.state
+        assert m.leaf.state == r.leaf.state
+        assert abs(m.leaf.area - r.leaf.area) < 1e-12
+        for a, b in [(m.hlu.heading, r.hlu.heading), (m.hlu.up, r.hlu.up),
+                     (m.hlu.left, r.hlu.left), (m.position, r.position)]:
+            assert abs(a.x - b.x) < 1e-5
+            assert abs(a.y - b.y) < 1e-5
+            assert abs(a.z - b.z) < 1e-5
+
+    c1 = counts()
+    engine.update_counts(c1)
+    c2 = counts()
+    for module in reference:
+        if module.name == 'metamer':
+            c2.update(module[0])
+    assert c1.metamers == c2.metamers
+    assert c1.leaves == c2.leaves
+    assert abs(c1.tla - c2.tla) < 1e-12
+
+
+def test_metamer_array_streams():
+    from openalea.stocatree.srandom import RandomStreams, set_random_streams
+    sim = SimulationStocatree(dt=1)
+    sim.func_leaf_area_init(get_shared_data('functions.fset'))
+    lstring = _lstring()
+    reference = copy.deepcopy(lstring)
+
+    # the random streams of the metamers do not depend on the order of the draws
+    previous = set_random_streams(RandomStreams(seed=2))
+    try:
+        metamers = [module[0] for module in reference if module.name == 'metamer']
+        for m in metamers:
+            m.update_metamer_parameters(sim)
+        for m in reversed(metamers):
+            m.organ_activity(sim)
+        set_random_streams(RandomStreams(seed=2))
+        MetamerArray(mechanics=True).update(lstring, sim)
+    finally:
+        set_random_streams(previous)
+
+    for module, expected in zip(lstring, reference):
+        if module.name == 'metamer':
+            assert module[0].fruit.state == expected[0].fruit.state
+            assert module[0].leaf.state == expected[0].leaf.state
+
+
+def test_physics_array():
+    sim = SimulationStocatree(dt=1)
+    sim.func_leaf_area_init(get_shared_data('functions.fset'))
+    gravity = Vector3(0.0, 0.0, -9.81)
+    lstring = _lstring()
+    topology = TopologyIndex()
+    MetamerArray(topology=topology).update(lstring, sim)
+    reference = copy.deepcopy(lstring)
+
+    tree = Tree()
+    engine = PhysicsArray(gravity, mechanics=True, stake=True, topology=topology)
+    engine.update(lstring, sim, tree)
+    assert topology.builds == 1
+    reference_tree = Tree()
+    _scalar_physics(reference, sim, reference_tree, gravity)
+    assert abs(tree.trunk_radius - reference_tree.trunk_radius) < 1e-12
+
+    for module, expected in zip(lstring, reference):
+        if module.name == 'apex':
+            assert module[0].radius == expected[0].radius
+        if module.name != 'metamer':
+            continue
+        m, r = module[0], expected[0]
+        assert abs(m.radius - r.radius) < 1e-12
+        assert m.closest_apex == r.closest_apex
+        assert m.farthest_apex == r.farthest_apex
+        assert m.sons_nb == r.sons_nb
+        assert abs(m.cumulated_mass - r.cumulated_mass) < 1e-12
+        assert abs(m.rv_norm - r.rv_norm) < 1e-6 * max(r.rv_norm, 1.)
+        for a, b in [(m.cumulated_torque, r.cumulated_torque),
+                     (m.rotation_velocity, r.rotation_velocity)]:
+            assert abs(a.x - b.x) < 1e-9
+            assert abs(a.y - b.y) < 1e-9
+            assert abs(a.z - b.z) < 1e-9
@@ -154,3 +154,119 @@ def test_output():
     except:
         assert True
     o.close()
+
+
+class _leaf():
+    def __init__(self):
+        self.state = 'growing'
+class _fruit():
+    def __init__(self):
+        self.mass = 0.
+class _metamer():
+    def __init__(self, number):
+        self.number = number
+        self.radius = 0.001 * number
+        self.position = position()
+        self.year = 1995
+        self.parent_observation = 'large'
+        self.length = 0.01
+        self.leaf = _leaf()
+        self.leaf_area = 0.001
+        self.ta_pgl = 0
+        self.sa_pgl = 0
+        self.star_pgl = 0
+        self.parent_unit_id = 1
+        self.parent_fbr_id = 1
+        self.zone = 'small'
+        self.fruit = _fruit()
+class _unit():
+    def __init__(self, index):
+        self.index = index
+        self.inflorescence = False
+        self.year = 1995
+class _module():
+    def __init__(self, name, value=None):
+        self.name = name
+        self.v = [value]
+    def __getitem__(self, index):
+        return self.v[index]
+
+def _mtg_lstring(n):
+    """a trunk of n metamers bearing a branch of 2 metamers"""
+    lstring = [_module('growth_unit', _unit(1))]
+    lstring += [_module('metamer', _metamer(i + 1)) for i in range(n)]
+    lstring += [_module('['), _module('branch'), _module('growth_unit', _unit(1)),
+                _module('metamer', _metamer(1)), _module('metamer', _metamer(2)),
+                _module('apex'), _module(']'), _module('apex')]
+    return lstring
+
+def test_mtg_delta():
+    import tempfile
+    import datetime
+    import openalea.stocatree.output as output
+    directory = tempfile.mkdtemp()
+    delta = output.mtg_delta()
+    delta.build_filename(directory=directory)
+    delta.openfile()
+
+    lstring = _mtg_lstring(3)
+    expected = []
+    for day in range(3):
+        if day == 1:
+            lstring[2][0].radius = 0.01
+        if day == 2:
+            lstring.insert(4, _module('metamer', _metamer(4)))
+        full = output.mtg()
+        full.build_filename(directory=directory, tag=str(day))
+        full.openfile()
+        full.save(lstring, datetime.date(1995, 5, day + 1), 0.01)
+        expected.append(open(full.filename).read())
+        os.remove(full.filename)
+        delta.save(lstring, datetime.date(1995, 5, day + 1), 0.01)
+    delta.close()
+
+    snapshots = list(output.read_mtg_delta(delta.filename))
+    assert [date for date, text in snapshots] == ['1995-05-01', '1995-05-02', '1995-05-03']
+    assert [text for date, text in snapshots] == expected
+    # the second snapshot only contains the modified metamer
+    content = open(delta.filename).read()
+    assert content.count('#ORDER\t=\n') == 1
+    assert len(content) < 2 * len(expected[0])
+    os.remove(delta.filename)
+    os.rmdir(directory)
+
+def test_mtg_delta_insertion():
+    import tempfile
+    import datetime
+    import openalea.stocatree.output as output
+    directory = tempfile.mkdtemp()
+    delta = output.mtg_delta()
+    delta.build_filename(directory=directory)
+    delta.openfile()
+
+    lstring = _mtg_lstring(5)
+    expected = []
+    for day in range(2):
+        if day == 1:
+            # a new growth unit borne by the first metamer of the trunk
+            # shifts the lstring_id of all the following metamers
+            lstring[2:2] = [_module('['), _module('branch'), _module('growth_unit', _unit(1)),
+                            _module('metamer', _metamer(1)), _module('apex'), _module(']')]
+        full = output.mtg()
+        full.build_filename(directory=directory, tag=str(day))
+        full.openfile()
+        full.save(lstring, datetime.date(1995, 5, day + 1), 0.01)
+        expected.append(open(full.filename).read())
+        os.remove(full.filename)
+        delta.save(lstring, datetime.date(1995, 5, day + 1), 0.01)
+    delta.close()
+
+    snapshots = list(output.read_mtg_delta(delta.filename))
+    assert [text for date, text in snapshots] == expected
+    # only the rows of the new growth unit and metamer are written again
+    content = open(delta.filename).read()
+    last = content.split('#SNAPSHOT')[-1].splitlines()[1:]
+    assert last[0].startswith('#ORDER\t') and last[1].startswith('#LSTRING\t')
+    assert len(last) == 4
+    os.remove(delta.filename)
+    os.rmdir(directory)
@@ -1,4 +1,4 @@
-from vplants.plantgl.all import Vector3, Vector4
+from vplants.plantgl.all import Vector3, Vector4, cross
 from openalea.stocatree.physics import *
 from openalea.stocatree.frame import Frame
 
@@ -53,6 +53,77 @@ def test_reorient_frame():
     reorient_frame(frame, rotation_velocity, length)
 
 
+def _random_frames(n):
+    import numpy
+    numpy.random.seed(0)
+    heading = numpy.random.randn(n, 3)
+    heading /= numpy.sqrt((heading ** 2).sum(axis=1))[:, None]
+    left = numpy.cross(heading, numpy.random.randn(n, 3))
+    left /= numpy.sqrt((left ** 2).sum(axis=1))[:, None]
+    rv = numpy.random.randn(n, 3)
+    rv_norm = numpy.sqrt((rv ** 2).sum(axis=1))
+    rv /= rv_norm[:, None]
+    return heading, left, rv, rv_norm
+
+
+def test_reorient_frames():
+    import numpy
+    import openalea.stocatree.non_optimised as non_optimised
+    heading, left, rv, rv_norm = _random_frames(20)
+    length = numpy.linspace(0., 0.05, 20)
+    expected = [non_optimised.reorient_frame(Frame(Vector3(*h), Vector3(*l), Vector3()),
+                Vector3(*v), n, L) for h, l, v, n, L in zip(heading, left, rv, rv_norm, length)]
+    h, l, u = reorient_frames(heading.copy(), left.copy(), rv, rv_norm, length)
+    for i, frame in enumerate(expected):
+        for a, b in [(h[i], frame.heading), (l[i], frame.left), (u[i], frame.up)]:
+            assert abs(a[0] - b.x) < 1e-9 and abs(a[1] - b.y) < 1e-9 and abs(a[2] - b.z) < 1e-9
+
+
+def test_frames_to_quaternions():
+    import numpy
+    heading, left, rv, rv_norm = _random_frames(50)
+    q = frames_to_quaternions(heading, left)
+    x = numpy.tile([1., 0., 0.], (50, 1))
+    y = numpy.tile([0., 1., 0.], (50, 1))
+    assert numpy.allclose(quaternion_rotate(q, x), heading)
+    assert numpy.allclose(quaternion_rotate(q, y), left)
+
+
+def test_propagate_frames():
+    """compare the prefix composition with a level by level propagation"""
+    import numpy
+    import openalea.stocatree.non_optimised as non_optimised
+    # two axes: 0-1-2-3-4 and a branch 5-6 borne by 2
+    parent = numpy.array([-1, 0, 1, 2, 3, 2, 5])
+    branch = numpy.array([False, False, False, False, False, True, False])
+    heading, left, rv, rv_norm = _random_frames(7)
+    length = numpy.array([0.1, 0.05, 0.2, 0.1, 0.02, 0.15, 0.3])
+    branching_angle = numpy.linspace(0.2, 0.8, 7)
+    phyllotactic_angle = numpy.linspace(1., 3., 7)
+
+    frames = {}
+    positions = {}
+    for i, p in enumerate(parent):
+        if p < 0:
+            frames[i] = Frame(Vector3(*heading[i]), Vector3(*left[i]),
+                              cross(Vector3(*heading[i]), Vector3(*left[i])))
+            positions[i] = frames[i].heading * length[i]
+            continue
+        hlu = frames[p]
+        if branch[i]:
+            hlu = rotate_frame_at_branch(hlu, branching_angle[p], phyllotactic_angle[p])
+        frames[i] = non_optimised.reorient_frame(hlu, Vector3(*rv[i]), rv_norm[i], length[i])
+        positions[i] = positions[p] + frames[i].heading * length[i]
+
+    h, l, u = propagate_frames(parent, branch, heading.copy(), left.copy(), rv,
+                               rv_norm, length, branching_angle, phyllotactic_angle)
+    position = propagate_positions(parent, h, length)
+    for i in range(7):
+        for a, b in [(h[i], frames[i].heading), (l[i], frames[i].left),
+                     (u[i], frames[i].up), (position[i], positions[i])]:
+            assert abs(a[0] - b.x) < 1e-5 and abs(a[1] - b.y) < 1e-5 and abs(a[2] - b.z) < 1e-5
+
+
 if __name__ == "__main__":
     test_calculate_rotation_velocity()
     test_stress()
@@ -0,0 +1,67 @@
+import os
+import json
+import tempfile
+import datetime
+
+from openalea.stocatree.profiling import *
+
+
+class Clock(object):
+    """a clock advanced by hand"""
+    def __init__(self):
+        self.t = 0.
+    def __call__(self):
+        return self.t
+
+
+def test_profiler():
+    clock = Clock()
+    profiler = PhaseProfiler(names={1: 'update_parameters', 4: 'update_structure'}, clock=clock)
+    day = datetime.datetime(1994, 4, 15)
+    for i in range(2):
+        date = day + datetime.timedelta(i)
+        profiler.begin(1, date)
+        clock.t += 1.
+        profiler.end(10 + i, 3 + i)
+        profiler.begin(4, date)
+        clock.t += 2.
+        profiler.mark_render()
+        clock.t += 0.5
+        profiler.end(12 + i, 4 + i)
+        with profiler.section('trunk'):
+            clock.t += 0.25
+
+    timeline = profiler.timeline()
+    assert len(timeline) == 2
+    assert timeline[1]['lstring'] == 13
+    assert timeline[1]['metamers'] == 5
+    assert timeline[0]['update_parameters'] == 1.
+    assert timeline[0]['update_structure'] == 2.
+    assert timeline[0]['render'] == 0.5
+    assert timeline[0]['trunk'] == 0.25
+    summary = profiler.summary()
+    assert summary['columns'] == ['update_parameters', 'update_structure', 'render', 'trunk']
+    assert summary['totals']['update_structure'] == 4.
+    assert summary['calls']['render'] == 2
+
+    directory = tempfile.mkdtemp()
+    filename = os.path.join(directory, '1_profile')
+    profiler.save(filename)
+    lines = open(filename + '.csv').read().splitlines()
+    assert lines[0] == 'date,lstring,metamers,update_parameters,update_structure,render,trunk'
+    assert lines[1].startswith('1994-04-15,12,4,1.000000,2.000000,0.500000,0.250000')
+    assert json.load(open(filename + '.json'))['days'] == 2
+    os.remove(filename + '.csv')
+    os.remove(filename + '.json')
+    os.rmdir(directory)
+
+
+def test_disabled_profiler():
+    profiler = PhaseProfiler(enabled=False)
+    profiler.begin(1)
+    profiler.mark_render()
+    profiler.end(10, 2)
+    with profiler.section('mtg'):
+        pass
+    assert profiler.timeline() == []
+    assert profiler.columns == []
@@ -39,3 +39,51 @@ def test_boolean_event():
 
 
 test_boolean_event()
+
+
+def test_random_streams():
+    streams = srandom.RandomStreams(seed=12)
+    values = [streams.random('fate', 3) for i in range(5)]
+    assert all(0 <= value < 1 for value in values)
+    assert len(set(values)) == 5
+    assert streams.counters[('fate', 3)] == 5
+
+    # the values only depend on the seed, the purpose, the key and the counter
+    other = srandom.RandomStreams(seed=12)
+    other.random('leaf_fall', 3)
+    batch = other.uniform('fate', keys=[4, 3, 3, 3, 3, 3])
+    assert batch[1:].tolist() == values
+    assert other.random('fate', 4) == streams.values('fate', [4], [1])[0]
+    assert srandom.RandomStreams(seed=13).random('fate', 3) != values[0]
+    assert streams.uniform('fruit_set', 3).tolist() == \
+        [streams.values('fruit_set', [0], [i])[0] for i in range(3)]
+
+    events = streams.boolean_events('leaf_fall', [0., 1., 0.5], keys=[1, 2, 3])
+    assert events.tolist()[:2] == [False, True]
+
+
+def test_random_streams_scalar():
+    # random() computes with python integers what values() computes with numpy
+    streams = srandom.RandomStreams(seed=-7)
+    for key in [0, -1, 2 ** 40, srandom.organ_key(70000, 12)]:
+        for count in range(3):
+            assert streams.random('hsm', key) == streams.values('hsm', [key], [count])[0]
+
+
+def test_set_random_streams():
+    import random
+    random.seed(5)
+    expected = [random.random() for i in range(3)]
+    random.seed(5)
+    streams = srandom.RandomStreams(seed=1)
+    previous = srandom.set_random_streams(streams)
+    try:
+        # only the values drawn with a purpose come from the streams
+        assert srandom.draw() == expected[0]
+        assert srandom.draw('fate', 7) == srandom.RandomStreams(seed=1).random('fate', 7)
+        assert srandom.boolean_event(0.5, 'leaf_fall', srandom.organ_key(2, 3)) in (True, False)
+        assert srandom.draw() == expected[1]
+    finally:
+        srandom.set_random_streams(previous)
+    assert srandom.get_random_streams() is previous
+    assert srandom.draw('fate') == expected[2]
@@ -0,0 +1,44 @@
+import numpy
+
+from openalea.stocatree import raster
+from openalea.stocatree.raster import *
+
+
+def _square(x, y, z, size=1.):
+    a, b, c, d = [x, y, z], [x + size, y, z], [x + size, y + size, z], [x, y + size, z]
+    return [[a, b, c], [a, c, d]]
+
+
+def _scene():
+    # square 2 hides square 1 from the zenith, square 3 is aside
+    triangles = numpy.array(_square(0, 0, 0) + _square(0, 0, 1) + _square(2, 0, 0))
+    return triangles, numpy.array([1, 1, 2, 2, 3, 3])
+
+
+def test_projected_areas():
+    triangles, ids = _scene()
+    areas, unique = projected_areas(triangles, ids, [(0., 90., 1.)], w=300, h=300)
+    assert unique.tolist() == [1, 2, 3]
+    assert areas[0] == 0.
+    assert abs(areas[1] - 1.) < 0.02 and abs(areas[2] - 1.) < 0.02
+    # from an elevation of 30 degrees, a horizontal square is seen with half its area
+    areas, unique = projected_areas(triangles, ids, [(0., 30., 0.5), (90., 30., 0.5)],
+                                    w=300, h=300, threads=2)
+    assert numpy.allclose(areas, 0.5, atol=0.02)
+    assert triangle_areas(triangles).sum() == 3.
+
+
+def test_chunks():
+    rng = numpy.random.RandomState(0)
+    triangles = rng.uniform(0, 1, (200, 1, 3)) + rng.normal(0, 0.05, (200, 3, 3))
+    labels = numpy.arange(200)
+    vector = sky_vector(30., 60.)
+    image, pixel_area = zbuffer(triangles, labels, vector, w=100, h=100)
+    chunk_size = raster.chunk_size
+    raster.chunk_size = 100
+    try:
+        other, other_area = zbuffer(triangles, labels, vector, w=100, h=100)
+    finally:
+        raster.chunk_size = chunk_size
+    assert (image == other).all() and pixel_area == other_area
+    assert max(image.shape) == 100 and (image >= 0).any()
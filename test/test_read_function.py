@@ -1,4 +1,4 @@
-from openalea.stocatree.tools.read_function import ReadFunction,  _FSet
+from openalea.stocatree.tools.read_function import ReadFunction, read_functions, _FSet
 
 
 def test_read_function():
@@ -28,3 +28,23 @@ def test_fset():
 
 
 
+
+def test_gety():
+    func = ReadFunction('functions.fset', 'leaf_area')
+    x = [-1., 0., 0.1, 0.25, 0.3, 0.5, 0.6, 0.99, 1., 2.]
+    y = func.gety_array(x)
+    for xi, yi in zip(x, y):
+        assert abs(func.gety(xi) - yi) < 1e-12
+    assert func.gety(0.25) == func.y[1]
+
+def test_read_functions():
+    functions = read_functions('functions.fset')
+    assert sorted(functions.keys()) == ['fruit_mass', 'leaf_area']
+    assert functions['fruit_mass'].fset.name == '_fruit_mass'
+    assert ReadFunction('functions.fset', '_fruit_mass').y == functions['fruit_mass'].y
+    assert functions['leaf_area'].y == ReadFunction('functions.fset', 'leaf_area').y
+    try:
+        ReadFunction('functions.fset', 'dummy')
+        assert False
+    except ValueError:
+        assert True
@@ -0,0 +1,112 @@
+import os
+import tempfile
+
+from openalea.stocatree.runner import *
+from openalea.stocatree import get_shared_data
+
+
+def fake_experiment(lsystem_file, ini_file, experiment, parameters):
+    """stands for run_experiment: fails for odd experiment ids"""
+    if experiment % 2:
+        raise ValueError('experiment %s failed' % experiment)
+
+
+def test_read_plan():
+    plan = read_plan(get_shared_data('pleqplan.csv'))
+    assert len(plan) == 239
+    experiment, parameters = plan[3]
+    assert experiment == 4
+    assert parameters['tree.branching_angle'] == 45.
+    assert parameters['apex.maximum_size'] == 0.003
+    assert parameters['stocatree.select_trunk'] == 3
+
+
+class _Section(object):
+    pass
+
+
+def _options():
+    """the options of MAppleT.ini used to name the outputs"""
+    options = _Section()
+    for section in ('output', 'stocatree', 'tree', 'internode', 'apex', 'leaf'):
+        setattr(options, section, _Section())
+    options.output.opti_idx = 0
+    options.stocatree.select_trunk = 1
+    return options
+
+
+def test_experiment_name():
+    # each row of the plan writes its own outputs, even if the trunk
+    # sequence of the row is the id of another experiment
+    names = []
+    for experiment, parameters in read_plan(get_shared_data('pleqplan.csv')):
+        options = _options()
+        set_parameters(options, experiment, parameters)
+        names.append(experiment_name(options))
+    assert names == [str(i) for i in range(1, 240)]
+    assert experiment_name(_options()) == '1'
+
+
+def _plan(n):
+    return [(i, {'tree.branching_angle': 45. + i}) for i in range(n)]
+
+
+def test_runner_serial():
+    runner = ExperimentRunner('MAppleT.lpy', processes=0, directory=tempfile.gettempdir(),
+                              function=fake_experiment)
+    cwd = os.getcwd()
+    results = list(runner.run(_plan(4), skip=[2]))
+    assert os.getcwd() == cwd
+    assert [r.experiment for r in results] == [0, 1, 3]
+    assert [r.success for r in results] == [True, False, False]
+    assert 'experiment 1 failed' in results[1].error
+    assert results[0].parameters == {'tree.branching_angle': 45.}
+
+
+def test_runner_pool():
+    runner = ExperimentRunner('MAppleT.lpy', processes=2, directory=tempfile.gettempdir(),
+                              function=fake_experiment)
+    results = list(runner.run(_plan(6)))
+    assert sorted(r.experiment for r in results) == range(6)
+    assert sorted(r.experiment for r in results if r.success) == [0, 2, 4]
+    assert os.getpid() not in [r.pid for r in results]
+
+
+def test_runner_ledger():
+    from openalea.stocatree.ledger import ExperimentLedger
+    directory = tempfile.mkdtemp()
+    filename = os.path.join(directory, 'experiments.db')
+    runner = ExperimentRunner('MAppleT.lpy', processes=2, directory=directory,
+                              function=fake_experiment, ledger=filename)
+    list(runner.run(_plan(4)))
+    ledger = ExperimentLedger(filename)
+    assert ledger.experiments('done') == [0, 2]
+    assert ledger.pending(range(4)) == [1, 3]
+    assert [h[0] for h in ledger.history(1)] == ['queued', 'running', 'failed']
+    ledger.close()
+    for name in os.listdir(directory):
+        os.remove(os.path.join(directory, name))
+    os.rmdir(directory)
+
+
+def test_runner_ledger_seed():
+    from openalea.stocatree.ledger import ExperimentLedger
+    directory = tempfile.mkdtemp()
+    ini_file = os.path.join(directory, 'MAppleT.ini')
+    f = open(ini_file, 'w')
+    f.write('[general]\nseed = 77\n')
+    f.close()
+    filename = os.path.join(directory, 'experiments.db')
+    runner = ExperimentRunner('MAppleT.lpy', 'MAppleT.ini', processes=0, directory=directory,
+                              function=fake_experiment, ledger=filename)
+    # the plan sets the seed of experiment 2 only
+    plan = [(0, {}), (2, {'general.seed': 5})]
+    list(runner.run(plan))
+    ledger = ExperimentLedger(filename)
+    assert [h[3] for h in ledger.history(0)] == [None, 77, None]
+    assert [h[3] for h in ledger.history(2)] == [None, 5, None]
+    ledger.close()
+    assert experiment_seed(os.path.join(directory, 'missing.ini'), {}) is None
+    for name in os.listdir(directory):
+        os.remove(os.path.join(directory, name))
+    os.rmdir(directory)
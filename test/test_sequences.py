@@ -1,4 +1,5 @@
 from openalea.stocatree.sequences import *
+from openalea.stocatree.sequences import shoot_type_react
 from openalea.sequence_analysis import HiddenSemiMarkov
 from openalea.stocatree import get_shared_data
 
@@ -17,6 +18,31 @@ def test_terminal_fate():
             assert index in ['large','small','medium','floral']
 
 
+def test_terminal_fates():
+    import random
+    random.seed(1)
+    fates = [terminal_fate(2, 'medium') for i in range(100)]
+    random.seed(1)
+    assert terminal_fates(2, 'medium', 100) == fates
+
+
+def test_categorical_distribution():
+    distribution = CategoricalDistribution([0.5, 0.167, 0.000, 0.333])
+    assert distribution.index(0.5) == 1
+    assert distribution.index(0.6) == 2
+    assert distribution.index(0.7) == 4
+    assert distribution.index(1.) == 4
+    indices = distribution.draw_many(1000)
+    assert len(indices) == 1000
+    assert 3 not in indices
+    assert set(indices.tolist()) <= set([1, 2, 4])
+    try:
+        CategoricalDistribution([0.5, 0.6])
+        assert False
+    except ValueError:
+        assert True
+
+
 def test_data_terminal_fate():
     d = DataTerminalFate()
     assert d.get_data_terminal_fate(1995, 'large') ==  d.get_data_terminal_fate(1995, 'large')
@@ -39,10 +65,50 @@ def test_generate_trunk():
         assert len(seq)==55 or len(seq)==59
 
 
+def test_read_trunk_sequences():
+    import numpy
+    filename = get_shared_data('sequences_hybride_239_txt.seq')
+    trunks = read_trunk_sequences(filename)
+    assert read_trunk_sequences(filename) is trunks
+    assert len(trunks) == 239
+    table = numpy.loadtxt(filename)
+    for select in [0, 1, 238]:
+        row = list(table[select])
+        if 9 in row:
+            row = row[:row.index(9)]
+        assert generate_trunk(filename, select) == [[None, obs] for obs in reversed(row)]
+
+
 def test_generate_random_draw_sequence():
     seq = _generate_random_draw_sequence()
     assert len(seq) in [46, 20, 49, 57, 39, 51, 48, 53, 62]
 
+
+def test_generate_random_draw_sequence_streams():
+    from openalea.stocatree import srandom
+    previous = srandom.set_random_streams(srandom.RandomStreams(seed=3))
+    try:
+        first = [_generate_random_draw_sequence(key) for key in [5, 7]]
+        # the shoots of other apices do not change the draws of an apex
+        srandom.set_random_streams(srandom.RandomStreams(seed=3))
+        _generate_random_draw_sequence(6)
+        second = [_generate_random_draw_sequence(key) for key in [7, 5]]
+    finally:
+        srandom.set_random_streams(previous)
+    assert first == second[::-1]
+
+
+def test_shoot_type_react_streams():
+    from openalea.stocatree import srandom
+    previous = srandom.set_random_streams(srandom.RandomStreams(seed=3))
+    try:
+        first = [shoot_type_react(2, 'medium', 'A', 2, key) for key in range(20)]
+        srandom.set_random_streams(srandom.RandomStreams(seed=3))
+        second = [shoot_type_react(2, 'medium', 'A', 2, key) for key in reversed(range(20))]
+    finally:
+        srandom.set_random_streams(previous)
+    assert first == second[::-1]
+
 def test_floral():
     seq = generate_floral_sequence()
     assert len(seq)==4
@@ -91,6 +157,21 @@ def test_markov():
     markov = Markov()
     assert markov.max_sequence_length == 100
 
+def test_markov_register():
+    markov = Markov()
+    filename = get_shared_data('fmodel_fuji_5_15_y4_97.txt')
+    markov.register('hsm_medium1', filename)
+    markov.register('hsm_medium2', filename)
+    assert 'hsm_medium1' not in vars(markov)
+    markov.hsm_medium = markov.hsm_medium1
+    assert markov.hsm_medium2 is markov.hsm_medium
+    assert load_hsm(filename) is markov.hsm_medium
+    try:
+        markov.hsm_dummy
+        assert False
+    except AttributeError:
+        assert True
+
 def test_generate_sequence():
     from openalea.sequence_analysis import HiddenSemiMarkov
 
@@ -123,3 +204,22 @@ def test_generate_sequence():
         assert True
 
 
+
+
+def test_hsm_sequence_cache():
+    hsm = HiddenSemiMarkov(get_shared_data('fmodel_fuji_16_65_y4_97.txt'))
+    cache = HsmSequenceCache(size=5)
+    for i in range(20):
+        seq = generate_bounded_hsm_sequence(hsm, 15, 26, cache=cache)
+        assert 15 <= len(seq) <= 26
+        seq = generate_bounded_hsm_sequence(hsm, 41, 70, cache=cache)
+        assert 41 <= len(seq) <= 70
+    assert cache.hits + cache.misses == 40
+    assert cache.misses > 0
+
+    markov = Markov(cache_size=5)
+    assert markov.cache is not None
+    markov.hsm_medium = HiddenSemiMarkov(get_shared_data('fmodel_fuji_5_15_y4_97.txt'))
+    seq = generate_sequence('medium', markov)
+    assert 5 <= len(seq) <= 15
+    assert markov.cache.misses == 1
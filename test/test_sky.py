@@ -0,0 +1,41 @@
+import numpy
+
+from openalea.stocatree.sky import *
+
+
+def fake_star(scene, directions, w, h, dfact):
+    """stands for directlight_star: the projected area of a direction is its
+    azimuth, the total leaf area is 10"""
+    ipea = sum(az * weight for az, el, weight in directions)
+    return ipea / 10., ipea, 10.
+
+
+class _ScaleStructure(object):
+    """stands for the scale structure of lit.ssFromDict"""
+    def computeDir(self, skt_idx, distrib):
+        res = {'Star_turbid': skt_idx * 0.1}
+        for i, d in enumerate(distrib):
+            res['Star_' + str(d)] = skt_idx * 0.01 * i
+        return res
+
+
+def test_split_directions():
+    groups = split_directions(range(46), 4)
+    assert [len(g) for g in groups] == [12, 12, 11, 11]
+    assert sum(groups, []) == range(46)
+    assert split_directions(range(2), 4) == [[0], [1]]
+
+
+def test_decomposed_star():
+    directions = [(float(i), 45., 1. / 46) for i in range(46)]
+    serial = decomposed_star('scene.bgeom', directions, processes=0, function=fake_star)
+    parallel = decomposed_star('scene.bgeom', directions, processes=3, function=fake_star)
+    assert numpy.allclose(serial, parallel)
+    assert parallel[2] == 10.
+
+
+def test_multiscale_star():
+    distrib = [['R', 'R', 'R'], ['A', 'A', 'A']]
+    stars = multiscale_star(_ScaleStructure(), 'tree', None, [], distrib, processes=0)
+    assert stars.shape == (46, 3)
+    assert stars[0].tolist() == [0.1, 0., 0.01]
@@ -0,0 +1,57 @@
+import cPickle
+
+from openalea.stocatree.slotted import Slotted, slot_names
+from openalea.stocatree.metamer import metamer_data
+from openalea.stocatree.wood import Wood
+from openalea.stocatree.fruit import AppleFruit
+from openalea.stocatree.leaf import AppleLeaf
+from openalea.stocatree.internode import Internode
+from openalea.stocatree.frame import Frame
+
+
+class _Point(Slotted):
+    __slots__ = ('x', 'y', '__dict__')
+
+
+class _Point3(_Point):
+    __slots__ = ('z',)
+
+
+def test_slot_names():
+    assert slot_names(_Point3) == ['x', 'y', 'z']
+
+
+def test_state():
+    point = _Point3()
+    point.x = 1.
+    point.z = 3.
+    point.label = 'a'
+    assert point.__getstate__() == {'x': 1., 'z': 3., 'label': 'a'}
+    for protocol in (0, 2):
+        copy = cPickle.loads(cPickle.dumps(point, protocol))
+        assert copy.__getstate__() == point.__getstate__()
+
+
+def test_metamer():
+    m = metamer_data(hlu=Frame(), wood=Wood(), leaf=AppleLeaf(), fruit=AppleFruit(),
+                     internode=Internode(), number=1, zone=1, floral=True)
+    assert not m.__dict__
+    assert not hasattr(m.hlu, '__dict__')
+    m.leaf.state = 'scar'
+    m.developed = True
+    copy = cPickle.loads(cPickle.dumps(m, 0))
+    assert copy.developed and copy.number == 1
+    assert copy.leaf.state == 'scar' and copy.fruit.state == 'flower'
+    assert copy.layers[0].thickness == m.layers[0].thickness
+    assert copy.hlu.heading.z == m.hlu.heading.z and copy.hlu.up.x == m.hlu.up.x
+
+
+def test_old_state():
+    # the state of the leaves and fruits before they had slots
+    leaf = AppleLeaf.__new__(AppleLeaf)
+    leaf.__setstate__({'_state': 'scar', 'area': 0.})
+    assert leaf.state == 'scar'
+    fruit = AppleFruit.__new__(AppleFruit)
+    fruit.__setstate__({'_state': 'fruit', 'mass': 0.1})
+    assert fruit.state == 'fruit'
+    assert fruit.__getstate__() == {'_code': AppleFruit.states.index('fruit'), 'mass': 0.1}
@@ -0,0 +1,208 @@
+from openalea.stocatree.topology import *
+from openalea.stocatree.topology import CUT
+
+
+class Module(object):
+    """mimics an lpy module"""
+    def __init__(self, name, *args):
+        self.name = name
+        self.args = args
+    def __getitem__(self, index):
+        return self.args[index]
+
+
+def _lstring():
+    """root m0 [ branch m1 apex ] m2 growth_unit [ branch apex ] m3 apex"""
+    names = ['root', 'metamer', '[', 'branch', 'metamer', 'apex', ']',
+             'metamer', 'growth_unit', '[', 'branch', 'apex', ']', 'metamer', 'apex']
+    return [Module(name, object()) for name in names]
+
+
+def test_topology():
+    lstring = _lstring()
+    index = TopologyIndex()
+    index.update(lstring)
+    assert len(index) == 4
+    assert index.metamers[0] is lstring[1][0]
+    assert list(index.parent) == [-1, 0, 0, 2]
+    assert list(index.branch) == [False, True, False, False]
+    assert list(index.depth) == [0, 1, 1, 2]
+    assert list(index.successor) == [2, -1, 3, -1]
+    assert list(index.lateral) == [1, -1, -1, -1]
+    assert index.apex[1] is lstring[5][0]
+    assert index.apex[3] is lstring[14][0]
+    assert list(index.rule) == [1, 3, 2, 3]
+    assert index.trunk == 0
+    assert len(index.apices) == 3
+
+    levels = [sorted(idx) for idx in index.bottom_up()]
+    assert levels == [[3], [1, 2], [0]]
+    levels = [sorted(idx) for idx in index.top_down()]
+    assert levels == [[0], [1, 2], [3]]
+
+
+def test_invalidate():
+    lstring = _lstring()
+    index = TopologyIndex(lstring)
+    assert index.builds == 1
+    index.update(lstring)
+    assert index.builds == 1
+    index.invalidate()
+    index.update(lstring[:3] + lstring[6:])
+    assert index.builds == 2
+    assert len(index) == 3
+
+
+def test_empty():
+    index = TopologyIndex([Module('root'), Module('apex', object())])
+    assert len(index) == 0
+    assert index.trunk == -1
+    assert list(index.bottom_up()) == []
+
+
+class Organ(object):
+    """mimics a metamer_data or an apex_data"""
+    def __init__(self, unit=0):
+        self.parent_unit_id = unit
+        self.parent_fbr_id = 0
+        self.node = -1
+
+
+def _find(lstring, organ):
+    return [i for i, module in enumerate(lstring) if module.args and module[0] is organ][0]
+
+
+def _end(lstring, i):
+    """index of the end of the branch that contains module i"""
+    depth = 0
+    for j in range(i + 1, len(lstring)):
+        if lstring[j].name == '[':
+            depth += 1
+        elif lstring[j].name == ']':
+            if depth == 0:
+                return j
+            depth -= 1
+    return len(lstring)
+
+
+def _organs(lstring, name):
+    return [module[0] for module in lstring if module.name == name]
+
+
+def _same(index, other):
+    assert [id(m) for m in index.metamers] == [id(m) for m in other.metamers]
+    assert [id(a) for a in index.apices] == [id(a) for a in other.apices]
+    assert [id(a) for a in index.apex] == [id(a) for a in other.apex]
+    assert index.trunk == other.trunk
+    for name in ['parent', 'branch', 'depth', 'successor', 'lateral', 'rule',
+                 'post_order', 'levels']:
+        assert getattr(index, name).tolist() == getattr(other, name).tolist(), name
+
+
+def test_organ_topology():
+    # the same random productions are applied to an lstring and to the tree
+    import random
+    random.seed(3)
+    trunk = Organ()
+    lstring = [Module('root'), Module('apex', trunk)]
+    organs = OrganTopology()
+    organs.start(trunk)
+    index = TopologyIndex(organs=organs)
+    cut = []
+    for step in range(400):
+        metamers = _organs(lstring, 'metamer')
+        apices = _organs(lstring, 'apex')
+        if not metamers and not apices:
+            break
+        event = random.random()
+        if (event < 0.5 or not metamers) and apices:
+            a = random.choice(apices)
+            m = Organ(step)
+            i = _find(lstring, a)
+            if random.random() < 0.2:
+                lstring.insert(i, Module('growth_unit', object()))
+                i += 1
+            lstring.insert(i, Module('metamer', m))
+            organs.grow(a, m)
+            m.trunk = a is trunk
+        elif event < 0.8:
+            m = random.choice(metamers)
+            a = Organ()
+            i = _find(lstring, m)
+            lstring[i + 1:i + 1] = [Module('['), Module('branch'), Module('apex', a), Module(']')]
+            organs.branch(m, a)
+        elif event < 0.9 and not all(m.trunk for m in metamers):
+            # pruning: Cut() in place of the metamer
+            m = random.choice([m for m in metamers if not m.trunk])
+            i = _find(lstring, m)
+            end = _end(lstring, i)
+            cut.extend(_organs(lstring[i:end], 'metamer') + _organs(lstring[i:end], 'apex'))
+            if random.random() < 0.5:
+                del lstring[i:end]
+            else:
+                lstring[i:end] = [Module('Label', 'Cut')]
+            organs.cut(m)
+        elif event > 0.97:
+            # pruning reaction: metamer(m) SB() branch() apex(a) EB() Cut()
+            m = random.choice(metamers)
+            a = Organ()
+            i = _find(lstring, m)
+            end = _end(lstring, i)
+            cut.extend(_organs(lstring[i + 1:end], 'metamer') + _organs(lstring[i + 1:end], 'apex'))
+            lstring[i + 1:end] = [Module('['), Module('branch'), Module('apex', a), Module(']')]
+            organs.cut(m, keep=True)
+            organs.branch(m, a)
+        # the productions of the organs that follow a Cut() do nothing
+        if cut:
+            organs.grow(random.choice(cut), Organ())
+        assert organs.valid
+
+        index.invalidate()
+        index.update(None)
+        _same(index, TopologyIndex(lstring))
+        assert len(organs) == len(_organs(lstring, 'metamer')) + len(_organs(lstring, 'apex'))
+
+    assert [organs.organs[n] for n in organs.nodes()] == \
+        [module[0] for module in lstring if module.name in ('metamer', 'apex')]
+
+    # the tree built from the lstring gives the same index
+    built = OrganTopology()
+    built.build(lstring)
+    assert built.valid
+    other = TopologyIndex(organs=built)
+    other.update(None)
+    _same(other, index)
+
+
+def test_organ_queries():
+    # root m0 [ branch m1 apex ] m2 apex
+    m0, m1, m2, a1, a2 = [Organ() for i in range(5)]
+    organs = OrganTopology()
+    organs.start(a2)
+    organs.grow(a2, m0)
+    organs.branch(m0, a1)
+    organs.grow(a1, m1)
+    organs.grow(a2, m2)
+    assert organs.nodes() == [m0.node, m1.node, a1.node, m2.node, a2.node]
+    assert organs.children(m0.node) == [m1.node, m2.node]
+    assert organs.ancestors(a1.node) == [m1.node, m0.node]
+    assert organs.order[a1.node] == 1 and organs.order[m2.node] == 0
+    assert organs.subtree(m1.node) == [m1.node, a1.node]
+
+    removed = [m1.node, a1.node]
+    assert organs.cut(m1) == removed
+    assert m1.node == a1.node == CUT
+    assert len(organs) == 3
+    assert organs.grow(a1, Organ()) == -1
+    assert organs.children(m0.node) == [m2.node]
+
+    # an organ unknown to the tree invalidates it
+    assert organs.branch(Organ(), Organ()) == -1
+    assert not organs.valid
+    lstring = [Module('root'), Module('metamer', m0), Module('['), Module('branch'),
+               Module(']'), Module('metamer', m2), Module('apex', a2)]
+    index = TopologyIndex(organs=organs)
+    index.update(lstring)
+    assert organs.valid
+    assert list(index.lateral) == [-1, -1]
+    assert list(index.successor) == [1, -1]
@@ -0,0 +1,38 @@
+import datetime
+
+import numpy
+
+from openalea.stocatree.Water_balance import *
+from openalea.stocatree import get_shared_data
+
+
+def test_meteo():
+    weather = meteo(get_shared_data('meteo-2011-melgueil.txt'))
+    weather.make_meteorological_calculation(None)
+    assert weather.premier_jour == datetime.date(2011, 4, 1)
+    day = weather.get_meteo_jour(datetime.datetime(2011, 7, 10))
+    assert day['jour_julien'] == 191
+    assert abs(day['ET0'] - 3.94868587665523) < 1e-12
+    assert day == weather.file_dico[datetime.date(2011, 7, 10)]
+
+
+def test_water_balance():
+    weather = meteo(get_shared_data('meteo-2011-melgueil.txt'))
+    balance = simplified_water_balance(weather)
+    balance.independant_calculation()
+    stepwise = simplified_water_balance(weather)
+    for date in weather.dates:
+        stepwise.calcule_BH_jour(date)
+    for name in water_balance_series:
+        assert numpy.allclose(balance.series[name], stepwise.series[name], rtol=1e-14)
+    result = balance.get_BH_jour(datetime.date(2011, 7, 10))
+    assert abs(result['ASW'] - 3.0878125319056116) < 1e-9
+    assert result['ASW'] <= balance.TTSW
+    assert len(balance.result_dico) == len(weather.dates)
+
+
+def test_crop_coefficient():
+    days = numpy.arange(0, 366)
+    kc = compute_single_crop_coefficient(days)
+    assert [compute_single_crop_coefficient(day) for day in days] == kc.tolist()
+    assert compute_single_crop_coefficient(170) == 0.8